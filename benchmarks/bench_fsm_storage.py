@@ -0,0 +1,86 @@
+"""Бенчмарк хранилища FSM: MemoryStorage aiogram против SQLiteStorage
+
+Запуск: python -m benchmarks.bench_fsm_storage [пользователей]
+
+Каждый пользователь проходит типичный путь: несколько обновлений без
+состояния (каждое читает состояние), выбор уровня (update_data + set_state),
+ответы в сессии и завершение (state.clear). Меряем память, оставшуюся после
+всех пользователей, время на операцию и число записей в БД.
+"""
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from database.database import Database
+from database.fsm_storage import SQLiteStorage
+
+READS_PER_USER = 5  # обновлений без состояния (меню, статистика)
+ANSWERS_PER_USER = 10
+
+async def user_flow(storage, user_id: int) -> int:
+    """Путь одного пользователя. Возвращает число операций с хранилищем"""
+    state = FSMContext(storage, StorageKey(bot_id=1, chat_id=user_id, user_id=user_id))
+    for _ in range(READS_PER_USER):
+        await state.get_state()
+    await state.update_data(level=3)
+    await state.set_state("LearningStates:solving_problem")
+    for _ in range(ANSWERS_PER_USER):
+        await state.get_state()
+    await state.clear()
+    return READS_PER_USER + 2 + ANSWERS_PER_USER + 2
+
+async def run(kind: str, users: int, trace_memory: bool) -> dict:
+    """Один проход на свежем хранилище: время (без tracemalloc) или оставшаяся память"""
+    db = None
+    if kind == "sqlite":
+        db = Database(f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_fsm.db')}")
+        await db.init_db()
+        storage = SQLiteStorage(db, cache_size=users // 10)
+        storage.start()
+    else:
+        storage = MemoryStorage()
+    
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    operations = 0
+    for user_id in range(1, users + 1):
+        operations += await user_flow(storage, user_id)
+    elapsed = time.perf_counter() - started
+    if kind == "sqlite":
+        await storage.flush()
+    
+    result = {"us_per_op": elapsed / operations * 1e6}
+    if trace_memory:
+        gc.collect()
+        result["retained"] = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+    if kind == "sqlite":
+        stats = storage.stats()
+        result.update(hit_rate=stats["hit_rate"], writes=stats["writes"], rows=stats["rows_written"])
+        await storage.close()
+        await db.close()
+    return result
+
+async def main(users: int):
+    print(f"Пользователей: {users}, операций на пользователя: {READS_PER_USER + ANSWERS_PER_USER + 4}")
+    print(f"{'хранилище':>9} | {'мкс/операция':>12} | {'память после, КБ':>16} | "
+          f"{'попаданий, %':>12} | {'изменений':>9} | {'записей в БД':>12}")
+    for kind in ("memory", "sqlite"):
+        result = await run(kind, users, trace_memory=False)
+        result["retained"] = (await run(kind, users, trace_memory=True))["retained"]
+        print(f"{kind:>9} | {result['us_per_op']:>12.1f} | {result['retained'] / 1024:>16.0f} | "
+              f"{result.get('hit_rate', '-'):>12} | {result.get('writes', '-'):>9} | {result.get('rows', '-'):>12}")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
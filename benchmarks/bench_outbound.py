@@ -0,0 +1,109 @@
+"""Бенчмарк исходящих запросов: прямые вызовы против OutboundScheduler
+
+Запуск: python -m benchmarks.bench_outbound [чатов в сессии] [секунд] [сообщений рассылки]
+
+Фейковый Bot API ограничивает частоту как Telegram (общее ведро на
+OUTBOUND_GLOBAL_RATE сообщений в секунду и ведро на каждый чат) и на
+превышение отвечает RetryAfter. Нагрузка: активные сессии редактируют
+задачу раз в секунду (приоритет interactive), одновременно в начале идет
+рассылка фото по другим чатам (приоритет bulk). Меряем задержку по классам и
+число отказов.
+"""
+import asyncio
+import sys
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendPhoto
+
+from config import Config
+from middlewares.outbound import OutboundScheduler, TokenBucket
+
+API_LATENCY = 0.02  # секунд на запрос
+
+class FakeLimitedApi:
+    """Bot API с лимитами: RetryAfter при исчерпании общего ведра или ведра чата"""
+    
+    def __init__(self):
+        self.global_bucket = TokenBucket(Config.OUTBOUND_GLOBAL_RATE, Config.OUTBOUND_GLOBAL_RATE)
+        self.chats = {}
+        self.accepted = 0
+        self.rejected = 0
+    
+    async def __call__(self, bot, method):
+        now = time.monotonic()
+        chat = self.chats.get(method.chat_id)
+        if chat is None:
+            chat = self.chats[method.chat_id] = TokenBucket(Config.OUTBOUND_CHAT_RATE, Config.OUTBOUND_CHAT_BURST)
+        if self.global_bucket.wait_time(1, now) or chat.wait_time(1, now):
+            self.rejected += 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+        self.global_bucket.take(1)
+        chat.take(1)
+        self.accepted += 1
+        await asyncio.sleep(API_LATENCY)
+        return True
+
+async def run(mode: str, chats: int, seconds: int, broadcast: int) -> dict:
+    api = FakeLimitedApi()
+    scheduler = OutboundScheduler(
+        global_rate=Config.OUTBOUND_GLOBAL_RATE, chat_rate=Config.OUTBOUND_CHAT_RATE,
+        chat_burst=Config.OUTBOUND_CHAT_BURST, max_retries=Config.OUTBOUND_MAX_RETRIES
+    )
+    latencies = {"interactive": [], "bulk": []}
+    failed = {"interactive": 0, "bulk": 0}
+    
+    async def call(kind: str, method):
+        started = time.perf_counter()
+        try:
+            if mode == "scheduler":
+                await scheduler(api, None, method)
+            else:
+                await api(None, method)
+        except TelegramRetryAfter:
+            failed[kind] += 1  # как сейчас в обработчиках: предупреждение в лог, сообщение потеряно
+            return
+        latencies[kind].append(time.perf_counter() - started)
+    
+    async def session(chat_id: int):
+        for _ in range(seconds):
+            await call("interactive", EditMessageText(chat_id=chat_id, message_id=1, text="задача"))
+            await asyncio.sleep(1)
+    
+    async def mailing():
+        await asyncio.gather(*(
+            call("bulk", SendPhoto(chat_id=100000 + i, photo="photo_file_id")) for i in range(broadcast)
+        ))
+    
+    started = time.perf_counter()
+    await asyncio.gather(mailing(), *(session(chat_id) for chat_id in range(1, chats + 1)))
+    elapsed = time.perf_counter() - started
+    await scheduler.stop()
+    
+    result = {"elapsed": elapsed, "rejected": api.rejected, "failed": failed}
+    for kind, values in latencies.items():
+        values.sort()
+        result[kind] = (
+            values[len(values) // 2] * 1000 if values else 0.0,
+            values[int(len(values) * 0.99)] * 1000 if values else 0.0
+        )
+    return result
+
+async def main(chats: int, seconds: int, broadcast: int):
+    print(f"Сессий: {chats} (правка раз в секунду, {seconds} с), рассылка: {broadcast}, "
+          f"лимит: {Config.OUTBOUND_GLOBAL_RATE:.0f}/с всего, {Config.OUTBOUND_CHAT_RATE:g}/с в чат")
+    print(f"{'режим':>9} | {'время, с':>8} | {'RetryAfter':>10} | {'потеряно':>8} | "
+          f"{'interactive p50/p99, мс':>23} | {'bulk p50/p99, мс':>17}")
+    for mode in ("direct", "scheduler"):
+        result = await run(mode, chats, seconds, broadcast)
+        interactive = "{:.0f} / {:.0f}".format(*result["interactive"])
+        bulk = "{:.0f} / {:.0f}".format(*result["bulk"])
+        lost = sum(result["failed"].values())
+        print(f"{mode:>9} | {result['elapsed']:>8.1f} | {result['rejected']:>10} | {lost:>8} | "
+              f"{interactive:>23} | {bulk:>17}")
+
+if __name__ == "__main__":
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    broadcast = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    asyncio.run(main(chats, seconds, broadcast))
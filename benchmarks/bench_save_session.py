@@ -0,0 +1,91 @@
+"""Бенчмарк сохранения сессии: ORM unit-of-work против пакетной вставки Core
+
+Запуск: python -m benchmarks.bench_save_session [количество_сессий]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_save_session.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+from database.database import Database
+from database.models import User, LearningSession, Problem
+from utils.answer_log import AnswerLog
+from utils.problem_codec import encode
+
+PROBLEM_COUNTS = (5, 20, 100)
+
+def make_problems(count: int) -> AnswerLog:
+    """Сгенерировать ответы для одной сессии"""
+    answers = AnswerLog()
+    for i in range(count):
+        answers.add(encode([i, i], ["+"]), i * 2, i * 2, 3.5)
+    return answers
+
+async def save_orm(db: Database, user_id: int, level: int, answers: AnswerLog, total_time: float):
+    """Прежний путь: ORM-объект на каждую задачу и flush ради ID сессии"""
+    async with db.async_session() as session:
+        learning_session = LearningSession(
+            user_id=user_id,
+            level=level,
+            problems_solved=len(answers),
+            correct_answers=answers.correct,
+            total_time=total_time,
+            completed=True,
+            finished_at=datetime.utcnow()
+        )
+        session.add(learning_session)
+        await session.flush()
+        
+        for code, answer, expected, is_correct, time_taken in answers.rows():
+            session.add(Problem(
+                session_id=learning_session.id,
+                level=level,
+                problem_code=code,
+                correct_answer=expected,
+                user_answer=answer,
+                is_correct=bool(is_correct),
+                time_taken=time_taken,
+                answered_at=datetime.utcnow()
+            ))
+        await session.commit()
+
+async def save_core(db: Database, user_id: int, level: int, answers: AnswerLog, total_time: float):
+    """Новый путь: INSERT ... RETURNING и один executemany для задач"""
+    async with db.async_session() as session:
+        await db._insert_session_rows(session, user_id, level, answers, total_time)
+        await session.commit()
+
+async def run_case(db: Database, user_id: int, saver, problems_count: int, sessions: int) -> float:
+    """Сохранить sessions сессий и вернуть число сессий в секунду"""
+    answers = make_problems(problems_count)
+    started = time.perf_counter()
+    for _ in range(sessions):
+        await saver(db, user_id, 1, answers, 60.0)
+    return sessions / (time.perf_counter() - started)
+
+async def main(sessions: int):
+    db = Database()
+    await db.init_db()
+    
+    async with db.async_session() as session:
+        user = User(telegram_id=1, first_name="bench")
+        session.add(user)
+        await session.commit()
+        user_id = user.id
+    
+    print(f"Сессий на замер: {sessions}, БД: {DB_PATH}")
+    print(f"{'задач':>6} | {'ORM, сессий/с':>14} | {'Core, сессий/с':>15} | {'ускорение':>9}")
+    for problems_count in PROBLEM_COUNTS:
+        orm_rate = await run_case(db, user_id, save_orm, problems_count, sessions)
+        core_rate = await run_case(db, user_id, save_core, problems_count, sessions)
+        print(f"{problems_count:>6} | {orm_rate:>14.1f} | {core_rate:>15.1f} | {core_rate / orm_rate:>8.2f}x")
+    
+    await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
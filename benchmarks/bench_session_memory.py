@@ -0,0 +1,80 @@
+"""Бенчмарк памяти активных сессий: прежний LearningSession со словарями против __slots__ и AnswerLog
+
+Запуск: python -m benchmarks.bench_session_memory [сессий]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from handlers.learning_handlers import LearningSession
+
+PROBLEM_COUNTS = (5, 20)
+
+class LegacySession:
+    """Прежнее представление: атрибуты в __dict__ и словарь на каждый ответ"""
+    
+    def __init__(self, user_id: int, level: int, total_problems: int, time_per_problem: int):
+        self.user_id = user_id
+        self.level = level
+        self.current_problem = 0
+        self.correct_answers = 0
+        self.total_problems = total_problems
+        self.time_per_problem = time_per_problem
+        self.start_time = time.time()
+        self.problems_data = []
+        self.current_problem_start = None
+        self.is_paused = False
+        self.timer_task = None
+    
+    def add_answer(self, user_answer: int, correct_answer: int, time_taken: float, problem_text: str = ""):
+        is_correct = user_answer == correct_answer
+        if is_correct:
+            self.correct_answers += 1
+        self.problems_data.append({
+            'problem_text': problem_text,
+            'user_answer': user_answer,
+            'correct_answer': correct_answer,
+            'is_correct': is_correct,
+            'time_taken': time_taken
+        })
+
+def fill_legacy(user_id: int, problems: int) -> LegacySession:
+    session = LegacySession(user_id, 5, problems, 30)
+    for i in range(problems):
+        # Текст задачи собирается заново для каждой задачи, как в генераторе
+        a, b, c = 10 + i, 7 + i, 3 + i
+        session.current_correct_answer = a + b + c
+        session.current_problem_text = f"{a} + {b} + {c} = ?"
+        session.add_answer(a + b + c + i % 2, a + b + c, 3.25 + i, session.current_problem_text)
+    return session
+
+def fill_compact(user_id: int, problems: int) -> LearningSession:
+    # Задачи берутся из плана сессии, текст собирается при выдаче
+    session = LearningSession(user_id, 5, problems, 30)
+    for i in range(problems):
+        session.next_problem()
+        session.add_answer(session.current_correct_answer + i % 2, 3.25 + i)
+    return session
+
+def measure(factory, sessions: int, problems: int) -> float:
+    """Байт памяти на одну заполненную сессию"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    active = {user_id: factory(user_id, problems) for user_id in range(sessions)}
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del active
+    return (after - before) / sessions
+
+def main(sessions: int):
+    print(f"Активных сессий: {sessions}")
+    print(f"{'задач':>6} | {'прежняя, байт':>13} | {'компактная, байт':>16} | {'экономия':>8}")
+    for problems in PROBLEM_COUNTS:
+        legacy = measure(fill_legacy, sessions, problems)
+        compact = measure(fill_compact, sessions, problems)
+        print(f"{problems:>6} | {legacy:>13.0f} | {compact:>16.0f} | {legacy / compact:>7.2f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,84 @@
+"""Бенчмарк профилей SQLite: настройки по умолчанию против production (WAL и прагмы)
+
+Запуск: python -m benchmarks.bench_sqlite_profile [пользователей]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from database.database import Database
+from utils.answer_log import AnswerLog
+from utils.problem_codec import encode
+
+PROBLEMS_PER_SESSION = 20
+CONCURRENCY = 50
+
+def make_problems() -> AnswerLog:
+    """Ответы одной сессии"""
+    answers = AnswerLog()
+    for i in range(PROBLEMS_PER_SESSION):
+        answers.add(encode([i, i], ["+"]), i * 2 if i % 4 else i * 2 + 1, i * 2, 4.0)
+    return answers
+
+async def gather_limited(coros, limit: int):
+    """Выполнить корутины не более limit одновременно"""
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def run(coro):
+        async with semaphore:
+            try:
+                await coro
+                return True
+            except Exception:
+                # "database is locked" и подобные ошибки считаем неудачными операциями
+                return False
+    
+    results = await asyncio.gather(*(run(coro) for coro in coros))
+    return sum(results), len(results) - sum(results)
+
+async def run_profile(profile: str, users: int) -> dict:
+    """Замерить запись и чтение для одного профиля на свежей БД"""
+    path = os.path.join(tempfile.mkdtemp(), f"bench_{profile}.db")
+    db = Database(f"sqlite+aiosqlite:///{path}", profile=profile)
+    await db.init_db()
+    
+    for telegram_id in range(1, users + 1):
+        await db.get_or_create_user(telegram_id, first_name=f"user{telegram_id}")
+    
+    problems = make_problems()
+    started = time.perf_counter()
+    written, write_errors = await gather_limited(
+        (db.finalize_session(telegram_id, 1, problems, 60.0) for telegram_id in range(1, users + 1)),
+        CONCURRENCY
+    )
+    writes = written / (time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    read, read_errors = await gather_limited(
+        (db.get_user_stats(telegram_id) for telegram_id in range(1, users + 1)),
+        CONCURRENCY
+    )
+    reads = read / (time.perf_counter() - started)
+    
+    await db.close()
+    return {"writes": writes, "write_errors": write_errors, "reads": reads, "read_errors": read_errors}
+
+async def main(users: int):
+    print(f"Пользователей: {users}, задач в сессии: {PROBLEMS_PER_SESSION}, параллельно: {CONCURRENCY}")
+    results = {}
+    for profile in ("default", "production"):
+        results[profile] = await run_profile(profile, users)
+    
+    print(f"{'профиль':>11} | {'запись, сессий/с':>17} | {'ошибок':>6} | {'чтение статистики/с':>20} | {'ошибок':>6}")
+    for profile, result in results.items():
+        print(f"{profile:>11} | {result['writes']:>17.1f} | {result['write_errors']:>6} | "
+              f"{result['reads']:>20.1f} | {result['read_errors']:>6}")
+    
+    default, production = results["default"], results["production"]
+    print(f"Ускорение: запись {production['writes'] / default['writes']:.2f}x, "
+          f"чтение {production['reads'] / default['reads']:.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,111 @@
+"""Бенчмарк таймеров сессий: задача asyncio на каждый таймер против DeadlineScheduler
+
+Запуск: python -m benchmarks.bench_timers [сессий ...]
+
+Две фазы для каждого количества сессий:
+  ответы   - у всех сессий таймер на 60 с, затем ROUNDS раз ответ: отмена и новый таймер
+  дедлайны - все таймеры срабатывают в течение секунды, меряем опоздание срабатывания
+"""
+import asyncio
+import sys
+import time
+
+from utils.deadline_scheduler import DeadlineScheduler
+
+ROUNDS = 3
+SPREAD = 1.0  # секунд, по которым распределены дедлайны во второй фазе
+
+class TaskTimers:
+    """Прежний подход: asyncio.create_task(sleep) на каждую задачу, cancel на каждый ответ"""
+    
+    def __init__(self, callback):
+        self.callback = callback
+        self._tasks = {}
+    
+    async def _sleep(self, key, delay, payload):
+        try:
+            await asyncio.sleep(delay)
+            self._tasks.pop(key, None)
+            await self.callback([(key, payload)])
+        except asyncio.CancelledError:
+            pass
+    
+    def schedule(self, key, delay, payload=None):
+        self.cancel(key)
+        self._tasks[key] = asyncio.create_task(self._sleep(key, delay, payload))
+    
+    def cancel(self, key):
+        task = self._tasks.pop(key, None)
+        if task:
+            task.cancel()
+    
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        await asyncio.sleep(0)
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+async def run(kind: str, sessions: int) -> dict:
+    loop = asyncio.get_running_loop()
+    lateness = []
+    done = asyncio.Event()
+    
+    async def on_fired(batch):
+        now = loop.time()
+        lateness.extend(now - deadline for _, deadline in batch)
+        if len(lateness) >= sessions:
+            done.set()
+    
+    timers = DeadlineScheduler(on_fired) if kind == "scheduler" else TaskTimers(on_fired)
+    
+    # Фаза 1: постановка и перепостановка таймеров при ответах
+    started = time.perf_counter()
+    for key in range(sessions):
+        timers.schedule(key, 60, None)
+    for _ in range(ROUNDS):
+        for key in range(sessions):
+            timers.schedule(key, 60, None)
+    await asyncio.sleep(0)  # даем отмененным задачам завершиться
+    churn = time.perf_counter() - started
+    tasks_after_churn = len(asyncio.all_tasks())
+    
+    # Фаза 2: массовое срабатывание
+    for key in range(sessions):
+        timers.cancel(key)
+    await asyncio.sleep(0)
+    base = loop.time() + 0.2
+    started = time.perf_counter()
+    for key in range(sessions):
+        deadline = base + SPREAD * key / sessions
+        timers.schedule(key, deadline - loop.time(), deadline)
+    peak_tasks = len(asyncio.all_tasks())
+    await asyncio.wait_for(done.wait(), timeout=60 + SPREAD)
+    fire = time.perf_counter() - started
+    
+    await timers.stop()
+    return {
+        "ops": sessions * (ROUNDS + 1) / churn,
+        "tasks": tasks_after_churn,
+        "peak_tasks": peak_tasks,
+        "p50": percentile(lateness, 0.5) * 1000,
+        "p99": percentile(lateness, 0.99) * 1000,
+        "fire": fire
+    }
+
+async def main(counts: list):
+    print(f"{'сессий':>7} | {'подход':>9} | {'постановок/с':>12} | {'задач':>7} | {'пик задач':>9} | "
+          f"{'опоздание p50, мс':>17} | {'p99, мс':>8} | {'фаза 2, с':>9}")
+    for sessions in counts:
+        for kind in ("tasks", "scheduler"):
+            result = await run(kind, sessions)
+            print(f"{sessions:>7} | {kind:>9} | {result['ops']:>12.0f} | {result['tasks']:>7} | "
+                  f"{result['peak_tasks']:>9} | {result['p50']:>17.1f} | {result['p99']:>8.1f} | "
+                  f"{result['fire']:>9.2f}")
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    asyncio.run(main(counts))
@@ -0,0 +1,214 @@
+"""Бенчмарк получения обновлений: поллинг против вебхука на локальном фейковом Bot API
+
+Запуск: python -m benchmarks.bench_webhook [обновлений] [задержка API, мс]
+
+Фейковый сервер отвечает на getMe, getUpdates (пачками до 100) и на любой
+другой метод - ответом сообщения с заданной задержкой (как сетевой путь до
+Telegram). Обработчик на каждое обновление отправляет одно сообщение. Фейковый API и
+доставка обновлений работают в отдельных процессах, чтобы не отнимать у бота
+цикл событий. В режиме вебхука обновления доставляются POST-запросами в
+WEBHOOK_MAX_CONNECTIONS соединений и повторяются при 503, как это делает Telegram.
+"""
+import asyncio
+import json
+import multiprocessing
+import socket
+import sys
+import time
+
+from aiohttp import ClientSession, web
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+from config import Config
+from utils.webhook_server import WebhookServer
+
+TOKEN = "42:bench"
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def make_update(update_id: int) -> dict:
+    user = {"id": update_id, "is_bot": False, "first_name": f"user{update_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": "42",
+            "chat": {"id": update_id, "type": "private"}, "from": user
+        }
+    }
+
+class FakeBotApi:
+    """Минимальный Bot API: очередь обновлений для getUpdates и задержка на остальные методы"""
+
+    def __init__(self, updates: list, latency: float):
+        self.updates = updates
+        self.latency = latency
+        self.calls = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(f"/bot{TOKEN}/{{method}}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await request.post()
+        if method == "getme":
+            result = BOT_USER
+        elif method == "getupdates":
+            offset = int(params.get("offset") or 0)
+            batch = [update for update in self.updates if update["update_id"] >= offset][:100]
+            if not batch:
+                await asyncio.sleep(0.05)  # длинный опрос без новых обновлений
+            result = batch
+        else:
+            self.calls += 1
+            await asyncio.sleep(self.latency)
+            result = {
+                "message_id": self.calls, "date": int(time.time()), "text": params.get("text", ""),
+                "chat": {"id": int(params.get("chat_id") or 0), "type": "private"}, "from": BOT_USER
+            }
+        return web.json_response({"ok": True, "result": result})
+
+def make_dispatcher(total: int, done: asyncio.Event) -> Dispatcher:
+    router = Router()
+    handled = 0
+
+    @router.message()
+    async def reply(message: Message):
+        nonlocal handled
+        await message.answer("ok")
+        handled += 1
+        if handled >= total:
+            done.set()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+async def start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+def make_bot(api_port: int) -> Bot:
+    api = TelegramAPIServer.from_base(f"http://127.0.0.1:{api_port}")
+    return Bot(TOKEN, session=AiohttpSession(api=api))
+
+def serve_fake_api(port: int, total: int, latency: float):
+    """Процесс фейкового Bot API (отдельный процесс - не делит цикл событий с ботом)"""
+    async def serve():
+        await start_site(FakeBotApi([make_update(i) for i in range(1, total + 1)], latency).app(), port)
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+def deliver_updates(port: int, total: int, connections: int, results: multiprocessing.Queue):
+    """Процесс "Telegram": доставляет обновления в вебхук, повторяет при отказе"""
+    async def deliver_all():
+        pending = asyncio.Queue()
+        for update_id in range(1, total + 1):
+            pending.put_nowait(json.dumps(make_update(update_id)))
+        response_times = []
+        retries = 0
+        
+        async def deliver(session: ClientSession):
+            nonlocal retries
+            while not pending.empty():
+                body = pending.get_nowait()
+                sent = time.perf_counter()
+                async with session.post(f"http://127.0.0.1:{port}/webhook", data=body,
+                                        headers={"Content-Type": "application/json"}) as response:
+                    response_times.append(time.perf_counter() - sent)
+                    if response.status != 200:
+                        retries += 1
+                        await asyncio.sleep(0.05)
+                        pending.put_nowait(body)
+        
+        async with ClientSession() as session:
+            await asyncio.gather(*(deliver(session) for _ in range(connections)))
+        response_times.sort()
+        results.put((
+            response_times[len(response_times) // 2] * 1000,
+            response_times[int(len(response_times) * 0.99)] * 1000,
+            retries
+        ))
+    asyncio.run(deliver_all())
+
+async def wait_for_port(port: int):
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+
+async def run_polling(total: int, latency: float) -> dict:
+    api_port = free_port()
+    api = multiprocessing.Process(target=serve_fake_api, args=(api_port, total, latency), daemon=True)
+    api.start()
+    await wait_for_port(api_port)
+    done = asyncio.Event()
+    dp = make_dispatcher(total, done)
+    bot = make_bot(api_port)
+    
+    started, cpu_started = time.perf_counter(), time.process_time()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    await done.wait()
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    await dp.stop_polling()
+    await polling
+    
+    await bot.session.close()
+    api.terminate()
+    return {"rate": total / elapsed, "cpu": cpu / total * 1e6, "p50": None, "p99": None, "retries": 0}
+
+async def run_webhook(total: int, latency: float) -> dict:
+    api_port, hook_port = free_port(), free_port()
+    api = multiprocessing.Process(target=serve_fake_api, args=(api_port, 0, latency), daemon=True)
+    api.start()
+    await wait_for_port(api_port)
+    done = asyncio.Event()
+    dp = make_dispatcher(total, done)
+    bot = make_bot(api_port)
+    server = WebhookServer(dp, bot, queue_size=Config.WEBHOOK_QUEUE_SIZE, workers=Config.WEBHOOK_WORKERS)
+    await server.start("127.0.0.1", hook_port)
+    
+    results = multiprocessing.Queue()
+    telegram = multiprocessing.Process(
+        target=deliver_updates, args=(hook_port, total, Config.WEBHOOK_MAX_CONNECTIONS, results), daemon=True
+    )
+    started, cpu_started = time.perf_counter(), time.process_time()
+    telegram.start()
+    await done.wait()
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    p50, p99, retries = await asyncio.get_running_loop().run_in_executor(None, results.get)
+    telegram.join()
+    
+    await server.stop()
+    await bot.session.close()
+    api.terminate()
+    return {"rate": total / elapsed, "cpu": cpu / total * 1e6, "p50": p50, "p99": p99, "retries": retries}
+
+async def main(total: int, latency_ms: float):
+    print(f"Обновлений: {total}, задержка API: {latency_ms:.0f} мс, обработчиков вебхука: "
+          f"{Config.WEBHOOK_WORKERS}, очередь: {Config.WEBHOOK_QUEUE_SIZE}, "
+          f"соединений: {Config.WEBHOOK_MAX_CONNECTIONS}")
+    print(f"{'режим':>8} | {'обновлений/с':>12} | {'CPU бота, мкс/обн.':>18} | {'ответ p50, мс':>13} | {'ответ p99, мс':>13} | {'повторов':>8}")
+    for name, run in (("polling", run_polling), ("webhook", run_webhook)):
+        result = await run(total, latency_ms / 1000)
+        p50 = f"{result['p50']:.2f}" if result["p50"] is not None else "-"
+        p99 = f"{result['p99']:.2f}" if result["p99"] is not None else "-"
+        print(f"{name:>8} | {result['rate']:>12.0f} | {result['cpu']:>18.0f} | {p50:>13} | {p99:>13} | {result['retries']:>8}")
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    asyncio.run(main(total, latency_ms))
@@ -0,0 +1,90 @@
+"""Проверка планов горячих запросов: EXPLAIN QUERY PLAN должен показывать индексы
+
+Запуск: python -m benchmarks.query_plans
+Завершается с кодом 1, если какой-то запрос сканирует таблицу без индекса.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import sqlite
+
+from database.database import Database
+from database.models import User, LearningSession, Problem, Achievement, UserAchievement, UserSettings, UserStats
+
+def hot_queries() -> list:
+    """(название, запрос, индексы, которые он должен использовать)"""
+    return [
+        (
+            "профиль: пользователь и настройки сессии",
+            select(User.id, User.current_level, User.total_score,
+                   UserSettings.time_per_problem, UserSettings.problems_per_session)
+            .outerjoin(UserSettings, UserSettings.user_id == User.id)
+            .where(User.telegram_id == 1),
+            ("ix_users_telegram_id", "sqlite_autoindex_user_settings_1")
+        ),
+        (
+            "статистика: пользователь и user_stats",
+            select(User, UserStats)
+            .outerjoin(UserStats, UserStats.user_id == User.id)
+            .where(User.telegram_id == 1),
+            ("ix_users_telegram_id", "INTEGER PRIMARY KEY")
+        ),
+        (
+            "достижения: полученные пользователем",
+            select(UserAchievement.achievement_id).where(UserAchievement.user_id == 1),
+            ("ix_user_achievements_user_id",)
+        ),
+        (
+            "достижения: список с описаниями",
+            select(Achievement, UserAchievement.earned_at)
+            .join(UserAchievement, UserAchievement.achievement_id == Achievement.id)
+            .join(User, User.id == UserAchievement.user_id)
+            .where(User.telegram_id == 1)
+            .order_by(UserAchievement.earned_at),
+            ("ix_users_telegram_id", "ix_user_achievements_user_id")
+        ),
+        (
+            "сброс: удаление задач пользователя",
+            delete(Problem).where(Problem.session_id.in_(
+                select(LearningSession.id).where(LearningSession.user_id == 1)
+            )),
+            ("ix_problems_session_id", "ix_learning_sessions_user_id")
+        ),
+        (
+            "сброс: удаление сессий пользователя",
+            delete(LearningSession).where(LearningSession.user_id == 1),
+            ("ix_learning_sessions_user_id",)
+        ),
+    ]
+
+def compile_sql(statement) -> str:
+    """SQL запроса с подставленными значениями"""
+    return str(statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+
+async def main() -> bool:
+    path = os.path.join(tempfile.mkdtemp(), "plans.db")
+    db = Database(f"sqlite+aiosqlite:///{path}")
+    await db.init_db()
+    
+    ok = True
+    try:
+        async with db.engine.connect() as conn:
+            for name, statement, indexes in hot_queries():
+                result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + compile_sql(statement))
+                plan = [row[-1] for row in result.all()]
+                used = all(any(index in line for line in plan) for index in indexes)
+                ok = ok and used
+                print(f"{'OK ' if used else 'НЕТ'} {name}: ожидается {', '.join(indexes)}")
+                for line in plan:
+                    print(f"      {line}")
+    finally:
+        await db.close()
+    
+    print("Все запросы используют индексы" if ok else "Есть запросы без нужного индекса")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -10,11 +10,86 @@ class Config:
     BOT_TOKEN = os.getenv("BOT_TOKEN")
     ADMIN_ID = int(os.getenv("ADMIN_ID", 0))
     
+    # Получение обновлений: "polling" (getUpdates) или "webhook" (встроенный сервер aiohttp)
+    BOT_MODE = os.getenv("BOT_MODE", "polling")
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # публичный адрес, например https://bot.example.com
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+    WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))  # при заполнении отвечаем 503
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 32))  # одновременно обрабатываемых обновлений
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))  # соединений от Telegram
+    
+    # Несколько процессов: супервизор принимает обновления и раздает их обработчикам по telegram_id % WORKERS
+    WORKERS = int(os.getenv("WORKERS", 0))  # 0 или 1 - все в одном процессе
+    WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", 1000))  # обновлений в очереди шарда у супервизора
+    WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 32))  # одновременно обрабатываемых в шарде
+    LEADERBOARD_REFRESH_INTERVAL = int(os.getenv("LEADERBOARD_REFRESH_INTERVAL", 60))  # секунд, при WORKERS > 1
+    
+    # Обновления одного чата обрабатываются по очереди, разных чатов - параллельно
+    CHAT_QUEUE_MAX_PENDING = int(os.getenv("CHAT_QUEUE_MAX_PENDING", 5))  # сверх этого обновления чата отбрасываются
+    
+    # Исходящие запросы к Bot API: ведра токенов и повтор после RetryAfter
+    OUTBOUND_ENABLED = os.getenv("OUTBOUND_ENABLED", "True").lower() == "true"
+    OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 30))  # сообщений в секунду на бота
+    OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", 1))  # сообщений в секунду в личный чат
+    OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", 5))  # запас сообщений в личный чат
+    OUTBOUND_GROUP_RATE_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", 20))  # в группу
+    OUTBOUND_GROUP_BURST = float(os.getenv("OUTBOUND_GROUP_BURST", 5))
+    OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))  # повторов после RetryAfter
+    
     # База данных
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///mental_math_bot.db")
     
+    # Профиль SQLite: "production" (WAL, прагмы, пул соединений) или "default" (как есть)
+    SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))  # байт
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -64000))  # отрицательное значение - в КиБ
+    SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))  # мс
+    SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    SQLITE_AUTO_VACUUM = os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL")  # действует только для новой БД
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 1))  # SQLite пишет в один поток - одного соединения достаточно
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 0))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # секунд
+    DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 4))  # читатели WAL для статистики и рейтинга
+    DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", 4))
+    
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
     
+    # Кэш горячих профилей пользователей (LRU)
+    PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 10000))
+    
+    # Отложенная пакетная запись завершенных сессий
+    WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "False").lower() == "true"
+    WRITE_BEHIND_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", 50))  # период сброса
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 100))  # сессий в транзакции
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 1000))  # предел очереди
+    
+    # Архивация старых задач: сводка по дням в БД, исходные строки - в сжатые файлы
+    ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "False").lower() == "true"
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))  # возраст задач для архивации
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+    ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", 2000))  # задач в одной транзакции
+    ARCHIVE_INTERVAL_HOURS = int(os.getenv("ARCHIVE_INTERVAL_HOURS", 24))
+    
+    # Брошенные сессии: парковка после истечений времени подряд и вытеснение из памяти
+    ABANDON_AFTER_TIMEOUTS = int(os.getenv("ABANDON_AFTER_TIMEOUTS", 2))  # 0 - не парковать
+    SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", 1800))  # секунд без ответов
+    SESSION_REAPER_INTERVAL = int(os.getenv("SESSION_REAPER_INTERVAL", 60))  # секунд между обходами
+    
+    # Снимки незавершенных сессий: восстановление после перезапуска бота
+    SESSION_SNAPSHOTS_ENABLED = os.getenv("SESSION_SNAPSHOTS_ENABLED", "True").lower() == "true"
+    SESSION_SNAPSHOT_INTERVAL_MS = int(os.getenv("SESSION_SNAPSHOT_INTERVAL_MS", 200))  # период записи
+    
+    # Хранилище состояний FSM: "sqlite" (в БД с LRU-кэшем) или "memory" (MemoryStorage aiogram)
+    FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+    FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", 10000))  # ключей в памяти
+    FSM_TTL_HOURS = int(os.getenv("FSM_TTL_HOURS", 168))  # неиспользуемые состояния удаляются
+    FSM_FLUSH_INTERVAL_MS = int(os.getenv("FSM_FLUSH_INTERVAL_MS", 200))  # период записи в БД
+    
     # Настройки обучения
     MAX_LEVEL = 10
     PROBLEMS_PER_LEVEL = 5
@@ -35,4 +110,8 @@ class Config:
             raise ValueError("BOT_TOKEN не установлен в переменных окружения!")
         if not cls.ADMIN_ID:
             raise ValueError("ADMIN_ID не установлен в переменных окружения!")
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(f"Неизвестный BOT_MODE: {cls.BOT_MODE}")
+        if cls.BOT_MODE == "webhook" and not cls.WEBHOOK_URL:
+            raise ValueError("Для BOT_MODE=webhook нужен WEBHOOK_URL!")
         return True 
\ No newline at end of file
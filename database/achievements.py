@@ -0,0 +1,49 @@
+"""Инкрементальная проверка достижений по счетчикам пользователя
+
+Счетчики (серия правильных ответов, лучшая серия, самый быстрый правильный
+ответ, всего задач) хранятся в user_stats и обновляются только ответами
+последней сессии, поэтому проверка не зависит от длины истории.
+"""
+from typing import Iterable, List
+
+from utils.answer_log import AnswerLog
+
+def count_answer(stats, is_correct: bool, time_taken: float):
+    """Учесть один ответ в счетчиках серии и скорости"""
+    if is_correct:
+        stats.current_streak += 1
+        if stats.current_streak > stats.max_streak:
+            stats.max_streak = stats.current_streak
+        
+        if stats.fastest_correct is None or time_taken < stats.fastest_correct:
+            stats.fastest_correct = time_taken
+    else:
+        stats.current_streak = 0
+
+def update_counters(stats, answers: AnswerLog):
+    """Обновить счетчики по ответам только что завершенной сессии"""
+    for is_correct, time_taken in answers.results():
+        count_answer(stats, is_correct, time_taken)
+
+def is_earned(achievement, stats, level: int) -> bool:
+    """Проверить условие достижения по счетчикам пользователя"""
+    if achievement.condition_type == "level":
+        return level >= achievement.condition_value
+    
+    if achievement.condition_type == "total":
+        return stats.total_problems >= achievement.condition_value
+    
+    if achievement.condition_type == "speed":
+        return stats.fastest_correct is not None and stats.fastest_correct <= achievement.condition_value
+    
+    if achievement.condition_type == "streak":
+        return stats.max_streak >= achievement.condition_value
+    
+    return False
+
+def evaluate_achievements(achievements: Iterable, earned_ids: set, stats, level: int) -> List:
+    """Вернуть достижения, условия которых выполнены, но которые еще не выданы"""
+    return [
+        achievement for achievement in achievements
+        if achievement.id not in earned_ids and is_earned(achievement, stats, level)
+    ]
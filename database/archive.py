@@ -0,0 +1,180 @@
+"""Архивация старых задач из таблицы problems
+
+Задачи старше заданного возраста сворачиваются в дневную сводку
+problem_daily_rollups (пользователь, уровень, день: количество, правильных,
+сумма и минимум времени), а исходные строки выгружаются в сжатые файлы
+JSON Lines в каталоге архива и удаляются из БД.
+
+Работа идет порциями: порция читается через пул чтения и сначала пишется
+в файл, затем сводка и удаление выполняются одной короткой транзакцией
+писателя. Если процесс упадет между записью файла и коммитом, порция будет
+выгружена повторно при следующем запуске - сводка при этом не задвоится.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database.models import LearningSession, Problem, ProblemDailyRollup
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = (
+    "id", "session_id", "level", "problem_code", "correct_answer", "user_answer",
+    "is_correct", "time_taken", "created_at", "answered_at"
+)
+
+class ProblemArchiver:
+    """Периодическая архивация задач старше after_days дней"""
+    
+    def __init__(self, db, after_days: int = 90, archive_dir: str = "archive",
+                 chunk_size: int = 2000, interval_hours: int = 24):
+        self.db = db
+        self.after_days = after_days
+        self.archive_dir = archive_dir
+        self.chunk_size = chunk_size
+        self.interval = interval_hours * 3600
+        self._task = None
+        self.runs = 0
+        self.problems_archived = 0
+        self.last_run = None
+    
+    def start(self):
+        """Запустить периодическую архивацию"""
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Архивация задач включена: старше {self.after_days} дн., "
+                    f"каждые {self.interval // 3600} ч, каталог {self.archive_dir}")
+    
+    async def stop(self):
+        """Остановить периодическую архивацию"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.archive_once()
+            except Exception as e:
+                logger.error(f"Ошибка архивации задач: {e}")
+            await asyncio.sleep(self.interval)
+    
+    async def archive_once(self) -> int:
+        """Заархивировать все задачи старше порога. Возвращает число задач"""
+        cutoff = datetime.utcnow() - timedelta(days=self.after_days)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(
+            self.archive_dir, f"problems-{datetime.utcnow():%Y%m%d-%H%M%S}.jsonl.gz"
+        )
+        
+        archived = 0
+        after_id = 0
+        while True:
+            rows = await self._read_chunk(after_id, cutoff)
+            if not rows:
+                break
+            
+            last_id = rows[-1]["id"]
+            self._export(path, rows)
+            await self._rollup_and_delete(rows)
+            archived += len(rows)
+            after_id = last_id
+            # Отдаем управление: блокировка записи держится только на время порции
+            await asyncio.sleep(0)
+        
+        if archived:
+            await self._incremental_vacuum()
+            logger.info(f"Заархивировано задач: {archived} -> {path}")
+        
+        self.runs += 1
+        self.problems_archived += archived
+        self.last_run = datetime.utcnow()
+        return archived
+    
+    async def _read_chunk(self, after_id: int, cutoff: datetime) -> list:
+        """Очередная порция старых задач вместе с id пользователя"""
+        async with self.db.read_session() as session:
+            result = await session.execute(
+                select(LearningSession.user_id, Problem)
+                .join(LearningSession, Problem.session_id == LearningSession.id)
+                .where(Problem.id > after_id, Problem.created_at < cutoff)
+                .order_by(Problem.id)
+                .limit(self.chunk_size)
+            )
+            return [
+                dict({column: getattr(problem, column) for column in EXPORT_COLUMNS}, user_id=user_id)
+                for user_id, problem in result.all()
+            ]
+    
+    def _export(self, path: str, rows: list):
+        """Дописать порцию в сжатый файл архива"""
+        with gzip.open(path, "at", encoding="utf-8") as archive:
+            for row in rows:
+                archive.write(json.dumps(row, ensure_ascii=False, default=str))
+                archive.write("\n")
+    
+    def _rollup(self, rows: list) -> Dict[Tuple[int, int, object], dict]:
+        """Свернуть порцию задач по пользователю, уровню и дню"""
+        rollups = {}
+        for row in rows:
+            key = (row["user_id"], row["level"], row["created_at"].date())
+            time_taken = row["time_taken"] or 0.0
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = rollup = {
+                    "user_id": key[0], "level": key[1], "day": key[2],
+                    "count": 0, "correct": 0, "time_sum": 0.0, "min_time": time_taken
+                }
+            rollup["count"] += 1
+            rollup["correct"] += 1 if row["is_correct"] else 0
+            rollup["time_sum"] += time_taken
+            rollup["min_time"] = min(rollup["min_time"], time_taken)
+        return rollups
+    
+    async def _rollup_and_delete(self, rows: list):
+        """Добавить порцию в сводку и удалить её строки одной транзакцией"""
+        stmt = sqlite_insert(ProblemDailyRollup).values(list(self._rollup(rows).values()))
+        async with self.db.async_session() as session:
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[ProblemDailyRollup.user_id, ProblemDailyRollup.level,
+                                    ProblemDailyRollup.day],
+                    set_={
+                        "count": ProblemDailyRollup.count + stmt.excluded.count,
+                        "correct": ProblemDailyRollup.correct + stmt.excluded.correct,
+                        "time_sum": ProblemDailyRollup.time_sum + stmt.excluded.time_sum,
+                        "min_time": func.min(ProblemDailyRollup.min_time, stmt.excluded.min_time)
+                    }
+                )
+            )
+            await session.execute(
+                delete(Problem).where(Problem.id.in_([row["id"] for row in rows]))
+            )
+            await session.commit()
+    
+    async def _incremental_vacuum(self):
+        """Вернуть освободившиеся страницы файлу БД (при auto_vacuum=INCREMENTAL)"""
+        async with self.db.engine.connect() as conn:
+            # Прагма освобождает по странице на каждый шаг выполнения, а execute драйвера
+            # делает один шаг - executescript выполняет её до конца
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript("PRAGMA incremental_vacuum;")
+    
+    def stats(self) -> dict:
+        """Счетчики архивации"""
+        return {
+            "runs": self.runs,
+            "problems_archived": self.problems_archived,
+            "last_run": self.last_run
+        }
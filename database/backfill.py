@@ -0,0 +1,28 @@
+"""Разовая пересборка таблицы user_stats из истории сессий
+
+Запуск: python -m database.backfill
+"""
+import asyncio
+import logging
+import sys
+
+from database.database import db
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Пересобрать материализованную статистику всех пользователей"""
+    try:
+        await db.init_db()
+        count = await db.rebuild_user_stats()
+        logger.info(f"Бэкфилл завершен, обработано пользователей: {count}")
+    finally:
+        await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,124 +1,358 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import selectinload
-from sqlalchemy import select, update, delete
-from database.models import Base, User, LearningSession, Problem, Achievement, UserAchievement, UserSettings
+from sqlalchemy import select, update, delete, insert, func, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database.models import User, LearningSession, Problem, Achievement, UserAchievement, UserSettings, UserStats, DbMeta, ProblemDailyRollup
+from database.achievements import count_answer, evaluate_achievements
+from database.progress import SessionResult, calculate_progress, apply_session_stats, new_user_stats
+from database.leaderboard import LeaderboardIndex
+from database.profile_cache import ProfileCache
+from database.engine import create_database_engine, is_sqlite_file
+from database import migrations
+from utils.answer_log import AnswerLog
 from config import Config
 from datetime import datetime
+from typing import Optional
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Пакетная вставка задач из AnswerLog (параметры - кортежи, формат даты как у DateTime SQLAlchemy)
+INSERT_PROBLEMS_SQL = (
+    "INSERT INTO problems (session_id, level, problem_code, correct_answer, user_answer, "
+    "is_correct, time_taken, created_at, answered_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Увеличить ACHIEVEMENTS_SEED_VERSION при любом изменении списка - иначе запуск его пропустит
+ACHIEVEMENTS_SEED_VERSION = 1
+DEFAULT_ACHIEVEMENTS = [
+    ("Новичок", "Решите первую задачу", "🎯", "level", 1),
+    ("Ученик", "Достигните 3 уровня", "📚", "level", 3),
+    ("Эксперт", "Достигните 5 уровня", "🧠", "level", 5),
+    ("Мастер", "Достигните 7 уровня", "🏆", "level", 7),
+    ("Гений", "Достигните 10 уровня", "👑", "level", 10),
+    ("Скорость", "Решите задачу за 5 секунд", "⚡", "speed", 5),
+    ("Точность", "Решите 10 задач подряд правильно", "🎯", "streak", 10),
+    ("Выносливость", "Решите 50 задач", "💪", "total", 50),
+]
+
 class Database:
     """Класс для работы с базой данных"""
     
-    def __init__(self):
-        self.engine = create_async_engine(
-            Config.DATABASE_URL,
-            echo=Config.DEBUG,
-            future=True
-        )
+    def __init__(self, url: str = None, profile: str = None):
+        # Писатель: все изменения данных
+        self.engine = create_database_engine(url, profile)
         self.async_session = async_sessionmaker(
             self.engine,
             class_=AsyncSession,
             expire_on_commit=False
         )
+        
+        # Читатель: отдельный пул только для чтения, не ждет коммитов писателя
+        if is_sqlite_file(url or Config.DATABASE_URL) and (profile or Config.SQLITE_PROFILE) == "production":
+            self.read_engine = create_database_engine(url, profile, readonly=True)
+        else:
+            self.read_engine = self.engine
+        self.read_session = async_sessionmaker(
+            self.read_engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+        self._achievements = None  # Кэш справочника достижений
+        self.leaderboard = LeaderboardIndex()
+        self.profiles = ProfileCache(Config.PROFILE_CACHE_SIZE)
+        self.known_users = set()  # telegram_id всех зарегистрированных пользователей
+        self.write_behind = None  # Очередь отложенной записи сессий (если включена)
+        self.archiver = None  # Периодическая архивация старых задач (если включена)
+        self.snapshots = None  # Снимки незавершенных сессий (если включены)
+        self._leaderboard_refresh = None  # Периодическое перечитывание рейтинга (в режиме шардов)
     
     async def init_db(self):
         """Инициализация базы данных"""
+        started = time.perf_counter()
         async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+            version, applied, fresh = await conn.run_sync(migrations.upgrade)
+        if applied:
+            logger.info(f"Схема БД обновлена с версии {version} до {applied[-1]}")
+        if version == 0 and not fresh:
+            # База создана до миграций: материализованной статистики в ней еще нет
+            await self.rebuild_user_stats()
+        schema_done = time.perf_counter()
         
-        # Создаем стандартные достижения
+        # Создаем стандартные достижения (пропускается, если версия списка не менялась)
         await self.create_default_achievements()
-        logger.info("База данных инициализирована")
+        seed_done = time.perf_counter()
+        
+        # Загружаем индекс рейтинга
+        await self.load_leaderboard()
+        finished = time.perf_counter()
+        logger.info(f"База данных инициализирована за {(finished - started) * 1000:.0f} мс: "
+                    f"схема {(schema_done - started) * 1000:.0f} мс, "
+                    f"достижения {(seed_done - schema_done) * 1000:.0f} мс, "
+                    f"рейтинг {(finished - seed_done) * 1000:.0f} мс")
     
-    async def create_default_achievements(self):
-        """Создание стандартных достижений"""
-        achievements = [
-            ("Новичок", "Решите первую задачу", "🎯", "level", 1),
-            ("Ученик", "Достигните 3 уровня", "📚", "level", 3),
-            ("Эксперт", "Достигните 5 уровня", "🧠", "level", 5),
-            ("Мастер", "Достигните 7 уровня", "🏆", "level", 7),
-            ("Гений", "Достигните 10 уровня", "👑", "level", 10),
-            ("Скорость", "Решите задачу за 5 секунд", "⚡", "speed", 5),
-            ("Точность", "Решите 10 задач подряд правильно", "🎯", "streak", 10),
-            ("Выносливость", "Решите 50 задач", "💪", "total", 50),
-        ]
+    async def load_leaderboard(self, quiet: bool = False):
+        """Загрузить индекс рейтинга из таблицы пользователей"""
+        async with self.read_session() as session:
+            result = await session.execute(
+                select(User.telegram_id, User.total_score, User.current_level,
+                       func.coalesce(User.first_name, User.username))
+            )
+            rows = result.all()
         
+        self.leaderboard.load(rows)
+        # Множество известных пользователей: /start и "Начать обучение" не ходят в БД
+        self.known_users = {row[0] for row in rows}
+        if not quiet:
+            logger.info(f"Индекс рейтинга загружен: {len(self.known_users)} пользователей, "
+                        f"{len(self.leaderboard)} с очками")
+    
+    async def create_default_achievements(self, force: bool = False):
+        """Создание стандартных достижений одним upsert, если изменилась версия списка"""
         async with self.async_session() as session:
-            for name, desc, icon, cond_type, cond_value in achievements:
-                # Проверяем, существует ли уже такое достижение
-                result = await session.execute(
-                    select(Achievement).where(Achievement.name == name)
+            seed_version = await session.scalar(
+                select(DbMeta.value).where(DbMeta.key == "achievements_seed")
+            )
+            if not force and seed_version == str(ACHIEVEMENTS_SEED_VERSION):
+                return
+            
+            stmt = sqlite_insert(Achievement).values([
+                {
+                    "name": name,
+                    "description": desc,
+                    "icon": icon,
+                    "condition_type": cond_type,
+                    "condition_value": cond_value
+                }
+                for name, desc, icon, cond_type, cond_value in DEFAULT_ACHIEVEMENTS
+            ])
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Achievement.name],
+                    set_={
+                        "description": stmt.excluded.description,
+                        "icon": stmt.excluded.icon,
+                        "condition_type": stmt.excluded.condition_type,
+                        "condition_value": stmt.excluded.condition_value
+                    }
+                )
+            )
+            await session.execute(
+                sqlite_insert(DbMeta)
+                .values(key="achievements_seed", value=str(ACHIEVEMENTS_SEED_VERSION))
+                .on_conflict_do_update(
+                    index_elements=[DbMeta.key],
+                    set_={"value": str(ACHIEVEMENTS_SEED_VERSION)}
                 )
-                if not result.scalar_one_or_none():
-                    achievement = Achievement(
-                        name=name,
-                        description=desc,
-                        icon=icon,
-                        condition_type=cond_type,
-                        condition_value=cond_value
-                    )
-                    session.add(achievement)
+            )
+            await session.commit()
+        
+        self._achievements = None
+        logger.info(f"Стандартные достижения записаны (версия {ACHIEVEMENTS_SEED_VERSION})")
+    
+    def _upsert_user(self, telegram_id: int, username: str = None,
+                     first_name: str = None, last_name: str = None):
+        """INSERT ... ON CONFLICT(telegram_id) DO NOTHING RETURNING для пользователя"""
+        return (
+            sqlite_insert(User)
+            .values(
+                telegram_id=telegram_id,
+                username=username,
+                first_name=first_name,
+                last_name=last_name
+            )
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+        )
+    
+    def _user_created(self, user: User):
+        """Учесть нового пользователя в индексах в памяти"""
+        self.known_users.add(user.telegram_id)
+        self.leaderboard.update(user.telegram_id, user.total_score, user.current_level,
+                                user.first_name or user.username)
+        logger.info(f"Создан новый пользователь: {user.telegram_id}")
+    
+    async def ensure_user(self, telegram_id: int, username: str = None,
+                          first_name: str = None, last_name: str = None) -> bool:
+        """Зарегистрировать пользователя, если его еще нет. Возвращает True для нового"""
+        if telegram_id in self.known_users:
+            return False
+        
+        async with self.async_session() as session:
+            result = await session.execute(
+                self._upsert_user(telegram_id, username, first_name, last_name).returning(User)
+            )
+            user = result.scalar_one_or_none()
             await session.commit()
+        
+        if not user:
+            # Пользователь уже был создан параллельным запросом
+            self.known_users.add(telegram_id)
+            return False
+        
+        self._user_created(user)
+        return True
     
     async def get_or_create_user(self, telegram_id: int, username: str = None, 
                                 first_name: str = None, last_name: str = None) -> User:
         """Получить или создать пользователя"""
         async with self.async_session() as session:
             result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
+                self._upsert_user(telegram_id, username, first_name, last_name).returning(User)
             )
             user = result.scalar_one_or_none()
             
-            if not user:
-                user = User(
-                    telegram_id=telegram_id,
-                    username=username,
-                    first_name=first_name,
-                    last_name=last_name
-                )
-                session.add(user)
+            if user:
                 await session.commit()
-                await session.refresh(user)
-                logger.info(f"Создан новый пользователь: {telegram_id}")
+                self._user_created(user)
+                return user
             
+            result = await session.execute(
+                select(User).where(User.telegram_id == telegram_id)
+            )
+            user = result.scalar_one()
+            self.known_users.add(telegram_id)
             return user
     
+    async def get_profile(self, telegram_id: int) -> dict:
+        """Получить горячий профиль пользователя: id, уровень, очки и настройки сессии"""
+        profile = self.profiles.get(telegram_id)
+        if profile is not None:
+            return profile
+        
+        async with self.read_session() as session:
+            result = await session.execute(
+                select(
+                    User.id, User.current_level, User.total_score,
+                    UserSettings.time_per_problem, UserSettings.problems_per_session
+                )
+                .outerjoin(UserSettings, UserSettings.user_id == User.id)
+                .where(User.telegram_id == telegram_id)
+            )
+            row = result.first()
+        
+        if not row:
+            return {}
+        
+        user_id, level, score, time_per_problem, problems_per_session = row
+        profile = {
+            "user_id": user_id,
+            "level": level,
+            "score": score,
+            "time_per_problem": time_per_problem or Config.DEFAULT_TIME_PER_PROBLEM,
+            "problems_per_session": problems_per_session or Config.DEFAULT_PROBLEMS_PER_SESSION
+        }
+        
+        if self.write_behind:
+            # Пока сессии пользователя ждут записи, актуальные очки и уровень - в памяти
+            state = self.write_behind.pending_state(telegram_id)
+            if state:
+                profile["level"] = state.current_level
+                profile["score"] = state.total_score
+        
+        self.profiles.put(telegram_id, profile)
+        return profile
+    
     async def get_user_stats(self, telegram_id: int) -> dict:
         """Получить статистику пользователя"""
-        async with self.async_session() as session:
-            user = await session.execute(
-                select(User).options(
-                    selectinload(User.sessions),
-                    selectinload(User.achievements)
-                ).where(User.telegram_id == telegram_id)
+        async with self.read_session() as session:
+            result = await session.execute(
+                select(User, UserStats)
+                .outerjoin(UserStats, UserStats.user_id == User.id)
+                .where(User.telegram_id == telegram_id)
             )
-            user = user.scalar_one_or_none()
+            row = result.first()
             
-            if not user:
+            if not row:
                 return {}
             
-            total_sessions = len(user.sessions)
-            completed_sessions = len([s for s in user.sessions if s.completed])
-            total_problems = sum(s.problems_solved for s in user.sessions)
-            correct_answers = sum(s.correct_answers for s in user.sessions)
+            user, stats = row
+            total_problems = stats.total_problems if stats else 0
+            correct_answers = stats.correct_answers if stats else 0
             accuracy = (correct_answers / total_problems * 100) if total_problems > 0 else 0
             
             return {
                 "level": user.current_level,
                 "total_score": user.total_score,
-                "total_sessions": total_sessions,
-                "completed_sessions": completed_sessions,
+                "total_sessions": stats.total_sessions if stats else 0,
+                "completed_sessions": stats.completed_sessions if stats else 0,
                 "total_problems": total_problems,
                 "correct_answers": correct_answers,
                 "accuracy": round(accuracy, 1),
-                "achievements_count": len(user.achievements)
+                "achievements_count": stats.achievements_count if stats else 0,
+                "best_time": stats.best_time if stats else None
             }
     
-    async def save_learning_session(self, telegram_id: int, level: int, 
-                                  problems_data: list, total_time: float) -> bool:
-        """Сохранить результаты сессии обучения"""
+    async def _get_or_create_stats(self, session: AsyncSession, user_id: int) -> UserStats:
+        """Получить строку статистики пользователя, создав её при необходимости"""
+        stats = await session.get(UserStats, user_id)
+        if not stats:
+            stats = new_user_stats(user_id)
+            session.add(stats)
+        return stats
+    
+    async def _insert_session_rows(self, session: AsyncSession, user_id: int, level: int,
+                                   answers: AnswerLog, total_time: float) -> int:
+        """Вставить строку сессии и строки задач минимальным числом запросов"""
+        now = datetime.utcnow()
+        
+        # INSERT ... RETURNING вместо flush() ORM-объекта
+        result = await session.execute(
+            insert(LearningSession.__table__)
+            .values(
+                user_id=user_id,
+                level=level,
+                problems_solved=len(answers),
+                correct_answers=answers.correct,
+                total_time=total_time,
+                completed=True,
+                started_at=now,
+                finished_at=now
+            )
+            .returning(LearningSession.__table__.c.id)
+        )
+        session_id = result.scalar_one()
+        
+        # Все задачи одним executemany прямо из массивов журнала, без словарей на строку
+        if len(answers):
+            timestamp = now.strftime(SQLITE_DATETIME_FORMAT)
+            connection = await session.connection()
+            await connection.exec_driver_sql(
+                INSERT_PROBLEMS_SQL,
+                [
+                    (session_id, level, code, expected, answer, is_correct, time_taken, timestamp, timestamp)
+                    for code, answer, expected, is_correct, time_taken in answers.rows()
+                ]
+            )
+        
+        return session_id
+    
+    async def finalize_session(self, telegram_id: int, level: int,
+                               answers: AnswerLog, total_time: float) -> Optional[SessionResult]:
+        """
+        Завершить сессию обучения за один проход
+        
+        Сессия и задачи, очки и уровень, статистика и достижения записываются
+        одной транзакцией, место в рейтинге берется из индекса в памяти.
+        """
+        if self.write_behind:
+            # Результат считается в памяти, запись уходит в пакетную очередь
+            result = await self.write_behind.submit(telegram_id, level, answers, total_time)
+        else:
+            result = await self._save_session(telegram_id, level, answers, total_time)
+        
+        if result:
+            self.profiles.invalidate(telegram_id)
+            rank = self.leaderboard.rank(telegram_id)
+            result.position = rank['position']
+            result.total_users = rank['total_users']
+        return result
+    
+    async def _save_session(self, telegram_id: int, level: int,
+                            answers: AnswerLog, total_time: float) -> Optional[SessionResult]:
+        """Записать сессию и её последствия для пользователя одной транзакцией"""
         async with self.async_session() as session:
             # Получаем пользователя
             user_result = await session.execute(
@@ -128,155 +362,221 @@ class Database:
             
             if not user:
                 logger.error(f"Пользователь {telegram_id} не найден")
-                return False
+                return None
             
             # Подсчитываем результаты
-            problems_solved = len(problems_data)
-            correct_answers = len([p for p in problems_data if p['is_correct']])
-            accuracy = (correct_answers / problems_solved * 100) if problems_solved > 0 else 0
-            
-            # Создаем сессию обучения
-            from datetime import datetime
-            learning_session = LearningSession(
-                user_id=user.id,
-                level=level,
-                problems_solved=problems_solved,
-                correct_answers=correct_answers,
-                total_time=total_time,
-                completed=True,
-                finished_at=datetime.utcnow()
+            correct_answers, accuracy, score_gained, new_level = calculate_progress(
+                answers, level, user.current_level
             )
-            session.add(learning_session)
-            await session.flush()  # Получаем ID сессии
             
-            # Сохраняем каждую задачу
-            for i, problem_data in enumerate(problems_data):
-                problem_text = problem_data.get('problem_text', f"Задача {i+1}")
-                problem = Problem(
-                    session_id=learning_session.id,
-                    level=level,
-                    problem_text=problem_text,
-                    correct_answer=problem_data['correct_answer'],
-                    user_answer=problem_data['user_answer'],
-                    is_correct=problem_data['is_correct'],
-                    time_taken=problem_data['time_taken'],
-                    answered_at=datetime.utcnow()
-                )
-                session.add(problem)
+            # Сохраняем сессию и все задачи пакетной вставкой
+            await self._insert_session_rows(session, user.id, level, answers, total_time)
             
             # Обновляем статистику пользователя
-            score_gained = correct_answers * 10  # 10 очков за правильный ответ
-            if accuracy >= 80:  # Бонус за хорошую точность
-                score_gained += problems_solved * 5
-            
             user.total_score += score_gained
+            level_up = new_level > user.current_level
+            if level_up:
+                user.current_level = new_level
+                logger.info(f"Пользователь {telegram_id} повысился до уровня {user.current_level}")
             
-            # Проверяем повышение уровня (80%+ точность для перехода)
-            if accuracy >= 80 and level == user.current_level:
-                new_level = min(level + 1, Config.MAX_LEVEL)
-                if new_level > user.current_level:
-                    user.current_level = new_level
-                    logger.info(f"Пользователь {telegram_id} повысился до уровня {user.current_level}")
+            # Обновляем материализованную статистику в той же транзакции
+            stats = await self._get_or_create_stats(session, user.id)
+            apply_session_stats(stats, answers, correct_answers, total_time)
             
             # Обновляем время последней активности
             user.last_activity = datetime.utcnow()
             
+            # Проверяем достижения по обновленным счетчикам
+            new_achievements = await self._award_achievements(session, user, stats)
+            
             await session.commit()
+            self.leaderboard.update(telegram_id, user.total_score, user.current_level)
             
-            # Проверяем достижения
-            await self.check_achievements(telegram_id)
+            if new_achievements:
+                logger.info(f"Пользователь {telegram_id} получил {len(new_achievements)} новых достижений")
             
             logger.info(f"Сессия сохранена: пользователь {telegram_id}, уровень {level}, "
                        f"точность {accuracy:.1f}%, очков +{score_gained}")
-            return True
+            return SessionResult(
+                problems_solved=len(answers),
+                correct_answers=correct_answers,
+                accuracy=accuracy,
+                score_gained=score_gained,
+                total_score=user.total_score,
+                level=user.current_level,
+                level_up=level_up,
+                new_achievements=new_achievements
+            )
+    
+    async def _get_achievements(self, session: AsyncSession) -> list:
+        """Получить справочник достижений (кэшируется в памяти)"""
+        if self._achievements is None:
+            achievements_result = await session.execute(select(Achievement))
+            self._achievements = achievements_result.scalars().all()
+        return self._achievements
     
-    async def check_achievements(self, telegram_id: int):
-        """Проверить и выдать достижения пользователю"""
+    async def _award_achievements(self, session: AsyncSession, user: User, stats: UserStats) -> list:
+        """Выдать достижения по счетчикам пользователя в текущей транзакции"""
+        all_achievements = await self._get_achievements(session)
+        if stats.achievements_count >= len(all_achievements):
+            return []  # Все достижения уже получены
+        
+        earned_result = await session.execute(
+            select(UserAchievement.achievement_id).where(UserAchievement.user_id == user.id)
+        )
+        earned_achievement_ids = set(earned_result.scalars().all())
+        
+        new_achievements = evaluate_achievements(
+            all_achievements, earned_achievement_ids, stats, user.current_level
+        )
+        for achievement in new_achievements:
+            session.add(UserAchievement(
+                user_id=user.id,
+                achievement_id=achievement.id
+            ))
+        stats.achievements_count += len(new_achievements)
+        
+        return new_achievements
+    
+    async def rebuild_user_stats(self) -> int:
+        """Пересобрать таблицу user_stats из learning_sessions и user_achievements"""
+        sessions_agg = (
+            select(
+                LearningSession.user_id.label("user_id"),
+                func.count(LearningSession.id).label("total_sessions"),
+                func.sum(case((LearningSession.completed == True, 1), else_=0)).label("completed_sessions"),
+                func.sum(LearningSession.problems_solved).label("total_problems"),
+                func.sum(LearningSession.correct_answers).label("correct_answers"),
+                func.min(case((LearningSession.completed == True, LearningSession.total_time))).label("best_time")
+            )
+            .group_by(LearningSession.user_id)
+            .subquery()
+        )
+        achievements_agg = (
+            select(
+                UserAchievement.user_id.label("user_id"),
+                func.count(UserAchievement.id).label("achievements_count")
+            )
+            .group_by(UserAchievement.user_id)
+            .subquery()
+        )
+        
+        rows = (
+            select(
+                User.id,
+                func.coalesce(sessions_agg.c.total_sessions, 0),
+                func.coalesce(sessions_agg.c.completed_sessions, 0),
+                func.coalesce(sessions_agg.c.total_problems, 0),
+                func.coalesce(sessions_agg.c.correct_answers, 0),
+                func.coalesce(achievements_agg.c.achievements_count, 0),
+                sessions_agg.c.best_time
+            )
+            .outerjoin(sessions_agg, sessions_agg.c.user_id == User.id)
+            .outerjoin(achievements_agg, achievements_agg.c.user_id == User.id)
+        )
+        
+        async with self.async_session() as session:
+            await session.execute(delete(UserStats))
+            await session.execute(
+                insert(UserStats).from_select(
+                    ["user_id", "total_sessions", "completed_sessions", "total_problems",
+                     "correct_answers", "achievements_count", "best_time"],
+                    rows
+                )
+            )
+            
+            # Счетчики серий восстанавливаем проходом по задачам в порядке решения
+            problems = await session.stream(
+                select(LearningSession.user_id, Problem.is_correct, Problem.time_taken)
+                .join(Problem, Problem.session_id == LearningSession.id)
+                .order_by(LearningSession.user_id, LearningSession.id, Problem.id)
+            )
+            counters = {}
+            async for user_id, is_correct, time_taken in problems:
+                if user_id not in counters:
+                    counters[user_id] = UserStats(current_streak=0, max_streak=0, fastest_correct=None)
+                count_answer(counters[user_id], is_correct, time_taken)
+            
+            await session.execute(update(UserStats).values(current_streak=0, max_streak=0))
+            if counters:
+                await session.execute(
+                    update(UserStats),
+                    [
+                        {
+                            "user_id": user_id,
+                            "current_streak": c.current_streak,
+                            "max_streak": c.max_streak,
+                            "fastest_correct": c.fastest_correct
+                        }
+                        for user_id, c in counters.items()
+                    ]
+                )
+            await session.commit()
+            
+            count = await session.scalar(select(func.count()).select_from(UserStats))
+            logger.info(f"Таблица user_stats пересобрана: {count} пользователей")
+            return count
+    
+    async def reset_user_progress(self, telegram_id: int) -> bool:
+        """Сбросить прогресс пользователя: сессии, задачи, достижения и статистику"""
+        if self.write_behind:
+            # Сначала дописываем ожидающие сессии, чтобы не воскресить их после сброса
+            await self.write_behind.flush()
+        
         async with self.async_session() as session:
-            # Получаем пользователя с сессиями и связанными задачами
             user_result = await session.execute(
-                select(User).options(
-                    selectinload(User.sessions).selectinload(LearningSession.problems),
-                    selectinload(User.achievements)
-                ).where(User.telegram_id == telegram_id)
+                select(User).where(User.telegram_id == telegram_id)
             )
             user = user_result.scalar_one_or_none()
             
             if not user:
-                return []
-            
-            # Получаем все достижения
-            achievements_result = await session.execute(select(Achievement))
-            all_achievements = achievements_result.scalars().all()
-            
-            # Список уже полученных достижений
-            earned_achievement_ids = [ua.achievement_id for ua in user.achievements]
-            
-            new_achievements = []
+                return False
             
-            for achievement in all_achievements:
-                if achievement.id in earned_achievement_ids:
-                    continue  # Уже получено
-                
-                earned = False
-                
-                if achievement.condition_type == "level":
-                    earned = user.current_level >= achievement.condition_value
-                
-                elif achievement.condition_type == "total":
-                    total_problems = sum(s.problems_solved for s in user.sessions)
-                    earned = total_problems >= achievement.condition_value
-                
-                elif achievement.condition_type == "speed":
-                    # Проверяем есть ли задачи решенные быстрее чем condition_value секунд
-                    earned = False
-                    for sess in user.sessions:
-                        if sess.problems:  # Проверяем что problems загружены
-                            for problem in sess.problems:
-                                if problem.time_taken <= achievement.condition_value and problem.is_correct:
-                                    earned = True
-                                    break
-                        if earned:
-                            break
-                
-                elif achievement.condition_type == "streak":
-                    # Проверяем streak правильных ответов
-                    max_streak = 0
-                    current_streak = 0
-                    for sess in user.sessions:
-                        if sess.problems:  # Проверяем что problems загружены
-                            for problem in sess.problems:
-                                if problem.is_correct:
-                                    current_streak += 1
-                                    max_streak = max(max_streak, current_streak)
-                                else:
-                                    current_streak = 0
-                    earned = max_streak >= achievement.condition_value
-                
-                if earned:
-                    # Выдаем достижение
-                    user_achievement = UserAchievement(
-                        user_id=user.id,
-                        achievement_id=achievement.id
-                    )
-                    session.add(user_achievement)
-                    new_achievements.append(achievement)
+            # Удаляем все связанные данные
+            await session.execute(
+                delete(Problem).where(Problem.session_id.in_(
+                    select(LearningSession.id).where(LearningSession.user_id == user.id)
+                ))
+            )
+            await session.execute(
+                delete(LearningSession).where(LearningSession.user_id == user.id)
+            )
+            await session.execute(
+                delete(UserAchievement).where(UserAchievement.user_id == user.id)
+            )
+            await session.execute(
+                delete(UserStats).where(UserStats.user_id == user.id)
+            )
+            await session.execute(
+                delete(ProblemDailyRollup).where(ProblemDailyRollup.user_id == user.id)
+            )
             
-            if new_achievements:
-                await session.commit()
-                logger.info(f"Пользователь {telegram_id} получил {len(new_achievements)} новых достижений")
+            # Сбрасываем статистику пользователя
+            await session.execute(
+                update(User).where(User.id == user.id).values(
+                    current_level=1,
+                    total_score=0
+                )
+            )
             
-            return new_achievements
+            await session.commit()
+            self.leaderboard.update(telegram_id, 0, 1)
+            self.profiles.invalidate(telegram_id)
+            logger.info(f"Прогресс пользователя {telegram_id} сброшен")
+            return True
     
     async def get_user_settings(self, telegram_id: int) -> dict:
         """Получить настройки пользователя"""
-        async with self.async_session() as session:
-            user_result = await session.execute(
-                select(User).options(selectinload(User.settings)).where(User.telegram_id == telegram_id)
+        async with self.read_session() as session:
+            result = await session.execute(
+                select(UserSettings)
+                .join(User, User.id == UserSettings.user_id)
+                .where(User.telegram_id == telegram_id)
             )
-            user = user_result.scalar_one_or_none()
+            settings = result.scalar_one_or_none()
             
-            if not user:
+            if not settings:
+                # Настройки по умолчанию; строка создается при первом изменении
                 return {
                     "time_per_problem": Config.DEFAULT_TIME_PER_PROBLEM,
                     "problems_per_session": Config.DEFAULT_PROBLEMS_PER_SESSION,
@@ -284,31 +584,13 @@ class Database:
                     "dark_theme": False
                 }
             
-            if not user.settings:
-                # Создаем настройки по умолчанию
-                settings = UserSettings(
-                    user_id=user.id,
-                    time_per_problem=Config.DEFAULT_TIME_PER_PROBLEM,
-                    problems_per_session=Config.DEFAULT_PROBLEMS_PER_SESSION
-                )
-                session.add(settings)
-                await session.commit()
-                await session.refresh(settings)
-                
-                return {
-                    "time_per_problem": settings.time_per_problem,
-                    "problems_per_session": settings.problems_per_session,
-                    "sound_enabled": settings.sound_enabled,
-                    "dark_theme": settings.dark_theme
-                }
-            
             return {
-                "time_per_problem": user.settings.time_per_problem,
-                "problems_per_session": user.settings.problems_per_session,
-                "sound_enabled": user.settings.sound_enabled,
-                "dark_theme": user.settings.dark_theme
+                "time_per_problem": settings.time_per_problem,
+                "problems_per_session": settings.problems_per_session,
+                "sound_enabled": settings.sound_enabled,
+                "dark_theme": settings.dark_theme
             }
-
+    
     async def update_user_setting(self, telegram_id: int, setting_name: str, value) -> bool:
         """Обновить настройку пользователя"""
         async with self.async_session() as session:
@@ -336,70 +618,103 @@ class Database:
                 setattr(user.settings, setting_name, value)
                 user.settings.updated_at = datetime.utcnow()
                 await session.commit()
+                self.profiles.invalidate(telegram_id)
                 logger.info(f"Настройка {setting_name} пользователя {telegram_id} обновлена на {value}")
                 return True
             
             return False
-
-    async def get_leaderboard(self, limit: int = 10) -> list:
-        """Получить рейтинг пользователей по очкам"""
-        async with self.async_session() as session:
+    
+    async def get_user_achievements(self, telegram_id: int) -> list:
+        """Получить список достижений пользователя"""
+        async with self.read_session() as session:
             result = await session.execute(
-                select(User)
-                .where(User.total_score > 0)
-                .order_by(User.total_score.desc(), User.current_level.desc())
-                .limit(limit)
+                select(Achievement, UserAchievement.earned_at)
+                .join(UserAchievement, UserAchievement.achievement_id == Achievement.id)
+                .join(User, User.id == UserAchievement.user_id)
+                .where(User.telegram_id == telegram_id)
+                .order_by(UserAchievement.earned_at)
             )
-            users = result.scalars().all()
-            
-            leaderboard = []
-            for i, user in enumerate(users, 1):
-                leaderboard.append({
-                    'position': i,
-                    'name': user.first_name or user.username or f"Пользователь {user.telegram_id}",
-                    'score': user.total_score,
-                    'level': user.current_level,
-                    'telegram_id': user.telegram_id
-                })
             
-            return leaderboard
-
+            return [
+                {
+                    'name': achievement.name,
+                    'description': achievement.description,
+                    'icon': achievement.icon,
+                    'earned_at': earned_at
+                }
+                for achievement, earned_at in result.all()
+            ]
+    
+    async def get_leaderboard(self, limit: int = 10) -> list:
+        """Получить рейтинг пользователей по очкам (из индекса в памяти)"""
+        return self.leaderboard.top(limit)
+    
     async def get_user_rank(self, telegram_id: int) -> dict:
-        """Получить позицию пользователя в рейтинге"""
-        async with self.async_session() as session:
-            # Получаем пользователя
-            user_result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
-            )
-            user = user_result.scalar_one_or_none()
-            
-            if not user:
-                return {'position': None, 'total_users': 0}
-            
-            # Считаем количество пользователей с большим счетом
-            higher_score_result = await session.execute(
-                select(User.id).where(
-                    (User.total_score > user.total_score) | 
-                    ((User.total_score == user.total_score) & (User.current_level > user.current_level))
-                )
-            )
-            higher_count = len(higher_score_result.scalars().all())
-            
-            # Считаем общее количество пользователей с очками
-            total_result = await session.execute(
-                select(User.id).where(User.total_score > 0)
-            )
-            total_users = len(total_result.scalars().all())
-            
-            return {
-                'position': higher_count + 1,
-                'total_users': total_users,
-                'score': user.total_score,
-                'level': user.current_level
-            }
-
+        """Получить позицию пользователя в рейтинге (из индекса в памяти)"""
+        return self.leaderboard.rank(telegram_id)
+    
+    async def start_write_behind(self):
+        """Включить пакетную отложенную запись завершенных сессий"""
+        from database.write_behind import WriteBehindQueue
+        
+        self.write_behind = WriteBehindQueue(
+            self,
+            interval_ms=Config.WRITE_BEHIND_INTERVAL_MS,
+            batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+            max_pending=Config.WRITE_BEHIND_MAX_PENDING
+        )
+        await self.write_behind.start()
+    
+    def start_archiver(self):
+        """Включить периодическую архивацию старых задач"""
+        from database.archive import ProblemArchiver
+        
+        self.archiver = ProblemArchiver(
+            self,
+            after_days=Config.ARCHIVE_AFTER_DAYS,
+            archive_dir=Config.ARCHIVE_DIR,
+            chunk_size=Config.ARCHIVE_CHUNK_SIZE,
+            interval_hours=Config.ARCHIVE_INTERVAL_HOURS
+        )
+        self.archiver.start()
+    
+    def start_snapshots(self):
+        """Включить запись снимков незавершенных сессий"""
+        from database.session_store import SessionSnapshotStore
+        
+        self.snapshots = SessionSnapshotStore(self, interval_ms=Config.SESSION_SNAPSHOT_INTERVAL_MS)
+        self.snapshots.start()
+    
+    def start_leaderboard_refresh(self, interval: int):
+        """Перечитывать рейтинг раз в interval секунд: очки меняют и другие процессы"""
+        async def refresh():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.load_leaderboard(quiet=True)
+                except Exception as e:
+                    logger.error(f"Ошибка обновления рейтинга: {e}")
+        
+        self._leaderboard_refresh = asyncio.create_task(refresh())
+    
     async def close(self):
         """Закрыть соединение с базой данных"""
+        if self._leaderboard_refresh:
+            self._leaderboard_refresh.cancel()
+            self._leaderboard_refresh = None
+        if self.snapshots:
+            # Дописываем последние изменения сессий, чтобы восстановить их при запуске
+            snapshots, self.snapshots = self.snapshots, None
+            await snapshots.stop()
+        if self.archiver:
+            archiver, self.archiver = self.archiver, None
+            await archiver.stop()
+        if self.write_behind:
+            # Дописываем накопленные сессии перед закрытием
+            write_behind, self.write_behind = self.write_behind, None
+            await write_behind.stop()
+        if self.read_engine is not self.engine:
+            await self.read_engine.dispose()
         await self.engine.dispose()
 
 # Глобальный экземпляр базы данных
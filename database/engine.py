@@ -0,0 +1,94 @@
+"""Создание движка БД с профилем настроек SQLite из Config"""
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def is_sqlite_file(url: str) -> bool:
+    """Файловая ли это база SQLite (не :memory:)"""
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+def sqlite_pragmas() -> dict:
+    """Прагмы, выполняемые на каждом новом соединении в профиле production"""
+    return {
+        # auto_vacuum должен идти до создания таблиц, на существующей БД без VACUUM не меняется
+        "auto_vacuum": Config.SQLITE_AUTO_VACUUM,
+        "journal_mode": Config.SQLITE_JOURNAL_MODE,
+        "synchronous": Config.SQLITE_SYNCHRONOUS,
+        "mmap_size": Config.SQLITE_MMAP_SIZE,
+        "cache_size": Config.SQLITE_CACHE_SIZE,
+        "busy_timeout": Config.SQLITE_BUSY_TIMEOUT,
+        "temp_store": Config.SQLITE_TEMP_STORE,
+    }
+
+def readonly_url(url: str) -> str:
+    """Строка подключения к тому же файлу SQLite в режиме только чтения"""
+    parsed = make_url(url)
+    return f"{parsed.drivername}:///file:{parsed.database}?mode=ro&uri=true"
+
+def create_database_engine(url: str = None, profile: str = None, readonly: bool = False) -> AsyncEngine:
+    """
+    Создать асинхронный движок БД
+    
+    Args:
+        url: Строка подключения (по умолчанию Config.DATABASE_URL)
+        profile: Профиль SQLite (по умолчанию Config.SQLITE_PROFILE)
+        readonly: Движок для чтения - отдельный пул соединений WAL-читателей
+    """
+    url = url or Config.DATABASE_URL
+    profile = profile or Config.SQLITE_PROFILE
+    
+    if profile != "production" or not is_sqlite_file(url):
+        return create_async_engine(url, echo=Config.DEBUG, future=True)
+    
+    if readonly:
+        url = readonly_url(url)
+        pool_size, max_overflow = Config.DB_READ_POOL_SIZE, Config.DB_READ_MAX_OVERFLOW
+        # Режим журнала, синхронизация и автоочистка задаются писателем
+        pragmas = {name: value for name, value in sqlite_pragmas().items()
+                   if name not in ("auto_vacuum", "journal_mode", "synchronous")}
+        pragmas["query_only"] = 1
+    else:
+        pool_size, max_overflow = Config.DB_POOL_SIZE, Config.DB_MAX_OVERFLOW
+        pragmas = sqlite_pragmas()
+    
+    engine = create_async_engine(
+        url,
+        echo=Config.DEBUG,
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_pre_ping=False
+    )
+    
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # Транзакции открываем сами (см. begin ниже), а не драйвер
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    
+    @event.listens_for(engine.sync_engine, "begin")
+    def begin_transaction(conn):
+        if readonly:
+            # Читатель WAL не блокирует писателя и не ждет его
+            conn.exec_driver_sql("BEGIN")
+        else:
+            # Блокировку записи берем сразу: отложенная транзакция, начавшаяся с чтения,
+            # при попытке записи получает SQLITE_BUSY без ожидания busy_timeout
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    
+    role = "чтение" if readonly else "запись"
+    logger.info(f"SQLite профиль production ({role}): {pragmas}, пул {pool_size}+{max_overflow}")
+    return engine
@@ -0,0 +1,233 @@
+"""Хранилище состояний FSM aiogram в таблице fsm_states
+
+Перед таблицей стоит LRU-кэш: почти каждое обновление читает состояние
+пользователя, и у большинства пользователей его нет - такие ответы тоже
+кэшируются. Изменения не пишутся в БД сразу: ключ помечается измененным,
+а фоновая задача раз в flush_interval_ms записывает последнее значение
+каждого ключа одной транзакцией, поэтому update_data и следующий за ним
+set_state дают одну запись. Пустые состояния удаляются из таблицы, а
+состояния, не менявшиеся дольше ttl_hours, удаляет периодическая очистка.
+"""
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database.models import FsmRecord
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 3600  # секунд между удалениями устаревших состояний
+
+class _Entry:
+    """Состояние и данные одного ключа в кэше"""
+    
+    __slots__ = ("state", "data", "touched")
+    
+    def __init__(self, state: Optional[str] = None, data: Dict[str, Any] = None, touched: float = 0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.touched = touched  # время Unix последнего изменения
+    
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в БД бота с LRU-кэшем и отложенной записью"""
+    
+    def __init__(self, db, cache_size: int = 10000, ttl_hours: int = 168, flush_interval_ms: int = 200):
+        self.db = db
+        self.cache_size = cache_size
+        self.ttl = ttl_hours * 3600
+        self.interval = flush_interval_ms / 1000
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._dirty: Dict[str, _Entry] = {}  # измененные ключи, ждущие записи
+        self._task = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0  # вызовов set_state / set_data / update_data
+        self.flushes = 0
+        self.rows_written = 0
+        self.expired = 0
+    
+    def start(self):
+        """Запустить фоновую запись и очистку"""
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Хранилище FSM в БД: кэш {self.cache_size} ключей, "
+                    f"запись каждые {self.interval * 1000:.0f} мс, TTL {self.ttl // 3600} ч")
+    
+    async def close(self) -> None:
+        """Записать накопленные изменения и остановить фоновую задачу"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or 0}:{key.destiny}"
+    
+    async def _entry(self, key: StorageKey) -> _Entry:
+        """Запись ключа: из кэша, из ожидающих записи или из БД"""
+        name = self._key(key)
+        entry = self._cache.get(name)
+        if entry is not None:
+            if entry.touched and entry.touched < time.time() - self.ttl:
+                entry.state, entry.data = None, {}  # устарело - как будто состояния нет
+            self._cache.move_to_end(name)
+            self.hits += 1
+            return entry
+        
+        self.misses += 1
+        entry = self._dirty.get(name)
+        if entry is None:
+            async with self.db.read_engine.connect() as connection:
+                result = await connection.execute(
+                    select(FsmRecord.state, FsmRecord.data, FsmRecord.updated_at)
+                    .where(FsmRecord.key == name, FsmRecord.updated_at >= time.time() - self.ttl)
+                )
+                row = result.first()
+            # Пока шло чтение, ключ мог загрузить параллельный обработчик
+            cached = self._cache.get(name)
+            if cached is not None:
+                return cached
+            entry = _Entry(row[0], json.loads(row[1]), row[2]) if row else _Entry()
+        
+        self._cache[name] = entry
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return entry
+    
+    def _changed(self, key: StorageKey, entry: _Entry):
+        entry.touched = time.time()
+        self._dirty[self._key(key)] = entry
+        self.writes += 1
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._changed(key, entry)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry.data = data.copy()
+        self._changed(key, entry)
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._entry(key)).data.copy()
+    
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        entry = await self._entry(key)
+        entry.data.update(data)
+        self._changed(key, entry)
+        return entry.data.copy()
+    
+    async def _run(self):
+        swept_at = 0.0
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+            if time.monotonic() - swept_at >= SWEEP_INTERVAL:
+                swept_at = time.monotonic()
+                try:
+                    await self.sweep()
+                except Exception as e:
+                    logger.error(f"Ошибка очистки состояний FSM: {e}")
+    
+    async def flush(self):
+        """Записать последние значения измененных ключей одной транзакцией"""
+        if not self._dirty:
+            return
+        pending, self._dirty = self._dirty, {}
+        rows = [
+            {"key": name, "state": entry.state, "data": json.dumps(entry.data, ensure_ascii=False),
+             "updated_at": entry.touched}
+            for name, entry in pending.items() if not entry.is_empty()
+        ]
+        removed = [name for name, entry in pending.items() if entry.is_empty()]
+        
+        try:
+            async with self.db.async_session() as session:
+                if rows:
+                    statement = sqlite_insert(FsmRecord)
+                    await session.execute(
+                        statement.on_conflict_do_update(
+                            index_elements=[FsmRecord.key],
+                            set_={
+                                "state": statement.excluded.state,
+                                "data": statement.excluded.data,
+                                "updated_at": statement.excluded.updated_at
+                            }
+                        ),
+                        rows
+                    )
+                if removed:
+                    await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(removed)))
+                await session.commit()
+        except Exception as e:
+            # Вернем ключи в очередь, если их не изменили еще раз
+            for name, entry in pending.items():
+                self._dirty.setdefault(name, entry)
+            logger.error(f"Ошибка записи состояний FSM: {e}")
+            return
+        
+        self.flushes += 1
+        self.rows_written += len(pending)
+    
+    async def sweep(self) -> int:
+        """Удалить состояния, не менявшиеся дольше TTL. Возвращает число строк"""
+        cutoff = time.time() - self.ttl
+        async with self.db.async_session() as session:
+            result = await session.execute(delete(FsmRecord).where(FsmRecord.updated_at < cutoff))
+            await session.commit()
+        
+        stale = [
+            name for name, entry in self._cache.items()
+            if entry.touched and entry.touched < cutoff and name not in self._dirty
+        ]
+        for name in stale:
+            del self._cache[name]
+        
+        self.expired += result.rowcount
+        if result.rowcount:
+            logger.info(f"Удалено устаревших состояний FSM: {result.rowcount}")
+        return result.rowcount
+    
+    def stats(self) -> dict:
+        """Размер кэша, попадания и оценка занимаемой памяти"""
+        total = self.hits + self.misses
+        memory = sys.getsizeof(self._cache) + sum(
+            sys.getsizeof(name) + sys.getsizeof(entry) + sys.getsizeof(entry.data)
+            for name, entry in self._cache.items()
+        )
+        return {
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+            "memory_bytes": memory,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+            "pending": len(self._dirty),
+            "writes": self.writes,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "expired": self.expired
+        }
@@ -0,0 +1,175 @@
+"""Индекс рейтинга пользователей в памяти
+
+Ключи (total_score, current_level) хранятся в отсортированном списке,
+разбитом на блоки, а дерево Фенвика над длинами блоков дает позицию
+пользователя за O(log n). Индекс загружается при старте и обновляется
+при каждом изменении очков, поэтому запросы рейтинга не обращаются к БД.
+"""
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+class LeaderboardIndex:
+    """Отсортированный индекс рейтинга с запросами позиции и топа"""
+    
+    def __init__(self, load_factor: int = 256):
+        self._load = load_factor
+        self._buckets: List[list] = []
+        self._maxes: List[tuple] = []
+        self._tree: List[int] = []
+        self._size = 0
+        # telegram_id -> (total_score, current_level, имя)
+        self._users: Dict[int, Tuple[int, int, Optional[str]]] = {}
+    
+    def __len__(self) -> int:
+        """Количество пользователей с очками"""
+        return self._size
+    
+    def __contains__(self, telegram_id: int) -> bool:
+        return telegram_id in self._users
+    
+    @staticmethod
+    def _key(telegram_id: int, score: int, level: int) -> tuple:
+        # Порядок по возрастанию ключа = порядок рейтинга
+        return (-score, -level, telegram_id)
+    
+    def load(self, rows):
+        """Полная загрузка индекса из строк (telegram_id, total_score, current_level, имя)"""
+        self._users = {}
+        keys = []
+        for telegram_id, score, level, name in rows:
+            score = score or 0
+            level = level or 1
+            self._users[telegram_id] = (score, level, name)
+            if score > 0:
+                keys.append(self._key(telegram_id, score, level))
+        
+        keys.sort()
+        self._buckets = [keys[i:i + self._load] for i in range(0, len(keys), self._load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._size = len(keys)
+        self._rebuild_tree()
+    
+    def update(self, telegram_id: int, score: int, level: int, name: Optional[str] = None):
+        """Добавить пользователя или обновить его очки и уровень"""
+        previous = self._users.get(telegram_id)
+        if previous:
+            old_score, old_level, old_name = previous
+            if name is None:
+                name = old_name
+            if old_score > 0:
+                self._remove_key(self._key(telegram_id, old_score, old_level))
+        
+        self._users[telegram_id] = (score, level, name)
+        if score > 0:
+            self._add_key(self._key(telegram_id, score, level))
+    
+    def rank(self, telegram_id: int) -> dict:
+        """Позиция пользователя в рейтинге"""
+        entry = self._users.get(telegram_id)
+        if not entry:
+            return {'position': None, 'total_users': 0}
+        
+        score, level, _ = entry
+        # Пользователи с большим счетом (или равным счетом и большим уровнем)
+        higher_count = self._count_less((-score, -level)) if score > 0 else self._size
+        
+        return {
+            'position': higher_count + 1,
+            'total_users': self._size,
+            'score': score,
+            'level': level
+        }
+    
+    def top(self, limit: int = 10) -> list:
+        """Первые limit пользователей рейтинга"""
+        leaderboard = []
+        for bucket in self._buckets:
+            for neg_score, neg_level, telegram_id in bucket:
+                if len(leaderboard) >= limit:
+                    return leaderboard
+                name = self._users[telegram_id][2]
+                leaderboard.append({
+                    'position': len(leaderboard) + 1,
+                    'name': name or f"Пользователь {telegram_id}",
+                    'score': -neg_score,
+                    'level': -neg_level,
+                    'telegram_id': telegram_id
+                })
+        return leaderboard
+    
+    # Дерево Фенвика над длинами блоков
+    
+    def _rebuild_tree(self):
+        tree = [len(bucket) for bucket in self._buckets]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+    
+    def _tree_add(self, index: int, delta: int):
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index |= index + 1
+    
+    def _tree_prefix(self, end: int) -> int:
+        """Сумма длин блоков [0, end)"""
+        total = 0
+        end -= 1
+        while end >= 0:
+            total += self._tree[end]
+            end = (end & (end + 1)) - 1
+        return total
+    
+    # Операции над отсортированными блоками
+    
+    def _count_less(self, key: tuple) -> int:
+        index = bisect_left(self._maxes, key)
+        if index == len(self._buckets):
+            return self._size
+        return self._tree_prefix(index) + bisect_left(self._buckets[index], key)
+    
+    def _add_key(self, key: tuple):
+        self._size += 1
+        if not self._buckets:
+            self._buckets = [[key]]
+            self._maxes = [key]
+            self._rebuild_tree()
+            return
+        
+        index = bisect_left(self._maxes, key)
+        if index == len(self._buckets):
+            index -= 1
+        bucket = self._buckets[index]
+        insort(bucket, key)
+        self._maxes[index] = bucket[-1]
+        
+        if len(bucket) > 2 * self._load:
+            # Делим переполненный блок пополам
+            half = bucket[self._load:]
+            del bucket[self._load:]
+            self._maxes[index] = bucket[-1]
+            self._buckets.insert(index + 1, half)
+            self._maxes.insert(index + 1, half[-1])
+            self._rebuild_tree()
+        else:
+            self._tree_add(index, 1)
+    
+    def _remove_key(self, key: tuple):
+        index = bisect_left(self._maxes, key)
+        if index == len(self._buckets):
+            return
+        bucket = self._buckets[index]
+        position = bisect_left(bucket, key)
+        if position == len(bucket) or bucket[position] != key:
+            return
+        
+        del bucket[position]
+        self._size -= 1
+        if bucket:
+            self._maxes[index] = bucket[-1]
+            self._tree_add(index, -1)
+        else:
+            del self._buckets[index]
+            del self._maxes[index]
+            self._rebuild_tree()
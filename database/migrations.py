@@ -0,0 +1,119 @@
+"""Версионированные миграции схемы БД
+
+Модели в database/models.py описывают актуальную схему: новая база создается
+по ним целиком и сразу помечается последней версией. Для существующей базы
+применяются по порядку шаги с версией больше сохраненной в schema_version.
+Если версия уже последняя, DDL не выполняется вовсе - это быстрый путь запуска,
+поэтому любая новая таблица или индекс должны сопровождаться новой миграцией.
+
+Шаг миграции - SQL-строка или функция, принимающая синхронное соединение
+(для переноса данных). Миграции выполняются в одной транзакции с create_all.
+"""
+import logging
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import inspect, select, func, insert
+
+from database.models import Base, SchemaVersion, DbMeta, ProblemDailyRollup, SessionSnapshot, FsmRecord
+from utils.problem_codec import parse
+
+logger = logging.getLogger(__name__)
+
+def _encode_problem_texts(connection, chunk_size: int = 5000):
+    """Заполнить problem_code по тексту задач, порциями по id"""
+    codes = {}  # текстов задач немного - разбираем каждый один раз
+    after_id = 0
+    while True:
+        rows = connection.exec_driver_sql(
+            "SELECT id, problem_text FROM problems WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, chunk_size)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for problem_id, text in rows:
+            if text not in codes:
+                codes[text] = parse(text or "")
+            updates.append((codes[text], problem_id))
+        connection.exec_driver_sql("UPDATE problems SET problem_code = ? WHERE id = ?", updates)
+        after_id = rows[-1][0]
+
+# (версия, описание, шаги) - только добавлять в конец, не менять примененные
+MIGRATIONS = [
+    (1, "Индекс сессий по пользователю", [
+        "CREATE INDEX IF NOT EXISTS ix_learning_sessions_user_id ON learning_sessions (user_id)",
+    ]),
+    (2, "Индекс задач по сессии", [
+        "CREATE INDEX IF NOT EXISTS ix_problems_session_id ON problems (session_id)",
+    ]),
+    (3, "Индекс достижений по пользователю", [
+        "CREATE INDEX IF NOT EXISTS ix_user_achievements_user_id ON user_achievements (user_id)",
+    ]),
+    (4, "Индекс рейтинга по очкам и уровню", [
+        "CREATE INDEX IF NOT EXISTS ix_users_total_score_current_level "
+        "ON users (total_score, current_level)",
+    ]),
+    (5, "Таблица служебных значений", [
+        lambda connection: DbMeta.__table__.create(connection, checkfirst=True),
+    ]),
+    (6, "Дневная сводка заархивированных задач", [
+        lambda connection: ProblemDailyRollup.__table__.create(connection, checkfirst=True),
+    ]),
+    (7, "Код задачи вместо текста", [
+        "ALTER TABLE problems ADD COLUMN problem_code INTEGER NOT NULL DEFAULT 0",
+        _encode_problem_texts,
+        "ALTER TABLE problems DROP COLUMN problem_text",
+    ]),
+    (8, "Снимки незавершенных сессий", [
+        lambda connection: SessionSnapshot.__table__.create(connection, checkfirst=True),
+    ]),
+    (9, "Хранилище состояний FSM", [
+        lambda connection: FsmRecord.__table__.create(connection, checkfirst=True),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(connection) -> int:
+    """Последняя примененная версия схемы (0 - миграции еще не применялись)"""
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+    return connection.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+def upgrade(connection) -> Tuple[int, List[int], bool]:
+    """
+    Привести схему к последней версии
+    
+    Returns:
+        tuple: (версия_до, примененные_версии, база_создана_с_нуля)
+    """
+    version = current_version(connection)
+    if version == LATEST_VERSION:
+        return version, [], False
+    
+    fresh = not inspect(connection).has_table("users")
+    
+    # Новые таблицы и индексы создаются по моделям
+    Base.metadata.create_all(connection)
+    
+    applied = []
+    for number, description, steps in MIGRATIONS:
+        if number <= version:
+            continue
+        # В новой базе схема уже актуальна - только отмечаем версию
+        if not fresh:
+            for step in steps:
+                if callable(step):
+                    step(connection)
+                else:
+                    connection.exec_driver_sql(step)
+            logger.info(f"Применена миграция {number}: {description}")
+        connection.execute(
+            insert(SchemaVersion).values(
+                version=number, description=description, applied_at=datetime.utcnow()
+            )
+        )
+        applied.append(number)
+    
+    return version, applied, fresh
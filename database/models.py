@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Boolean, Float, ForeignKey, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -8,6 +8,9 @@ Base = declarative_base()
 class User(Base):
     """Модель пользователя бота"""
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_total_score_current_level", "total_score", "current_level"),
+    )
     
     id = Column(Integer, primary_key=True)
     telegram_id = Column(Integer, unique=True, index=True)
@@ -23,13 +26,14 @@ class User(Base):
     sessions = relationship("LearningSession", back_populates="user")
     achievements = relationship("UserAchievement", back_populates="user")
     settings = relationship("UserSettings", back_populates="user", uselist=False)
+    stats = relationship("UserStats", back_populates="user", uselist=False)
 
 class LearningSession(Base):
     """Модель сессии обучения"""
     __tablename__ = "learning_sessions"
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     level = Column(Integer, nullable=False)
     problems_solved = Column(Integer, default=0)
     correct_answers = Column(Integer, default=0)
@@ -47,9 +51,9 @@ class Problem(Base):
     __tablename__ = "problems"
     
     id = Column(Integer, primary_key=True)
-    session_id = Column(Integer, ForeignKey("learning_sessions.id"))
+    session_id = Column(Integer, ForeignKey("learning_sessions.id"), index=True)
     level = Column(Integer, nullable=False)
-    problem_text = Column(String(500), nullable=False)
+    problem_code = Column(Integer, nullable=False, default=0)  # числа и операции, см. utils/problem_codec.py
     correct_answer = Column(Integer, nullable=False)
     user_answer = Column(Integer, nullable=True)
     is_correct = Column(Boolean, default=False)
@@ -60,6 +64,18 @@ class Problem(Base):
     # Связи
     session = relationship("LearningSession", back_populates="problems")
 
+class ProblemDailyRollup(Base):
+    """Сводка заархивированных задач пользователя по уровню и дню"""
+    __tablename__ = "problem_daily_rollups"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    level = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, default=0)
+    correct = Column(Integer, default=0)
+    time_sum = Column(Float, default=0.0)  # в секундах
+    min_time = Column(Float, nullable=True)  # в секундах
+
 class Achievement(Base):
     """Модель достижений"""
     __tablename__ = "achievements"
@@ -79,7 +95,7 @@ class UserAchievement(Base):
     __tablename__ = "user_achievements"
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     achievement_id = Column(Integer, ForeignKey("achievements.id"))
     earned_at = Column(DateTime, default=datetime.utcnow)
     
@@ -102,4 +118,71 @@ class UserSettings(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Связи
-    user = relationship("User", back_populates="settings") 
\ No newline at end of file
+    user = relationship("User", back_populates="settings")
+
+class UserStats(Base):
+    """Материализованная статистика пользователя (обновляется при сохранении сессии)"""
+    __tablename__ = "user_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_sessions = Column(Integer, default=0)
+    completed_sessions = Column(Integer, default=0)
+    total_problems = Column(Integer, default=0)
+    correct_answers = Column(Integer, default=0)
+    achievements_count = Column(Integer, default=0)
+    best_time = Column(Float, nullable=True)  # лучшее время завершенной сессии в секундах
+    current_streak = Column(Integer, default=0)  # текущая серия правильных ответов
+    max_streak = Column(Integer, default=0)  # лучшая серия правильных ответов
+    fastest_correct = Column(Float, nullable=True)  # самый быстрый правильный ответ в секундах
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Связи
+    user = relationship("User", back_populates="stats")
+
+class DbMeta(Base):
+    """Служебные значения БД (версия начальных данных и т.п.)"""
+    __tablename__ = "db_meta"
+    
+    key = Column(String(50), primary_key=True)
+    value = Column(String(255), nullable=False)
+
+class SchemaVersion(Base):
+    """Примененные миграции схемы (см. database/migrations.py)"""
+    __tablename__ = "schema_version"
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String(255), nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+class SessionSnapshot(Base):
+    """Снимок незавершенной сессии обучения для восстановления после перезапуска"""
+    __tablename__ = "session_snapshots"
+    
+    user_id = Column(Integer, primary_key=True)  # telegram_id
+    chat_id = Column(Integer, nullable=False)
+    message_id = Column(Integer, nullable=False)  # сообщение с текущей задачей
+    level = Column(Integer, nullable=False)
+    total_problems = Column(Integer, nullable=False)
+    time_per_problem = Column(Integer, nullable=False)
+    current_problem = Column(Integer, nullable=False)
+    current_problem_code = Column(Integer, nullable=False)
+    current_correct_answer = Column(Integer, nullable=True)
+    started_at = Column(Float, nullable=False)  # время Unix
+    problem_started_at = Column(Float, nullable=True)
+    last_activity = Column(Float, nullable=False)
+    timer_kind = Column(String(20), nullable=True)  # взведенный таймер (None - таймера нет)
+    deadline = Column(Float, nullable=True)  # время Unix срабатывания таймера
+    is_parked = Column(Boolean, default=False)
+    timeouts_in_row = Column(Integer, default=0)
+    plan = Column(LargeBinary, nullable=False)  # SessionPlan.dump()
+    answers = Column(LargeBinary, nullable=False)  # AnswerLog.dump()
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class FsmRecord(Base):
+    """Состояние и данные FSM aiogram одного ключа (см. database/fsm_storage.py)"""
+    __tablename__ = "fsm_states"
+    
+    key = Column(String(100), primary_key=True)  # бот:чат:пользователь:тема:назначение
+    state = Column(String(100), nullable=True)
+    data = Column(Text, nullable=False, default="{}")  # JSON
+    updated_at = Column(Float, nullable=False, index=True)  # время Unix, для удаления по TTL
@@ -0,0 +1,60 @@
+"""Кэш горячих профилей пользователей в памяти процесса
+
+Профиль - это мелкие данные, которые нужны почти каждому обработчику:
+id пользователя, уровень, очки и настройки сессии. Кэш ограничен по размеру
+и вытесняет давно не использованные записи (LRU).
+"""
+from collections import OrderedDict
+from typing import Optional
+
+class ProfileCache:
+    """LRU-кэш telegram_id -> профиль пользователя"""
+    
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._profiles: "OrderedDict[int, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __len__(self) -> int:
+        return len(self._profiles)
+    
+    def get(self, telegram_id: int) -> Optional[dict]:
+        """Получить профиль из кэша"""
+        profile = self._profiles.get(telegram_id)
+        if profile is None:
+            self.misses += 1
+            return None
+        
+        self._profiles.move_to_end(telegram_id)
+        self.hits += 1
+        return profile
+    
+    def put(self, telegram_id: int, profile: dict):
+        """Положить профиль в кэш, вытеснив самый старый при переполнении"""
+        self._profiles[telegram_id] = profile
+        self._profiles.move_to_end(telegram_id)
+        while len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, telegram_id: int):
+        """Удалить профиль пользователя из кэша"""
+        self._profiles.pop(telegram_id, None)
+    
+    def clear(self):
+        """Очистить кэш"""
+        self._profiles.clear()
+    
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._profiles),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0
+        }
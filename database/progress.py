@@ -0,0 +1,71 @@
+"""Подсчет результатов сессии: очки, повышение уровня и статистика
+
+Функции не обращаются к БД и работают как с ORM-объектами,
+так и со снимками состояния в памяти (см. write_behind).
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from config import Config
+from database.achievements import update_counters
+from database.models import UserStats
+from utils.answer_log import AnswerLog
+
+@dataclass
+class SessionResult:
+    """Итог сохраненной сессии для показа пользователю"""
+    problems_solved: int
+    correct_answers: int
+    accuracy: float
+    score_gained: int
+    total_score: int
+    level: int  # уровень пользователя после сессии
+    level_up: bool = False
+    new_achievements: List = field(default_factory=list)
+    position: Optional[int] = None  # место в рейтинге после сессии
+    total_users: int = 0
+
+def new_user_stats(user_id: int) -> UserStats:
+    """Пустая строка статистики для пользователя без сессий"""
+    return UserStats(
+        user_id=user_id,
+        total_sessions=0,
+        completed_sessions=0,
+        total_problems=0,
+        correct_answers=0,
+        achievements_count=0,
+        current_streak=0,
+        max_streak=0
+    )
+
+def calculate_progress(answers: AnswerLog, level: int, current_level: int) -> tuple:
+    """
+    Посчитать результат сессии
+    
+    Returns:
+        tuple: (правильных_ответов, точность, очков_получено, новый_уровень)
+    """
+    problems_solved = len(answers)
+    correct_answers = answers.correct
+    accuracy = (correct_answers / problems_solved * 100) if problems_solved > 0 else 0
+    
+    score_gained = correct_answers * 10  # 10 очков за правильный ответ
+    if accuracy >= 80:  # Бонус за хорошую точность
+        score_gained += problems_solved * 5
+    
+    # Повышение уровня (80%+ точность на текущем уровне)
+    new_level = current_level
+    if accuracy >= 80 and level == current_level:
+        new_level = max(current_level, min(level + 1, Config.MAX_LEVEL))
+    
+    return correct_answers, accuracy, score_gained, new_level
+
+def apply_session_stats(stats, answers: AnswerLog, correct_answers: int, total_time: float):
+    """Добавить завершенную сессию в материализованную статистику"""
+    stats.total_sessions += 1
+    stats.completed_sessions += 1
+    stats.total_problems += len(answers)
+    stats.correct_answers += correct_answers
+    if stats.best_time is None or total_time < stats.best_time:
+        stats.best_time = total_time
+    update_counters(stats, answers)
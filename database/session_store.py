@@ -0,0 +1,118 @@
+"""Снимки незавершенных сессий обучения в таблице session_snapshots
+
+Обработчики сообщают о каждом изменении сессии (save) и о её завершении
+(delete), а в БД изменения уходят фоновой задачей раз в interval_ms: для
+каждого пользователя пишется только последнее состояние, все снимки пакета -
+одной транзакцией. При перезапуске бота снимки загружаются (load_all),
+и сессии продолжаются с той же задачи с оставшимся временем.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database.models import SessionSnapshot
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_COLUMNS = [column.name for column in SessionSnapshot.__table__.columns]
+
+class SessionSnapshotStore:
+    """Отложенная запись снимков сессий с объединением изменений"""
+    
+    def __init__(self, db, interval_ms: int = 200):
+        self.db = db
+        self.interval = interval_ms / 1000
+        self._dirty: Dict[int, Optional[dict]] = {}  # user_id -> снимок (None - удалить)
+        self._task = None
+        self.flushes = 0
+        self.saved = 0
+        self.deleted = 0
+        self.errors = 0
+    
+    def start(self):
+        """Запустить фоновую запись снимков"""
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Снимки сессий включены: запись каждые {self.interval * 1000:.0f} мс")
+    
+    async def stop(self):
+        """Записать накопленные снимки и остановить фоновую задачу"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    def save(self, snapshot: dict):
+        """Запомнить новое состояние сессии (перезаписывает еще не записанное)"""
+        self._dirty[snapshot["user_id"]] = snapshot
+    
+    def delete(self, user_id: int):
+        """Удалить снимок завершенной или вытесненной сессии"""
+        self._dirty[user_id] = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+    
+    async def flush(self):
+        """Записать накопленные изменения одной транзакцией"""
+        if not self._dirty:
+            return
+        pending, self._dirty = self._dirty, {}
+        now = datetime.utcnow()
+        rows = [dict(snapshot, updated_at=now) for snapshot in pending.values() if snapshot]
+        removed = [user_id for user_id, snapshot in pending.items() if snapshot is None]
+        
+        try:
+            async with self.db.async_session() as session:
+                if rows:
+                    statement = sqlite_insert(SessionSnapshot)
+                    await session.execute(
+                        statement.on_conflict_do_update(
+                            index_elements=[SessionSnapshot.user_id],
+                            set_={name: statement.excluded[name] for name in SNAPSHOT_COLUMNS if name != "user_id"}
+                        ),
+                        rows
+                    )
+                if removed:
+                    await session.execute(
+                        delete(SessionSnapshot).where(SessionSnapshot.user_id.in_(removed))
+                    )
+                await session.commit()
+        except Exception as e:
+            # Вернем изменения в очередь, если за это время не появились более новые
+            self._dirty = {**pending, **self._dirty}
+            self.errors += 1
+            logger.error(f"Ошибка записи снимков сессий: {e}")
+            return
+        
+        self.flushes += 1
+        self.saved += len(rows)
+        self.deleted += len(removed)
+    
+    async def load_all(self, shard: int = 0, shards: int = 1) -> List[dict]:
+        """Сохраненные снимки (при запуске бота); в режиме шардов - только пользователей шарда"""
+        query = select(SessionSnapshot.__table__)
+        if shards > 1:
+            query = query.where(SessionSnapshot.user_id % shards == shard)
+        async with self.db.async_session() as session:
+            result = await session.execute(query)
+            return [dict(row) for row in result.mappings().all()]
+    
+    def stats(self) -> dict:
+        """Счетчики для метрик"""
+        return {
+            "pending": len(self._dirty),
+            "flushes": self.flushes,
+            "saved": self.saved,
+            "deleted": self.deleted,
+            "errors": self.errors
+        }
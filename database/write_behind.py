@@ -0,0 +1,266 @@
+"""Отложенная пакетная запись завершенных сессий
+
+Результат сессии (очки, уровень, достижения) считается сразу по состоянию
+пользователя в памяти, а строки в БД записываются фоновой задачей общими
+транзакциями: раз в interval_ms или по набору batch_size сессий. Очередь
+ограничена max_pending - при переполнении submit ждет (backpressure).
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database.models import User, UserAchievement, UserStats
+from database.achievements import evaluate_achievements
+from database.progress import SessionResult, calculate_progress, apply_session_stats, new_user_stats
+from utils.answer_log import AnswerLog
+
+logger = logging.getLogger(__name__)
+
+STATS_COLUMNS = (
+    "total_sessions", "completed_sessions", "total_problems", "correct_answers",
+    "achievements_count", "best_time", "current_streak", "max_streak", "fastest_correct"
+)
+
+class _UserState:
+    """Состояние пользователя в памяти, пока его сессии ждут записи"""
+    
+    def __init__(self, user_id: int, total_score: int, current_level: int,
+                 stats: UserStats, earned_ids: set):
+        self.user_id = user_id
+        self.total_score = total_score
+        self.current_level = current_level
+        self.stats = stats
+        self.earned_ids = earned_ids
+        self.pending = 0  # сессий в очереди
+
+@dataclass
+class _PendingSession:
+    """Снимок завершенной сессии для записи в БД"""
+    telegram_id: int
+    user_id: int
+    level: int
+    answers: AnswerLog
+    total_time: float
+    total_score: int
+    current_level: int
+    stats: dict
+    achievement_ids: List[int]
+    finished_at: datetime
+
+class WriteBehindQueue:
+    """Очередь отложенной записи сессий всех пользователей"""
+    
+    def __init__(self, db, interval_ms: int = 50, batch_size: int = 100, max_pending: int = 1000):
+        self.db = db
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._states: Dict[int, _UserState] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._achievements = []
+        self._task = None
+        self.batches_written = 0
+        self.sessions_written = 0
+        self.sessions_failed = 0
+    
+    async def start(self):
+        """Запустить фоновую запись"""
+        async with self.db.async_session() as session:
+            self._achievements = await self.db._get_achievements(session)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Отложенная запись сессий включена: {self.interval * 1000:.0f} мс / "
+                    f"{self.batch_size} сессий, очередь до {self._queue.maxsize}")
+    
+    async def flush(self):
+        """Дождаться записи всех сессий, поставленных в очередь"""
+        await self._queue.join()
+    
+    async def stop(self):
+        """Записать остаток очереди и остановить фоновую задачу"""
+        if not self._task:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"Отложенная запись остановлена: записано {self.sessions_written} сессий "
+                    f"в {self.batches_written} транзакциях, ошибок {self.sessions_failed}")
+    
+    def pending_state(self, telegram_id: int) -> Optional[_UserState]:
+        """Состояние пользователя, если его сессии еще ждут записи"""
+        return self._states.get(telegram_id)
+    
+    async def submit(self, telegram_id: int, level: int,
+                     answers: AnswerLog, total_time: float) -> Optional[SessionResult]:
+        """Посчитать результат сессии в памяти и поставить её запись в очередь"""
+        lock = self._locks.setdefault(telegram_id, asyncio.Lock())
+        async with lock:
+            state = self._states.get(telegram_id) or await self._load_state(telegram_id)
+            if not state:
+                logger.error(f"Пользователь {telegram_id} не найден")
+                return None
+            
+            correct_answers, accuracy, score_gained, new_level = calculate_progress(
+                answers, level, state.current_level
+            )
+            level_up = new_level > state.current_level
+            state.total_score += score_gained
+            state.current_level = new_level
+            apply_session_stats(state.stats, answers, correct_answers, total_time)
+            
+            new_achievements = evaluate_achievements(
+                self._achievements, state.earned_ids, state.stats, state.current_level
+            )
+            state.earned_ids.update(achievement.id for achievement in new_achievements)
+            state.stats.achievements_count += len(new_achievements)
+            state.pending += 1
+            
+            item = _PendingSession(
+                telegram_id=telegram_id,
+                user_id=state.user_id,
+                level=level,
+                answers=answers,
+                total_time=total_time,
+                total_score=state.total_score,
+                current_level=state.current_level,
+                stats={column: getattr(state.stats, column) for column in STATS_COLUMNS},
+                achievement_ids=[achievement.id for achievement in new_achievements],
+                finished_at=datetime.utcnow()
+            )
+        
+        self.db.leaderboard.update(telegram_id, item.total_score, item.current_level)
+        if level_up:
+            logger.info(f"Пользователь {telegram_id} повысился до уровня {item.current_level}")
+        
+        # При переполненной очереди ждем, пока фоновая задача её разгрузит
+        await self._queue.put(item)
+        
+        return SessionResult(
+            problems_solved=len(answers),
+            correct_answers=correct_answers,
+            accuracy=accuracy,
+            score_gained=score_gained,
+            total_score=item.total_score,
+            level=item.current_level,
+            level_up=level_up,
+            new_achievements=new_achievements
+        )
+    
+    async def _load_state(self, telegram_id: int) -> Optional[_UserState]:
+        """Загрузить состояние пользователя из БД (когда у него нет ожидающих записей)"""
+        async with self.db.async_session() as session:
+            result = await session.execute(
+                select(User, UserStats)
+                .outerjoin(UserStats, UserStats.user_id == User.id)
+                .where(User.telegram_id == telegram_id)
+            )
+            row = result.first()
+            if not row:
+                return None
+            
+            user, stats = row
+            earned_result = await session.execute(
+                select(UserAchievement.achievement_id).where(UserAchievement.user_id == user.id)
+            )
+            state = _UserState(
+                user_id=user.id,
+                total_score=user.total_score,
+                current_level=user.current_level,
+                stats=stats or new_user_stats(user.id),
+                earned_ids=set(earned_result.scalars().all())
+            )
+        
+        self._states[telegram_id] = state
+        return state
+    
+    async def _run(self):
+        """Собирать сессии в пакеты и записывать их общими транзакциями"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.interval
+            
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            await self._write_batch(batch)
+            
+            for item in batch:
+                state = self._states.get(item.telegram_id)
+                if state:
+                    state.pending -= 1
+                    if state.pending <= 0:
+                        # Всё записано - дальше источником правды снова служит БД
+                        del self._states[item.telegram_id]
+                        lock = self._locks.get(item.telegram_id)
+                        if lock and not lock.locked():
+                            del self._locks[item.telegram_id]
+                self._queue.task_done()
+    
+    async def _write_batch(self, batch: List[_PendingSession]):
+        """Записать пакет одной транзакцией, при ошибке - по одной сессии"""
+        try:
+            async with self.db.async_session() as session:
+                for item in batch:
+                    await self._write_item(session, item)
+                await session.commit()
+            self.batches_written += 1
+            self.sessions_written += len(batch)
+            logger.debug(f"Записан пакет из {len(batch)} сессий")
+            return
+        except Exception as e:
+            logger.error(f"Ошибка записи пакета из {len(batch)} сессий: {e}")
+        
+        for item in batch:
+            try:
+                async with self.db.async_session() as session:
+                    await self._write_item(session, item)
+                    await session.commit()
+                self.batches_written += 1
+                self.sessions_written += 1
+            except Exception as e:
+                self.sessions_failed += 1
+                logger.error(f"Не удалось записать сессию пользователя {item.telegram_id}: {e}")
+    
+    async def _write_item(self, session, item: _PendingSession):
+        """Добавить в транзакцию строки одной сессии"""
+        await self.db._insert_session_rows(
+            session, item.user_id, item.level, item.answers, item.total_time
+        )
+        await session.execute(
+            update(User).where(User.id == item.user_id).values(
+                total_score=item.total_score,
+                current_level=item.current_level,
+                last_activity=item.finished_at
+            )
+        )
+        await session.execute(
+            sqlite_insert(UserStats)
+            .values(user_id=item.user_id, updated_at=item.finished_at, **item.stats)
+            .on_conflict_do_update(
+                index_elements=[UserStats.user_id],
+                set_=dict(item.stats, updated_at=item.finished_at)
+            )
+        )
+        if item.achievement_ids:
+            await session.execute(
+                insert(UserAchievement.__table__),
+                [
+                    {"user_id": item.user_id, "achievement_id": achievement_id, "earned_at": item.finished_at}
+                    for achievement_id in item.achievement_ids
+                ]
+            )
@@ -3,9 +3,9 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select
 
 from database.database import db
+from database.fsm_storage import SQLiteStorage
 from keyboards.main_keyboard import get_main_menu, get_level_selection, get_photo_materials_keyboard
 from utils.formatters import format_welcome_message, format_help_message, format_user_stats, get_random_greeting
 from utils.math_generator import math_generator
@@ -23,8 +23,8 @@ async def start_command(message: Message, state: FSMContext):
     """Обработчик команды /start"""
     await state.clear()  # Очищаем состояние
     
-    # Создаем или получаем пользователя
-    user = await db.get_or_create_user(
+    # Регистрируем пользователя (известные пользователи не обращаются к БД)
+    await db.ensure_user(
         telegram_id=message.from_user.id,
         username=message.from_user.username,
         first_name=message.from_user.first_name,
@@ -74,12 +74,17 @@ async def stats_command(message: Message):
 @router.message(F.text == "🧮 Начать обучение")
 async def start_learning(message: Message):
     """Обработчик начала обучения"""
-    # Получаем информацию о пользователе
-    user = await db.get_or_create_user(telegram_id=message.from_user.id)
+    # Регистрируем пользователя, если он пришел без /start
+    await db.ensure_user(
+        telegram_id=message.from_user.id,
+        username=message.from_user.username,
+        first_name=message.from_user.first_name,
+        last_name=message.from_user.last_name
+    )
     
-    # Получаем статистику для определения текущего уровня
-    stats = await db.get_user_stats(message.from_user.id)
-    current_level = stats.get("level", 1) if stats else 1
+    # Получаем профиль для определения текущего уровня
+    profile = await db.get_profile(message.from_user.id)
+    current_level = profile.get("level", 1) if profile else 1
     
     # Показываем выбор уровня
     keyboard = get_level_selection(current_level)
@@ -96,32 +101,13 @@ async def start_learning(message: Message):
 async def achievements_command(message: Message):
     """Обработчик команды достижений"""
     # Получаем реальные достижения пользователя
-    async with db.async_session() as session:
-        from sqlalchemy import select
-        from sqlalchemy.orm import selectinload
-        from database.models import User, UserAchievement, Achievement
-        
-        user_result = await session.execute(
-            select(User).options(
-                selectinload(User.achievements).selectinload(UserAchievement.achievement)
-            ).where(User.telegram_id == message.from_user.id)
-        )
-        user = user_result.scalar_one_or_none()
-        
-        if user and user.achievements:
-            achievements_data = []
-            for user_achievement in user.achievements:
-                achievements_data.append({
-                    'name': user_achievement.achievement.name,
-                    'description': user_achievement.achievement.description,
-                    'icon': user_achievement.achievement.icon,
-                    'earned_at': user_achievement.earned_at
-                })
-            
-            from utils.formatters import format_achievements_list
-            text = format_achievements_list(achievements_data)
-        else:
-            text = "🏆 <b>Достижения</b>\n\nУ тебя пока нет достижений.\nРеши несколько задач, чтобы получить первые награды! 💪"
+    achievements_data = await db.get_user_achievements(message.from_user.id)
+    
+    if achievements_data:
+        from utils.formatters import format_achievements_list
+        text = format_achievements_list(achievements_data)
+    else:
+        text = "🏆 <b>Достижения</b>\n\nУ тебя пока нет достижений.\nРеши несколько задач, чтобы получить первые награды! 💪"
     
     await message.answer(text, parse_mode="HTML")
 
@@ -139,6 +125,86 @@ async def leaderboard_command(message: Message):
     
     await message.answer(leaderboard_text, parse_mode="HTML")
 
+@router.message(Command("metrics"))
+async def metrics_command(message: Message, state: FSMContext, webhook_server=None, shard=None):
+    """Внутренние метрики бота (только для администратора)"""
+    from config import Config
+    
+    if message.from_user.id != Config.ADMIN_ID:
+        return
+    
+    cache = db.profiles.stats()
+    text = "📈 <b>Метрики</b>\n\n"
+    if shard:
+        text += f"🧩 <b>Процесс:</b> шард {shard[0]} из {shard[1]}, данные ниже - только этого шарда\n"
+    text += (
+        f"👤 <b>Кэш профилей:</b> {cache['size']}/{cache['max_size']}, "
+        f"попаданий {cache['hits']}, промахов {cache['misses']} ({cache['hit_rate']}%), "
+        f"вытеснено {cache['evictions']}"
+    )
+    from handlers.learning_handlers import reaper, timers
+    timer_stats = timers.stats()
+    sessions = reaper.stats()
+    text += (
+        f"\n⏱ <b>Сессии и таймеры:</b> активных сессий {sessions['active']}, "
+        f"таймеров {timer_stats['active']} (в куче {timer_stats['heap_size']}), "
+        f"сработало {timer_stats['fired']} в {timer_stats['batches']} пачках, "
+        f"отменено {timer_stats['cancelled']}"
+        f"\n😴 <b>Брошенные сессии:</b> припарковано сейчас {sessions['parked_now']}, "
+        f"всего {sessions['parked']} (бот заблокирован {sessions['blocked']}), "
+        f"возобновлено {sessions['resumed']}, вытеснено {sessions['reaped']}"
+    )
+    from middlewares.chat_order import chat_order
+    queues = chat_order.stats()
+    text += (
+        f"\n🚦 <b>Очереди чатов:</b> чатов с обновлениями {queues['chats']}, в очередях {queues['queued']} "
+        f"(максимум {queues['max_depth']} в чате), обработано {queues['processed']}, "
+        f"отброшено {queues['dropped']}, ожиданий {queues['waits']} "
+        f"(в среднем {queues['wait_avg_ms']} мс, максимум {queues['wait_max_ms']} мс)"
+    )
+    if Config.OUTBOUND_ENABLED:
+        from middlewares.outbound import outbound
+        sending = outbound.stats()
+        text += (
+            f"\n📤 <b>Исходящие запросы:</b> отправлено {sending['sent']}, в очереди "
+            + ", ".join(f"{name} {count}" for name, count in sending["queued"].items())
+            + "; ждали лимита "
+            + ", ".join(
+                f"{name} {count} (в среднем {sending['wait_avg_ms'][name]} мс, максимум {sending['wait_max_ms'][name]} мс)"
+                for name, count in sending["throttled"].items()
+            )
+            + f"; RetryAfter {sending['retry_after']}, не отправлено {sending['failed']}, чатов {sending['chats']}"
+        )
+    if webhook_server:
+        webhook = webhook_server.stats()
+        text += (
+            f"\n🌐 <b>Вебхук:</b> в очереди {webhook['queue']}/{webhook['queue_size']} "
+            f"(максимум {webhook['max_queue']}), принято {webhook['received']}, "
+            f"отклонено {webhook['rejected']}, обработано {webhook['processed']}, ошибок {webhook['failed']}"
+        )
+    if isinstance(state.storage, SQLiteStorage):
+        fsm = state.storage.stats()
+        text += (
+            f"\n🗂 <b>Состояния FSM:</b> в кэше {fsm['size']}/{fsm['max_size']} "
+            f"(~{fsm['memory_bytes'] // 1024} КБ), попаданий {fsm['hit_rate']}%, "
+            f"вытеснено {fsm['evictions']}, изменений {fsm['writes']} -> "
+            f"записей {fsm['rows_written']}, ожидают {fsm['pending']}, удалено по TTL {fsm['expired']}"
+        )
+    if db.snapshots:
+        snapshots = db.snapshots.stats()
+        text += (
+            f"\n💾 <b>Снимки сессий:</b> записано {snapshots['saved']}, удалено {snapshots['deleted']} "
+            f"за {snapshots['flushes']} сбросов, ожидают {snapshots['pending']}, ошибок {snapshots['errors']}"
+        )
+    if db.archiver:
+        archive = db.archiver.stats()
+        text += (
+            f"\n🗄 <b>Архив задач:</b> запусков {archive['runs']}, "
+            f"заархивировано {archive['problems_archived']}"
+        )
+    
+    await message.answer(text, parse_mode="HTML")
+
 @router.message(F.text == "⚙️ Настройки")
 async def settings_command(message: Message):
     """Обработчик команды настроек"""
@@ -232,8 +298,8 @@ async def cancel_action(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "setting_time")
 async def setting_time(callback: CallbackQuery, state: FSMContext):
     """Настройка времени на задачу"""
-    user_settings = await db.get_user_settings(callback.from_user.id)
-    current_time = user_settings.get("time_per_problem", 30)
+    profile = await db.get_profile(callback.from_user.id)
+    current_time = profile.get("time_per_problem", 30)
     
     from config import Config
     
@@ -253,8 +319,8 @@ async def setting_time(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "setting_problems")
 async def setting_problems(callback: CallbackQuery, state: FSMContext):
     """Настройка количества задач"""
-    user_settings = await db.get_user_settings(callback.from_user.id)
-    current_problems = user_settings.get("problems_per_session", 5)
+    profile = await db.get_profile(callback.from_user.id)
+    current_problems = profile.get("problems_per_session", 5)
     
     from config import Config
     
@@ -320,58 +386,25 @@ async def confirm_reset_progress(callback: CallbackQuery, state: FSMContext):
     
     try:
         # Сбрасываем прогресс пользователя в базе данных
-        async with db.async_session() as session:
-            from sqlalchemy import update, delete
-            from database.models import User, LearningSession, Problem, UserAchievement
+        if await db.reset_user_progress(user_id):
+            # Очищаем состояние
+            await state.clear()
             
-            # Получаем пользователя
-            user_result = await session.execute(
-                select(User).where(User.telegram_id == user_id)
+            await callback.message.edit_text(
+                "✅ <b>Прогресс сброшен!</b>\n\n"
+                "Ваш прогресс был успешно удален.\n"
+                "Теперь вы можете начать обучение с самого начала!",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
+                    InlineKeyboardButton(text="🏠 В главное меню", callback_data="back_to_menu")
+                ]]),
+                parse_mode="HTML"
             )
-            user = user_result.scalar_one_or_none()
             
-            if user:
-                # Удаляем все связанные данные
-                await session.execute(
-                    delete(Problem).where(Problem.session_id.in_(
-                        select(LearningSession.id).where(LearningSession.user_id == user.id)
-                    ))
-                )
-                await session.execute(
-                    delete(LearningSession).where(LearningSession.user_id == user.id)
-                )
-                await session.execute(
-                    delete(UserAchievement).where(UserAchievement.user_id == user.id)
-                )
-                
-                # Сбрасываем статистику пользователя
-                await session.execute(
-                    update(User).where(User.id == user.id).values(
-                        current_level=1,
-                        total_score=0
-                    )
-                )
-                
-                await session.commit()
-                
-                # Очищаем состояние
-                await state.clear()
-                
-                await callback.message.edit_text(
-                    "✅ <b>Прогресс сброшен!</b>\n\n"
-                    "Ваш прогресс был успешно удален.\n"
-                    "Теперь вы можете начать обучение с самого начала!",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
-                        InlineKeyboardButton(text="🏠 В главное меню", callback_data="back_to_menu")
-                    ]]),
-                    parse_mode="HTML"
-                )
-                
-                logger.info(f"Пользователь {user_id} сбросил свой прогресс")
-                
-            else:
-                await callback.answer("❌ Пользователь не найден", show_alert=True)
-                
+            logger.info(f"Пользователь {user_id} сбросил свой прогресс")
+            
+        else:
+            await callback.answer("❌ Пользователь не найден", show_alert=True)
+        
     except Exception as e:
         logger.error(f"Ошибка сброса прогресса для пользователя {user_id}: {e}")
         await callback.answer("❌ Произошла ошибка при сбросе прогресса", show_alert=True)
@@ -1,15 +1,22 @@
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import CallbackQuery, Message, Chat
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.exceptions import TelegramForbiddenError
+from datetime import datetime
 import asyncio
 import time
 import logging
 
 from database.database import db
-from keyboards.main_keyboard import get_answer_keyboard, get_learning_keyboard, get_session_results_keyboard, get_main_menu
-from utils.math_generator import math_generator
-from utils.formatters import format_problem, format_session_result
+from keyboards.main_keyboard import get_answer_keyboard, get_learning_keyboard, get_session_results_keyboard, get_main_menu, get_resume_keyboard
+from utils.session_plan import SessionPlan, build_session_plan
+from utils.deadline_scheduler import DeadlineScheduler
+from utils.session_reaper import SessionReaper
+from utils.answer_log import AnswerLog, TIMEOUT_ANSWER
+from utils.formatters import format_session_result, format_achievement_earned
+from middlewares.chat_order import chat_order
 from config import Config
 
 router = Router()
@@ -22,40 +29,94 @@ class LearningStates(StatesGroup):
 # Хранение активных сессий обучения
 active_sessions = {}
 
+# Виды таймеров сессии
+TIME_UP = "time_up"  # истекло время на задачу
+
 class LearningSession:
     """Класс для управления сессией обучения"""
     
+    __slots__ = (
+        "user_id", "level", "current_problem", "total_problems", "time_per_problem",
+        "start_time", "plan", "answers", "current_problem_start", "current_problem_code",
+        "current_correct_answer", "is_paused", "is_parked", "timeouts_in_row", "last_activity",
+        "chat_id", "message_id", "timer_kind", "deadline"
+    )
+    
     def __init__(self, user_id: int, level: int, problems_per_session: int = None, time_per_problem: int = None):
         self.user_id = user_id
         self.level = level
         self.current_problem = 0
-        self.correct_answers = 0
         self.total_problems = problems_per_session or Config.PROBLEMS_PER_LEVEL
-        self.time_per_problem = time_per_problem or Config.TIME_LIMIT_SECONDS
+        self.time_per_problem = time_per_problem or Config.DEFAULT_TIME_PER_PROBLEM
         self.start_time = time.time()
-        self.problems_data = []
+        # Все задачи, ответы и варианты готовим сразу, а не между ответом и следующей задачей
+        self.plan = build_session_plan(level, self.total_problems, self.time_per_problem)
+        self.answers = AnswerLog()
         self.current_problem_start = None
+        self.current_problem_code = 0
+        self.current_correct_answer = None
         self.is_paused = False
-        self.timer_task = None  # Для хранения задачи таймера
+        self.is_parked = False  # пользователь пропал: таймеры остановлены до "Продолжить"
+        self.timeouts_in_row = 0  # истечений времени подряд
+        self.last_activity = self.start_time  # время последнего действия пользователя
+        self.chat_id = None  # сообщение с текущей задачей
+        self.message_id = None
+        self.timer_kind = None  # взведенный таймер и время его срабатывания
+        self.deadline = None
+    
+    @classmethod
+    def from_snapshot(cls, snapshot: dict) -> "LearningSession":
+        """Восстановить сессию из снимка (см. snapshot)"""
+        session = cls.__new__(cls)
+        for name in SNAPSHOT_FIELDS:
+            setattr(session, name, snapshot[name])
+        session.start_time = snapshot["started_at"]
+        session.current_problem_start = snapshot["problem_started_at"]
+        session.plan = SessionPlan.load(snapshot["plan"], session.time_per_problem)
+        session.answers = AnswerLog.load(snapshot["answers"])
+        session.is_paused = False
+        return session
+    
+    def snapshot(self) -> dict:
+        """Состояние сессии для записи в session_snapshots"""
+        snapshot = {name: getattr(self, name) for name in SNAPSHOT_FIELDS}
+        snapshot.update(
+            started_at=self.start_time,
+            problem_started_at=self.current_problem_start,
+            plan=self.plan.dump(),
+            answers=self.answers.dump()
+        )
+        return snapshot
+    
+    @property
+    def correct_answers(self) -> int:
+        """Количество правильных ответов"""
+        return self.answers.correct
         
-    def next_problem(self):
-        """Переход к следующей задаче"""
+    def next_problem(self) -> tuple:
+        """Переход к следующей задаче плана. Возвращает (текст, варианты ответа)"""
+        code, answer, text, options = self.plan.next()
         self.current_problem += 1
+        self.current_problem_code = code
+        self.current_correct_answer = answer
         self.current_problem_start = time.time()
+        return text, options
         
-    def add_answer(self, user_answer: int, correct_answer: int, time_taken: float, problem_text: str = ""):
-        """Добавление ответа"""
-        is_correct = user_answer == correct_answer
-        if is_correct:
-            self.correct_answers += 1
-            
-        self.problems_data.append({
-            'problem_text': problem_text,
-            'user_answer': user_answer,
-            'correct_answer': correct_answer,
-            'is_correct': is_correct,
-            'time_taken': time_taken
-        })
+    def add_answer(self, user_answer: int, time_taken: float) -> bool:
+        """Добавление ответа на текущую задачу. Возвращает True, если он правильный"""
+        self.timeouts_in_row = 0
+        self.last_activity = time.time()
+        return self.answers.add(
+            self.current_problem_code, user_answer, self.current_correct_answer, time_taken
+        )
+    
+    def add_timeout(self, time_taken: float):
+        """Время на текущую задачу истекло"""
+        self.timeouts_in_row += 1
+        self.answers.add(
+            self.current_problem_code, TIMEOUT_ANSWER, self.current_correct_answer, time_taken,
+            timed_out=True
+        )
         
     def get_total_time(self):
         """Получение общего времени сессии"""
@@ -67,23 +128,138 @@ class LearningSession:
     
     def cancel_timer(self):
         """Отмена таймера"""
-        if self.timer_task and not self.timer_task.done():
-            self.timer_task.cancel()
-            self.timer_task = None
+        timers.cancel(self.user_id)
+        self.timer_kind = None
+        self.deadline = None
 
-async def start_timer(session: LearningSession, message: Message):
-    """Запуск таймера для задачи"""
-    try:
-        await asyncio.sleep(session.time_per_problem)
+# Поля сессии, которые попадают в снимок как есть
+SNAPSHOT_FIELDS = (
+    "user_id", "chat_id", "message_id", "level", "total_problems", "time_per_problem",
+    "current_problem", "current_problem_code", "current_correct_answer", "last_activity",
+    "timer_kind", "deadline", "is_parked", "timeouts_in_row"
+)
+
+async def on_timers(batch: list):
+    """Обработать пачку сработавших таймеров сессий"""
+    results = await asyncio.gather(
+        *(on_timer(user_id, *payload) for user_id, payload in batch),
+        return_exceptions=True
+    )
+    for (user_id, _), result in zip(batch, results):
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка в таймере для пользователя {user_id}: {result}")
+
+async def on_timer(user_id: int, kind: str, session: LearningSession, message: Message):
+    """Сработавший таймер одной сессии"""
+    # Таймер встает в очередь чата наравне с обновлениями пользователя
+    async with chat_order.hold(message.chat.id):
+        # Пока ждали очереди, пользователь мог ответить: сессия завершена или таймер взведен заново
+        if active_sessions.get(user_id) is not session or session.timer_kind != kind or user_id in timers:
+            return
         
-        # Проверяем, что сессия все еще активна
-        if session.user_id in active_sessions and active_sessions[session.user_id] == session:
-            await handle_time_up(session.user_id, message, session)
-    except asyncio.CancelledError:
-        # Таймер был отменен - это нормально
-        pass
+        try:
+            await handle_time_up(user_id, message, session)
+        except TelegramForbiddenError:
+            # Бот заблокирован: писать некуда, сессию дочистит вытеснение
+            await park_session(session, message, notify=False)
+
+# Таймеры всех активных сессий: одна фоновая задача вместо задачи на каждую задачу
+timers = DeadlineScheduler(on_timers)
+
+def remember_session(session: LearningSession):
+    """Записать текущее состояние сессии в снимок (если снимки включены)"""
+    if db.snapshots:
+        db.snapshots.save(session.snapshot())
+
+def forget_session(session: LearningSession):
+    """Остановить таймер сессии и удалить её снимок"""
+    session.cancel_timer()
+    if db.snapshots:
+        db.snapshots.delete(session.user_id)
+
+def arm_timer(session: LearningSession, kind: str, delay: float, message: Message):
+    """Взвести таймер сессии и запомнить её состояние"""
+    session.timer_kind = kind
+    session.deadline = time.time() + delay
+    session.chat_id = message.chat.id
+    session.message_id = message.message_id
+    timers.schedule(session.user_id, delay, (kind, session, message))
+    remember_session(session)
+
+# Вытеснение сессий, в которых пользователь давно не отвечал
+reaper = SessionReaper(
+    active_sessions,
+    idle_timeout=Config.SESSION_IDLE_TIMEOUT,
+    interval=Config.SESSION_REAPER_INTERVAL,
+    on_evict=forget_session
+)
+
+async def restore_sessions(bot, storage: BaseStorage, shard: int = 0, shards: int = 1) -> int:
+    """Восстановить незавершенные сессии из снимков после перезапуска бота (только своего шарда)"""
+    if not db.snapshots:
+        return 0
+    
+    now = time.time()
+    restored = 0
+    for snapshot in await db.snapshots.load_all(shard, shards):
+        user_id = snapshot["user_id"]
+        if now - snapshot["last_activity"] > Config.SESSION_IDLE_TIMEOUT:
+            db.snapshots.delete(user_id)  # брошена еще до остановки
+            continue
+        
+        session = LearningSession.from_snapshot(snapshot)
+        active_sessions[user_id] = session
+        
+        # Сообщение с задачей восстанавливаем по идентификаторам - этого достаточно для edit_text
+        message = Message(
+            message_id=session.message_id,
+            date=datetime.now(),
+            chat=Chat(id=session.chat_id, type="private")
+        ).as_(bot)
+        
+        state = FSMContext(storage, StorageKey(bot_id=bot.id, chat_id=session.chat_id, user_id=user_id))
+        if await state.get_state() is None:
+            await state.set_state(LearningStates.solving_problem)
+        
+        # Таймер - на оставшееся время (просроченный сработает сразу)
+        if session.timer_kind:
+            timers.schedule(
+                user_id, max(0.0, session.deadline - now), (session.timer_kind, session, message)
+            )
+        restored += 1
+    
+    if restored:
+        logger.info(f"Восстановлено незавершенных сессий: {restored}")
+    return restored
+
+async def park_session(session: LearningSession, message: Message, notify: bool = True):
+    """Остановить автоматическую смену задач, пока пользователь не вернется"""
+    session.cancel_timer()
+    if session.is_parked or active_sessions.get(session.user_id) is not session:
+        return
+    session.is_parked = True
+    reaper.parked += 1
+    remember_session(session)
+    if not notify:
+        reaper.blocked += 1
+        logger.info(f"Сессия пользователя {session.user_id} припаркована: бот заблокирован")
+        return
+    
+    logger.info(f"Сессия пользователя {session.user_id} припаркована после "
+                f"{session.timeouts_in_row} истечений времени подряд")
+    # Одно сообщение вместо продолжения показа задач в пустоту
+    try:
+        await message.edit_text(
+            f"⏰ <b>Время истекло!</b>\n\n"
+            f"Правильный ответ: <b>{session.current_correct_answer}</b>\n\n"
+            f"😴 Похоже, ты отвлекся. Продолжим?",
+            reply_markup=get_resume_keyboard(),
+            parse_mode="HTML"
+        )
+    except TelegramForbiddenError:
+        reaper.blocked += 1
     except Exception as e:
-        logger.error(f"Ошибка в таймере для пользователя {session.user_id}: {e}")
+        logger.warning(f"Не удалось обновить сообщение: {e}")
 
 async def handle_time_up(user_id: int, message: Message, session: LearningSession):
     """Обработка истечения времени на задачу"""
@@ -92,104 +268,36 @@ async def handle_time_up(user_id: int, message: Message, session: LearningSessio
     
     # Записываем неправильный ответ (время истекло)
     time_taken = time.time() - session.current_problem_start if session.current_problem_start else session.time_per_problem
-    session.add_answer(-1, session.current_correct_answer, time_taken, session.current_problem_text)
+    session.add_timeout(time_taken)
     
     # Проверяем завершение сессии
     if session.is_completed():
         logger.info(f"Сессия завершена для пользователя {user_id} (время истекло)")
         
         # Завершаем сессию (без состояния)
-        await finish_learning_session_simple(message, session, False, session.current_correct_answer)
+        await finish_learning_session(message, session, None, False, session.current_correct_answer)
+    elif Config.ABANDON_AFTER_TIMEOUTS and session.timeouts_in_row >= Config.ABANDON_AFTER_TIMEOUTS:
+        await park_session(session, message)
     else:
-        # Показываем результат
-        try:
-            await message.edit_text(
-                f"⏰ <b>Время истекло!</b>\n\n"
-                f"Правильный ответ: <b>{session.current_correct_answer}</b>",
-                parse_mode="HTML"
-            )
-            await asyncio.sleep(2)  # Показываем результат 2 секунды
-        except Exception as e:
-            logger.warning(f"Не удалось обновить сообщение: {e}")
-        
-        # Отправляем следующую задачу
-        await send_next_problem(message, session, edit_message=True)
-
-async def finish_learning_session_simple(message: Message, session: LearningSession, 
-                                          last_answer_correct: bool = None, last_correct_answer: int = None):
-    """Упрощенное завершение сессии обучения (без FSMContext)"""
-    user_id = session.user_id
-    logger.info(f"Упрощенное завершение сессии для пользователя {user_id}")
-    
-    # Подготавливаем результаты
-    total_time = session.get_total_time()
-    accuracy = (session.correct_answers / session.total_problems) * 100
-    
-    # Сохраняем результаты в базу данных
-    success = await db.save_learning_session(
-        telegram_id=user_id,
-        level=session.level,
-        problems_data=session.problems_data,
-        total_time=total_time
-    )
-    
-    if success:
-        logger.info(f"Сессия сохранена в БД для пользователя {user_id}")
-        
-        # Проверяем новые достижения
-        new_achievements = await db.check_achievements(user_id)
-        
-        # Уведомляем о новых достижениях
-        if new_achievements:
-            from utils.formatters import format_achievement_earned
-            for achievement in new_achievements:
-                achievement_text = format_achievement_earned(
-                    achievement.name,
-                    achievement.description,
-                    achievement.icon
-                )
-                await message.answer(achievement_text, parse_mode="HTML")
-    
-    # Отменяем таймер и удаляем сессию из активных
-    if user_id in active_sessions:
-        session.cancel_timer()
-        del active_sessions[user_id]
-    
-    # Форматируем результат
-    from utils.formatters import format_session_result
-    result_text = format_session_result(
-        session.correct_answers,
-        session.total_problems,
-        total_time,
-        session.level,
-        last_answer_correct,
-        last_correct_answer
-    )
-    
-    # Отправляем результаты
-    from keyboards.main_keyboard import get_session_results_keyboard
-    await message.answer(
-        result_text,
-        reply_markup=get_session_results_keyboard(),
-        parse_mode="HTML"
-    )
-    
-    logger.info(f"Пользователь {user_id} завершил сессию. Результат: {session.correct_answers}/{session.total_problems}")
+        # Правильный ответ и следующая задача - одной правкой сообщения
+        await send_next_problem(
+            message, session, edit_message=True,
+            header=f"⏰ <b>Время истекло!</b>\nПравильный ответ: <b>{session.current_correct_answer}</b>"
+        )
 
 async def start_learning_session(callback: CallbackQuery, state: FSMContext, level: int):
     """Начало сессии обучения"""
     user_id = callback.from_user.id
     
-    # Получаем настройки пользователя
-    from database.database import db
-    user_settings = await db.get_user_settings(user_id)
+    # Получаем настройки пользователя из профиля
+    profile = await db.get_profile(user_id)
     
     # Создаем новую сессию с пользовательскими настройками
     session = LearningSession(
         user_id, 
         level,
-        problems_per_session=user_settings.get("problems_per_session"),
-        time_per_problem=user_settings.get("time_per_problem")
+        problems_per_session=profile.get("problems_per_session", Config.DEFAULT_PROBLEMS_PER_SESSION),
+        time_per_problem=profile.get("time_per_problem", Config.DEFAULT_TIME_PER_PROBLEM)
     )
     active_sessions[user_id] = session
     
@@ -203,30 +311,22 @@ async def start_learning_session(callback: CallbackQuery, state: FSMContext, lev
     await callback.answer("🎯 Сессия обучения начата!")
     logger.info(f"Пользователь {user_id} начал сессию на уровне {level}")
 
-async def send_next_problem(message: Message, session: LearningSession, edit_message: bool = False):
-    """Отправка следующей задачи"""
+async def send_next_problem(message: Message, session: LearningSession, edit_message: bool = False,
+                            header: str = None):
+    """
+    Отправка следующей задачи
+    
+    header - итог предыдущей задачи ("Время истекло", результат своего ответа):
+    он показывается над задачей в том же сообщении, а не отдельным запросом.
+    """
     # Отменяем предыдущий таймер
     session.cancel_timer()
     
-    session.next_problem()
-    
-    # Генерируем задачу
-    problem_text, correct_answer = math_generator.generate_problem(session.level)
-    
-    # Сохраняем правильный ответ и текст задачи в сессии
-    session.current_correct_answer = correct_answer
-    session.current_problem_text = problem_text
-    
-    # Форматируем сообщение
-    formatted_problem = format_problem(
-        problem_text,
-        session.current_problem,
-        session.total_problems,
-        session.time_per_problem
-    )
-    
-    # Создаем клавиатуру с вариантами ответов
-    answer_keyboard = get_answer_keyboard(correct_answer)
+    # Берем готовую задачу из плана сессии
+    formatted_problem, options = session.next_problem()
+    if header:
+        formatted_problem = f"{header}\n{formatted_problem}"  # текст задачи начинается с пустой строки
+    answer_keyboard = get_answer_keyboard(session.current_correct_answer, options, session.current_problem)
     
     if edit_message:
         await message.edit_text(
@@ -235,16 +335,15 @@ async def send_next_problem(message: Message, session: LearningSession, edit_mes
             parse_mode="HTML"
         )
     else:
-        await message.answer(
+        # Дальше задача редактируется в новом сообщении, а не в сообщении пользователя
+        message = await message.answer(
             formatted_problem,
             reply_markup=answer_keyboard,
             parse_mode="HTML"
         )
     
     # Запускаем таймер для автоматического перехода к следующей задаче
-    session.timer_task = asyncio.create_task(
-        start_timer(session, message)
-    )
+    arm_timer(session, TIME_UP, session.time_per_problem, message)
 
 @router.callback_query(F.data.startswith("answer_"), LearningStates.solving_problem)
 async def process_answer(callback: CallbackQuery, state: FSMContext):
@@ -257,24 +356,29 @@ async def process_answer(callback: CallbackQuery, state: FSMContext):
     
     session = active_sessions[user_id]
     
-    # Отменяем таймер, так как пользователь ответил
-    session.cancel_timer()
-    
-    # Получаем ответ пользователя
+    # Получаем ответ пользователя и номер задачи, к которой относится кнопка
+    # (у кнопок, отправленных до появления номера, его нет)
+    parts = callback.data.split("_")
     try:
-        user_answer = int(callback.data.split("_")[1])
+        user_answer = int(parts[1])
+        problem_number = int(parts[2]) if len(parts) > 2 else session.current_problem
     except ValueError:
         await callback.answer("❌ Неверный ответ")
         return
     
+    # Повторное нажатие: задача уже решена или сменилась, пока нажатие ждало в очереди чата
+    if problem_number != session.current_problem or len(session.answers) >= session.current_problem:
+        await callback.answer()
+        return
+    
+    # Отменяем таймер, так как пользователь ответил
+    session.cancel_timer()
+    
     # Вычисляем время решения
     time_taken = time.time() - session.current_problem_start if session.current_problem_start else 0
     
-    # Добавляем ответ в сессию
-    session.add_answer(user_answer, session.current_correct_answer, time_taken)
-    
-    # Проверяем правильность ответа
-    is_correct = user_answer == session.current_correct_answer
+    # Добавляем ответ в сессию и проверяем его правильность
+    is_correct = session.add_answer(user_answer, time_taken)
     
     # Проверяем завершение сессии
     if session.is_completed():
@@ -349,11 +453,8 @@ async def process_custom_answer(message: Message, state: FSMContext):
     # Вычисляем время решения
     time_taken = time.time() - session.current_problem_start if session.current_problem_start else 0
     
-    # Добавляем ответ в сессию
-    session.add_answer(user_answer, session.current_correct_answer, time_taken)
-    
-    # Проверяем правильность ответа
-    is_correct = user_answer == session.current_correct_answer
+    # Добавляем ответ в сессию и проверяем его правильность
+    is_correct = session.add_answer(user_answer, time_taken)
     
     # Возвращаемся к состоянию решения задач
     await state.set_state(LearningStates.solving_problem)
@@ -368,60 +469,58 @@ async def process_custom_answer(message: Message, state: FSMContext):
     if session.is_completed():
         await finish_learning_session(message, session, state, is_correct, session.current_correct_answer)
     else:
-        # Отправляем уведомление и следующую задачу
-        await message.answer(result_text, parse_mode="HTML")
-        await send_next_problem(message, session)
+        # Результат и следующая задача - одним сообщением
+        await send_next_problem(message, session, header=result_text)
 
-async def finish_learning_session(message: Message, session: LearningSession, state: FSMContext, 
+async def finish_learning_session(message: Message, session: LearningSession, state: FSMContext = None,
                                   last_answer_correct: bool = None, last_correct_answer: int = None):
-    """Завершение сессии обучения"""
+    """
+    Завершение сессии обучения
+    
+    Вызывается и из обработчиков (со state), и по таймеру (без FSMContext).
+    Сохранение, очки, достижения и место в рейтинге считает db.finalize_session.
+    """
     user_id = session.user_id
-    logger.info(f"Функция finish_learning_session вызвана для пользователя {user_id}")
     
-    # Подготавливаем результаты
+    # Отменяем таймер, удаляем снимок и сессию из активных
+    forget_session(session)
+    if active_sessions.get(user_id) is session:
+        del active_sessions[user_id]
+    
     total_time = session.get_total_time()
     accuracy = (session.correct_answers / session.total_problems) * 100
-    logger.info(f"Подготовлены результаты: время={total_time:.1f}с, точность={accuracy:.1f}%")
     
     # Сохраняем результаты в базу данных
-    success = await db.save_learning_session(
+    result = await db.finalize_session(
         telegram_id=user_id,
         level=session.level,
-        problems_data=session.problems_data,
+        answers=session.answers,
         total_time=total_time
     )
     
-    if success:
-        logger.info(f"Сессия сохранена в БД для пользователя {user_id}")
-        
-        # Проверяем новые достижения
-        new_achievements = await db.check_achievements(user_id)
-        
+    if result:
         # Уведомляем о новых достижениях
-        if new_achievements:
-            from utils.formatters import format_achievement_earned
-            for achievement in new_achievements:
-                achievement_text = format_achievement_earned(
-                    achievement.name,
-                    achievement.description,
-                    achievement.icon
-                )
-                await message.answer(achievement_text, parse_mode="HTML")
+        for achievement in result.new_achievements:
+            achievement_text = format_achievement_earned(
+                achievement.name,
+                achievement.description,
+                achievement.icon
+            )
+            await message.answer(achievement_text, parse_mode="HTML")
     else:
         logger.error(f"Ошибка сохранения сессии для пользователя {user_id}")
     
-    # Отменяем таймер и удаляем сессию из активных
-    if user_id in active_sessions:
-        session.cancel_timer()
-        del active_sessions[user_id]
-    
-    # Сохраняем информацию о завершенной сессии в состоянии для кнопок
     session_successful = accuracy >= 80
-    await state.set_data({
-        "last_completed_level": session.level,
-        "last_session_successful": session_successful,
-        "last_session_accuracy": accuracy
-    })
+    if state is not None:
+        # Сохраняем информацию о завершенной сессии в состоянии для кнопок
+        await state.set_data({
+            "last_completed_level": session.level,
+            "last_session_successful": session_successful,
+            "last_session_accuracy": accuracy
+        })
+        results_keyboard = get_session_results_keyboard(session_successful, session.level >= Config.MAX_LEVEL)
+    else:
+        results_keyboard = get_session_results_keyboard()
     
     # Форматируем результат
     result_text = format_session_result(
@@ -430,17 +529,15 @@ async def finish_learning_session(message: Message, session: LearningSession, st
         total_time,
         session.level,
         last_answer_correct,
-        last_correct_answer
+        last_correct_answer,
+        score_gained=result.score_gained if result else None,
+        position=result.position if result else None,
+        total_users=result.total_users if result else 0
     )
     
-    # Отправляем результаты
-    logger.info(f"Отправляем итоги сессии для пользователя {user_id}")
-    from config import Config
-    is_max_level = session.level >= Config.MAX_LEVEL
-    
     await message.answer(
         result_text,
-        reply_markup=get_session_results_keyboard(session_successful, is_max_level),
+        reply_markup=results_keyboard,
         parse_mode="HTML"
     )
     
@@ -452,10 +549,7 @@ async def stop_learning(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     
     if user_id in active_sessions:
-        session = active_sessions[user_id]
-        # Отменяем таймер перед завершением
-        session.cancel_timer()
-        await finish_learning_session(callback.message, session, state)
+        await finish_learning_session(callback.message, active_sessions[user_id], state)
     else:
         await state.clear()
         await callback.message.edit_text(
@@ -466,6 +560,31 @@ async def stop_learning(callback: CallbackQuery, state: FSMContext):
     
     await callback.answer("Обучение остановлено")
 
+@router.callback_query(F.data == "resume_session")
+async def resume_session(callback: CallbackQuery, state: FSMContext):
+    """Продолжить припаркованную сессию"""
+    user_id = callback.from_user.id
+    session = active_sessions.get(user_id)
+    
+    if not session or not session.is_parked:
+        # Сессию уже вытеснили из памяти
+        await state.clear()
+        await callback.message.edit_text(
+            "⌛ <b>Сессия завершена из-за долгого отсутствия</b>\n\n"
+            "Начни новую, когда будешь готов!",
+            parse_mode="HTML"
+        )
+        await callback.answer()
+        return
+    
+    session.is_parked = False
+    session.timeouts_in_row = 0
+    session.last_activity = time.time()
+    reaper.resumed += 1
+    
+    await send_next_problem(callback.message, session, edit_message=True)
+    await callback.answer("▶️ Продолжаем!")
+
 @router.callback_query(F.data == "pause_learning")
 async def pause_learning(callback: CallbackQuery):
     """Пауза в обучении"""
@@ -503,9 +622,9 @@ async def next_level(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     last_completed_level = data.get("last_completed_level", 1)
     
-    # Получаем текущий доступный уровень пользователя из базы данных
-    user_stats = await db.get_user_stats(user_id)
-    current_available_level = user_stats.get("level", 1) if user_stats else 1
+    # Получаем текущий доступный уровень пользователя из профиля
+    profile = await db.get_profile(user_id)
+    current_available_level = profile.get("level", 1) if profile else 1
     
     # Проверяем, можем ли мы перейти на следующий уровень
     # Следующий уровень доступен только если он не превышает текущий доступный уровень
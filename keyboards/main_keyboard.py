@@ -1,6 +1,12 @@
+import random
+from typing import Sequence
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 
+# Строка "ввести свой ответ" одинакова для всех задач
+CUSTOM_ANSWER_ROW = [InlineKeyboardButton(text="✏️ Ввести свой ответ", callback_data="custom_answer")]
+
 def get_main_menu() -> ReplyKeyboardMarkup:
     """Главное меню бота"""
     builder = ReplyKeyboardBuilder()
@@ -67,39 +73,45 @@ def get_learning_keyboard() -> InlineKeyboardMarkup:
     
     return builder.as_markup()
 
-def get_answer_keyboard(answer: int) -> InlineKeyboardMarkup:
-    """Клавиатура с вариантами ответов"""
+def get_resume_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура припаркованной сессии: продолжить или завершить"""
     builder = InlineKeyboardBuilder()
     
-    # Генерируем 4 варианта ответа: правильный + 3 неправильных
-    import random
-    answers = [answer]
-    
-    # Добавляем неправильные варианты
-    while len(answers) < 4:
-        wrong_answer = answer + random.randint(-10, 10)
-        if wrong_answer not in answers and wrong_answer >= 0:
-            answers.append(wrong_answer)
-    
-    # Перемешиваем варианты
-    random.shuffle(answers)
-    
-    # Создаем кнопки
-    for ans in answers:
-        builder.button(
-            text=str(ans),
-            callback_data=f"answer_{ans}"
-        )
-    
-    builder.adjust(2)  # 2 кнопки в ряд
-    
-    # Кнопка ввода своего ответа
     builder.row(
-        InlineKeyboardButton(text="✏️ Ввести свой ответ", callback_data="custom_answer")
+        InlineKeyboardButton(text="▶️ Продолжить", callback_data="resume_session"),
+        InlineKeyboardButton(text="❌ Завершить", callback_data="stop_learning")
     )
     
     return builder.as_markup()
 
+def get_answer_options(answer: int) -> tuple:
+    """4 варианта ответа в случайном порядке: правильный + 3 неправильных в пределах ±10"""
+    # Отрицательные варианты предлагаем, только если отрицателен сам ответ
+    wrong_answers = [
+        value for value in range(answer - 10, answer + 11)
+        if value != answer and (value >= 0 or answer < 0)
+    ]
+    options = random.sample(wrong_answers, 3)
+    options.insert(random.randrange(4), answer)
+    return tuple(options)
+
+def get_answer_keyboard(answer: int, options: Sequence[int] = None, problem_number: int = 0) -> InlineKeyboardMarkup:
+    """Клавиатура с вариантами ответов
+    
+    Номер задачи попадает в callback_data, чтобы повторное нажатие на кнопку
+    уже решенной задачи не засчиталось ответом на следующую.
+    """
+    if options is None:
+        options = get_answer_options(answer)
+    
+    # Разметка собирается напрямую, без InlineKeyboardBuilder: она строится на каждую задачу
+    buttons = [
+        InlineKeyboardButton(text=str(option), callback_data=f"answer_{option}_{problem_number}")
+        for option in options
+    ]
+    
+    return InlineKeyboardMarkup(inline_keyboard=[buttons[:2], buttons[2:], CUSTOM_ANSWER_ROW])
+
 def get_session_results_keyboard(session_successful: bool = True, is_max_level: bool = False) -> InlineKeyboardMarkup:
     """Клавиатура результатов сессии"""
     builder = InlineKeyboardBuilder()
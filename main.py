@@ -1,12 +1,21 @@
 import asyncio
 import logging
+import os
+import signal
 import sys
+import time
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
+from aiogram.filters import ExceptionTypeFilter
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import Config
 from database.database import db
+from database.fsm_storage import SQLiteStorage
+from middlewares.chat_order import ChatQueueFull, chat_order, on_queue_full
+from middlewares.outbound import outbound
+from utils.webhook_server import WebhookServer
+from utils.supervisor import Supervisor, serve_shard
 from handlers import basic_handlers, learning_handlers, media_handlers
 
 # Настройка логирования
@@ -23,60 +32,231 @@ logger = logging.getLogger(__name__)
 bot = None
 dp = None
 
-async def main():
-    """Главная функция запуска бота"""
+def create_bot() -> Bot:
+    """Бот с планировщиком исходящих запросов"""
+    bot = Bot(
+        token=Config.BOT_TOKEN,
+        parse_mode=ParseMode.HTML
+    )
+    if Config.OUTBOUND_ENABLED:
+        # Все запросы к Bot API проходят через ограничение частоты с приоритетами
+        bot.session.middleware(outbound)
+    return bot
+
+def include_routers(dispatcher: Dispatcher):
+    """Подключить роутеры обработчиков"""
+    dispatcher.include_router(basic_handlers.router)
+    dispatcher.include_router(learning_handlers.router)
+    dispatcher.include_router(media_handlers.router)
+
+async def start_bot(shard: int = 0, shards: int = 1) -> bool:
+    """
+    Запуск бота без приема обновлений: БД, бот, диспетчер, сессии
+    
+    Общий для одного процесса (shards=1) и для обработчика шарда.
+    """
+    phases = {}  # длительность этапов запуска
+    started = time.perf_counter()
     try:
         # Проверяем конфигурацию
         Config.validate()
         logger.info("Конфигурация валидна")
     except ValueError as e:
         logger.error(f"Ошибка конфигурации: {e}")
-        return
+        return False
+    phases["конфигурация"] = time.perf_counter() - started
     
     # Инициализируем базу данных
+    phase_started = time.perf_counter()
     try:
         await db.init_db()
+        if Config.WRITE_BEHIND_ENABLED:
+            await db.start_write_behind()
+        if Config.ARCHIVE_ENABLED and shard == 0:
+            db.start_archiver()  # архивирует таблицу целиком - достаточно одного процесса
+        if Config.SESSION_SNAPSHOTS_ENABLED:
+            db.start_snapshots()
+        if shards > 1:
+            # Очки пользователей других шардов меняют другие процессы
+            db.start_leaderboard_refresh(Config.LEADERBOARD_REFRESH_INTERVAL)
         logger.info("База данных инициализирована")
     except Exception as e:
         logger.error(f"Ошибка инициализации базы данных: {e}")
-        return
+        return False
+    phases["база данных"] = time.perf_counter() - phase_started
     
     # Создаем бота и диспетчер
     global bot, dp
-    bot = Bot(
-        token=Config.BOT_TOKEN,
-        parse_mode=ParseMode.HTML
-    )
+    bot = create_bot()
+    if shards > 1:
+        # Общий лимит Telegram делится между процессами
+        outbound.set_global_rate(Config.OUTBOUND_GLOBAL_RATE / shards)
     
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    if Config.FSM_STORAGE == "sqlite":
+        storage = SQLiteStorage(
+            db,
+            cache_size=Config.FSM_CACHE_SIZE,
+            ttl_hours=Config.FSM_TTL_HOURS,
+            flush_interval_ms=Config.FSM_FLUSH_INTERVAL_MS
+        )
+        storage.start()
+    else:
+        storage = MemoryStorage()
+    # Обновления одного чата - по очереди (блокировка берется до чтения состояния FSM),
+    # разных чатов - параллельно
+    dp = Dispatcher(storage=storage, events_isolation=chat_order)
+    dp.errors.register(on_queue_full, ExceptionTypeFilter(ChatQueueFull))
     
     # Регистрируем роутеры
-    dp.include_router(basic_handlers.router)
-    dp.include_router(learning_handlers.router)
-    dp.include_router(media_handlers.router)
+    phase_started = time.perf_counter()
+    include_routers(dp)
+    if shards > 1:
+        dp["shard"] = (shard, shards)  # для /metrics
     
+    phases["роутеры"] = time.perf_counter() - phase_started
     logger.info("Роутеры зарегистрированы")
     
+    # Периодическое вытеснение брошенных сессий
+    learning_handlers.reaper.start()
+    
     # Информация о боте
+    phase_started = time.perf_counter()
     bot_info = await bot.get_me()
+    phases["get_me"] = time.perf_counter() - phase_started
     logger.info(f"Бот запущен: @{bot_info.username}")
+    
+    # Продолжаем сессии, прерванные перезапуском
+    phase_started = time.perf_counter()
+    await learning_handlers.restore_sessions(bot, dp.storage, shard, shards)
+    phases["сессии"] = time.perf_counter() - phase_started
+    logger.info(f"Запуск занял {(time.perf_counter() - started) * 1000:.0f} мс: " + ", ".join(
+        f"{name} {duration * 1000:.0f} мс" for name, duration in phases.items()
+    ))
     logger.info("Бот ментальной арифметики готов к работе!")
+    return True
+
+async def stop_bot():
+    """Остановить фоновые задачи и закрыть соединения"""
+    await learning_handlers.reaper.stop()
+    await learning_handlers.timers.stop()
+    await outbound.stop()
+    await bot.session.close()
+    await dp.storage.close()
+    await db.close()
+    logger.info("Бот остановлен")
+
+async def main():
+    """Главная функция запуска бота"""
+    if Config.WORKERS > 1:
+        await run_supervisor()
+        return
+    if not await start_bot():
+        return
     
+    webhook = None
     try:
-        # Запускаем поллинг
-        await dp.start_polling(bot)
+        if Config.BOT_MODE == "webhook":
+            # Обновления приходят HTTP-запросами и обрабатываются из ограниченной очереди
+            webhook = WebhookServer(
+                dp, bot,
+                path=Config.WEBHOOK_PATH,
+                secret=Config.WEBHOOK_SECRET,
+                queue_size=Config.WEBHOOK_QUEUE_SIZE,
+                workers=Config.WEBHOOK_WORKERS
+            )
+            dp["webhook_server"] = webhook  # для /metrics
+            await dp.emit_startup(bot=bot, dispatcher=dp)
+            await webhook.start(
+                Config.WEBHOOK_HOST, Config.WEBHOOK_PORT,
+                url=Config.WEBHOOK_URL, max_connections=Config.WEBHOOK_MAX_CONNECTIONS
+            )
+            await webhook.serve_forever()
+        else:
+            # Запускаем поллинг
+            await dp.start_polling(bot)
     except KeyboardInterrupt:
         logger.info("Получен сигнал завершения")
     finally:
         # Закрываем соединения
-        await bot.session.close()
-        await db.close()
-        logger.info("Бот остановлен")
+        if webhook:
+            await webhook.stop()
+            await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await stop_bot()
+
+async def run_supervisor():
+    """Супервизор: принимает обновления и раздает их процессам-обработчикам по шардам"""
+    try:
+        Config.validate()
+    except ValueError as e:
+        logger.error(f"Ошибка конфигурации: {e}")
+        return
+    
+    # Миграции - один раз до запуска обработчиков
+    try:
+        await db.init_db()
+    except Exception as e:
+        logger.error(f"Ошибка инициализации базы данных: {e}")
+        return
+    await db.close()
+    
+    # Диспетчер нужен только для списка типов обновлений, которые обрабатывают роутеры
+    dispatcher = Dispatcher()
+    include_routers(dispatcher)
+    allowed_updates = dispatcher.resolve_used_update_types()
+    
+    front = Bot(token=Config.BOT_TOKEN)
+    supervisor = Supervisor(
+        front, Config.WORKERS,
+        command=[sys.executable, os.path.abspath(__file__), "worker"],
+        queue_size=Config.WORKER_QUEUE_SIZE,
+        path=Config.WEBHOOK_PATH,
+        secret=Config.WEBHOOK_SECRET
+    )
+    supervisor.start()
+    polling = None
+    try:
+        if Config.BOT_MODE == "webhook":
+            await supervisor.start_webhook(
+                Config.WEBHOOK_HOST, Config.WEBHOOK_PORT, url=Config.WEBHOOK_URL,
+                max_connections=Config.WEBHOOK_MAX_CONNECTIONS, allowed_updates=allowed_updates
+            )
+        else:
+            polling = asyncio.create_task(supervisor.poll(allowed_updates))
+        await supervisor.serve_forever()
+    finally:
+        if polling:
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+        await supervisor.stop()
+        await front.session.close()
+        logger.info(f"Супервизор остановлен: {supervisor.stats()}")
+
+async def run_worker(shard: int, shards: int):
+    """Обработчик шарда: обновления пользователей с telegram_id % shards == shard из stdin"""
+    # Ctrl+C и SIGTERM получает и супервизор; обработчик завершается, когда тот закроет stdin
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_IGN)
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(
+            f'%(asctime)s - шард {shard} - %(name)s - %(levelname)s - %(message)s'
+        ))
+    
+    if not await start_bot(shard, shards):
+        sys.exit(1)
+    try:
+        await dp.emit_startup(bot=bot, dispatcher=dp)
+        processed = await serve_shard(dp, bot, concurrency=Config.WORKER_CONCURRENCY)
+        logger.info(f"Обработано обновлений: {processed}")
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await stop_bot()
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if len(sys.argv) == 4 and sys.argv[1] == "worker":
+            asyncio.run(run_worker(int(sys.argv[2]), int(sys.argv[3])))
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
     except Exception as e:
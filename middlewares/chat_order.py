@@ -0,0 +1,133 @@
+"""Упорядоченная обработка обновлений внутри чата
+
+Обновления разных чатов обрабатываются параллельно, а обновления одного
+чата - строго по очереди в порядке поступления (asyncio.Lock отдает
+управление ожидающим по порядку). Так двойное нажатие кнопки не может
+дважды продвинуть одну и ту же сессию, и обработчикам не нужны свои
+блокировки.
+
+Очередь подключается к диспетчеру как events_isolation: FSMContextMiddleware
+aiogram берет блокировку до чтения состояния, поэтому фильтры по состоянию
+видят состояние после обработки предыдущего обновления чата. Очередь чата
+ограничена max_pending: лишнее обновление отбрасывается исключением
+ChatQueueFull (на нажатие кнопки при этом отвечаем, чтобы у пользователя не
+крутились часики). Очередь удаляется, как только в ней не остается обновлений.
+
+Этой же очередью пользуются таймеры сессий (hold), чтобы истечение времени
+не обрабатывалось одновременно с ответом пользователя.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import ErrorEvent
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class ChatQueueFull(Exception):
+    """В очереди чата уже max_pending обновлений - новое отброшено"""
+
+class _ChatQueue:
+    """Очередь одного чата: блокировка и число обновлений в ней (включая текущее)"""
+    
+    __slots__ = ("lock", "depth")
+    
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+class ChatEventIsolation(BaseEventIsolation):
+    """Изоляция событий aiogram: последовательная обработка в чате, параллельная между чатами"""
+    
+    def __init__(self, max_pending: int = 5):
+        self.max_pending = max_pending
+        self._queues: Dict[int, _ChatQueue] = {}
+        self.processed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.waits = 0  # сколько раз пришлось ждать своей очереди
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+    
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        """Очередь чата для обновления (вызывается FSMContextMiddleware до чтения состояния)"""
+        queue = self._queues.get(key.chat_id)
+        if queue is not None and queue.depth >= self.max_pending:
+            self.dropped += 1
+            raise ChatQueueFull(key.chat_id)
+        
+        async with self.hold(key.chat_id):
+            yield
+    
+    @asynccontextmanager
+    async def hold(self, key: int) -> AsyncGenerator[None, None]:
+        """Дождаться очереди чата и занять его на время блока"""
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _ChatQueue()
+        queue.depth += 1
+        if queue.depth > self.max_depth:
+            self.max_depth = queue.depth
+        
+        try:
+            if queue.lock.locked():
+                started = time.perf_counter()
+                await queue.lock.acquire()
+                waited = time.perf_counter() - started
+                self.waits += 1
+                self.wait_total += waited
+                if waited > self.wait_max:
+                    self.wait_max = waited
+            else:
+                await queue.lock.acquire()
+        except BaseException:
+            self._leave(key, queue)
+            raise
+        
+        try:
+            yield
+        finally:
+            queue.lock.release()
+            self.processed += 1
+            self._leave(key, queue)
+    
+    def _leave(self, key: int, queue: _ChatQueue):
+        queue.depth -= 1
+        if queue.depth == 0 and self._queues.get(key) is queue:
+            del self._queues[key]  # простаивающая очередь не занимает память
+    
+    async def close(self) -> None:
+        pass
+    
+    def stats(self) -> dict:
+        """Счетчики для метрик"""
+        return {
+            "chats": len(self._queues),
+            "queued": sum(queue.depth for queue in self._queues.values()),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "waits": self.waits,
+            "wait_avg_ms": round(self.wait_total / self.waits * 1000, 1) if self.waits else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 1)
+        }
+
+async def on_queue_full(event: ErrorEvent):
+    """Обработчик ChatQueueFull: ответить на отброшенное нажатие кнопки"""
+    logger.debug(f"Очередь чата {event.exception} заполнена, обновление {event.update.update_id} отброшено")
+    callback = event.update.callback_query
+    if callback:
+        try:
+            await callback.answer("⏳ Слишком много нажатий, подожди секунду")
+        except Exception as e:
+            logger.warning(f"Не удалось ответить на отброшенное нажатие: {e}")
+    return True
+
+# Общий экземпляр: передается диспетчеру в main.py и используется таймерами сессий
+chat_order = ChatEventIsolation(max_pending=Config.CHAT_QUEUE_MAX_PENDING)
@@ -0,0 +1,325 @@
+"""Планировщик исходящих запросов к Bot API
+
+Подключается к сессии бота как request middleware, поэтому через него
+проходят все вызовы обработчиков (message.answer, edit_text, answer_photo,
+answer_media_group) без изменения их кода. Запросы с chat_id проходят через
+ведра токенов: общее на бота, отдельное на каждый чат и более строгое для
+групп (лимиты Telegram: ~30 сообщений в секунду всего, ~1 в секунду в чат,
+20 в минуту в группу). Пока токенов хватает и никто не ждет, запрос уходит
+сразу; иначе встает в очередь чата. Очереди чатов сохраняют порядок
+сообщений, а между чатами первым получает токен запрос с более высоким
+приоритетом: ответ на нажатие (редактирование задачи) идет раньше обычных
+сообщений, а медиа - последними.
+
+На TelegramRetryAfter ведро чата блокируется на указанное время с
+нарастающей добавкой, и запрос повторяется через очередь (запрос без чата
+просто ждет).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    DeleteMessage, EditMessageReplyMarkup, EditMessageText, SendAnimation, SendDocument,
+    SendMediaGroup, SendPhoto, SendVideo, TelegramMethod
+)
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета: меньше - важнее
+INTERACTIVE, NORMAL, BULK = range(3)
+PRIORITY_NAMES = ("interactive", "normal", "bulk")
+
+_INTERACTIVE_METHODS = (EditMessageText, EditMessageReplyMarkup, DeleteMessage)
+_BULK_METHODS = (SendPhoto, SendVideo, SendAnimation, SendDocument, SendMediaGroup)
+
+LANE_SWEEP_INTERVAL = 60  # секунд между удалениями простаивающих очередей чатов
+
+def method_priority(method: TelegramMethod) -> int:
+    """Приоритет запроса по типу метода"""
+    if isinstance(method, _INTERACTIVE_METHODS):
+        return INTERACTIVE
+    if isinstance(method, _BULK_METHODS):
+        return BULK
+    return NORMAL
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас"""
+    
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, cost: float, now: float) -> float:
+        """Через сколько секунд можно взять cost токенов (0 - уже можно)"""
+        self._refill(now)
+        # Запрос дороже всего ведра ждет полного ведра и уходит в долг
+        missing = min(cost, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+    
+    def take(self, cost: float):
+        self.tokens -= cost
+    
+    def pause(self, seconds: float, now: float):
+        """Не выдавать токены seconds секунд (после RetryAfter от Telegram)"""
+        self._refill(now)
+        # Через seconds секунд в ведре снова будет один токен
+        self.tokens = min(self.tokens, 1.0) - seconds * self.rate
+    
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class _Waiter:
+    """Запрос, ждущий токенов"""
+    
+    __slots__ = ("priority", "seq", "cost", "future", "queued_at")
+    
+    def __init__(self, priority: int, seq: int, cost: float, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.cost = cost
+        self.future = future
+        self.queued_at = time.monotonic()
+
+class _Lane:
+    """Очередь одного чата: его ведро и ждущие запросы в порядке поступления"""
+    
+    __slots__ = ("bucket", "waiters")
+    
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.waiters = deque()
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Ограничение частоты исходящих запросов с приоритетами и повтором после RetryAfter"""
+    
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 5,
+                 group_rate: float = 20 / 60, group_burst: float = 5, max_retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._lanes: Dict[object, _Lane] = {}
+        self._ready: list = []  # куча (приоритет, номер, чат) первых запросов очередей с токенами
+        self._sleeping: list = []  # куча (время, чат) очередей, ждущих токенов своего ведра
+        self._counter = itertools.count()
+        self._waiting = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._swept_at = time.monotonic()
+        self.sent = 0
+        self.throttled = [0, 0, 0]  # запросов, ждавших в очереди, по приоритетам
+        self.wait_total = [0.0, 0.0, 0.0]
+        self.wait_max = [0.0, 0.0, 0.0]
+        self.retry_after = 0
+        self.failed = 0
+    
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        level = method_priority(method)
+        cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._acquire(chat_id, level, cost)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                # Telegram называет минимальное ожидание; при повторных отказах ждем дольше
+                pause = e.retry_after + min(2 ** attempt - 1, 30)
+                attempt += 1
+                logger.warning(f"RetryAfter для {type(method).__name__} в чате {chat_id}: "
+                               f"повтор {attempt}/{self.max_retries} через {pause} с")
+                if chat_id is None:
+                    await asyncio.sleep(pause)
+                else:
+                    self._lane(chat_id).bucket.pause(pause, time.monotonic())
+                continue
+            self.sent += 1
+            return response
+    
+    def set_global_rate(self, rate: float):
+        """Изменить общий лимит (в режиме шардов он делится между процессами)"""
+        self.global_bucket = TokenBucket(rate, rate)
+    
+    def _lane(self, chat_id) -> _Lane:
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            # Отрицательный id или @имя - группа или канал
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            lane = self._lanes[chat_id] = _Lane(bucket)
+        return lane
+    
+    async def _acquire(self, chat_id, level: int, cost: float):
+        """Дождаться токенов общего ведра и ведра чата"""
+        lane = self._lane(chat_id)
+        now = time.monotonic()
+        # Быстрый путь: никто не ждет и токены есть
+        if not self._waiting and not lane.bucket.wait_time(cost, now) \
+                and not self.global_bucket.wait_time(cost, now):
+            lane.bucket.take(cost)
+            self.global_bucket.take(cost)
+            return
+        
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._pump())
+        
+        waiter = _Waiter(level, next(self._counter), cost, asyncio.get_running_loop().create_future())
+        lane.waiters.append(waiter)
+        self._waiting += 1
+        if len(lane.waiters) == 1:
+            heapq.heappush(self._ready, (waiter.priority, waiter.seq, chat_id))
+        self._wakeup.set()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not waiter.future.done():
+                waiter.future.cancel()  # очередь пропустит отмененный запрос
+            raise
+        
+        waited = time.monotonic() - waiter.queued_at
+        self.throttled[level] += 1
+        self.wait_total[level] += waited
+        if waited > self.wait_max[level]:
+            self.wait_max[level] = waited
+    
+    def _push_head(self, chat_id, lane: _Lane):
+        """Поставить первый живой запрос очереди чата в кучу готовых"""
+        while lane.waiters and lane.waiters[0].future.done():
+            lane.waiters.popleft()  # отменен, пока ждал
+            self._waiting -= 1
+        if lane.waiters:
+            head = lane.waiters[0]
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+    
+    async def _pump(self):
+        """Выдавать токены ждущим запросам: по приоритету между чатами, по порядку внутри чата"""
+        while True:
+            now = time.monotonic()
+            while self._sleeping and self._sleeping[0][0] <= now:
+                _, chat_id = heapq.heappop(self._sleeping)
+                if chat_id in self._lanes:
+                    self._push_head(chat_id, self._lanes[chat_id])
+            if now - self._swept_at >= LANE_SWEEP_INTERVAL:
+                self._sweep(now)
+            
+            if not self._ready:
+                timeout = self._sleeping[0][0] - now if self._sleeping else LANE_SWEEP_INTERVAL
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            
+            _, _, chat_id = self._ready[0]
+            lane = self._lanes[chat_id]
+            waiter = lane.waiters[0]
+            if waiter.future.done():
+                heapq.heappop(self._ready)
+                self._push_head(chat_id, lane)
+                continue
+            
+            delay = lane.bucket.wait_time(waiter.cost, now)
+            if delay:
+                # Чат исчерпал свой лимит - не задерживаем остальные чаты
+                heapq.heappop(self._ready)
+                heapq.heappush(self._sleeping, (now + delay, chat_id))
+                continue
+            delay = self.global_bucket.wait_time(waiter.cost, now)
+            if delay:
+                # После паузы снова возьмем самый важный запрос - он мог прийти за это время
+                await asyncio.sleep(delay)
+                continue
+            
+            heapq.heappop(self._ready)
+            lane.waiters.popleft()
+            self._waiting -= 1
+            lane.bucket.take(waiter.cost)
+            self.global_bucket.take(waiter.cost)
+            waiter.future.set_result(None)
+            self._push_head(chat_id, lane)
+    
+    def _sweep(self, now: float):
+        """Удалить очереди чатов без запросов и с полным ведром (новое ведро ничем не отличается)"""
+        self._swept_at = now
+        idle = [chat_id for chat_id, lane in self._lanes.items() if not lane.waiters and lane.bucket.is_full(now)]
+        for chat_id in idle:
+            del self._lanes[chat_id]
+    
+    async def stop(self):
+        """Остановить выдачу токенов и отпустить ждущие запросы без ограничений"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for lane in self._lanes.values():
+            for waiter in lane.waiters:
+                if not waiter.future.done():
+                    waiter.future.set_result(None)
+            lane.waiters.clear()
+        self._ready.clear()
+        self._sleeping.clear()
+        self._waiting = 0
+    
+    def stats(self) -> dict:
+        """Счетчики для метрик"""
+        queued = [0, 0, 0]
+        for lane in self._lanes.values():
+            for waiter in lane.waiters:
+                if not waiter.future.done():
+                    queued[waiter.priority] += 1
+        return {
+            "chats": len(self._lanes),
+            "queued": dict(zip(PRIORITY_NAMES, queued)),
+            "sent": self.sent,
+            "throttled": dict(zip(PRIORITY_NAMES, self.throttled)),
+            "wait_avg_ms": {
+                name: round(total / count * 1000, 1) if count else 0.0
+                for name, total, count in zip(PRIORITY_NAMES, self.wait_total, self.throttled)
+            },
+            "wait_max_ms": {name: round(wait * 1000, 1) for name, wait in zip(PRIORITY_NAMES, self.wait_max)},
+            "retry_after": self.retry_after,
+            "failed": self.failed
+        }
+
+# Общий экземпляр: подключается к сессии бота в main.py
+outbound = OutboundScheduler(
+    global_rate=Config.OUTBOUND_GLOBAL_RATE,
+    chat_rate=Config.OUTBOUND_CHAT_RATE,
+    chat_burst=Config.OUTBOUND_CHAT_BURST,
+    group_rate=Config.OUTBOUND_GROUP_RATE_PER_MINUTE / 60,
+    group_burst=Config.OUTBOUND_GROUP_BURST,
+    max_retries=Config.OUTBOUND_MAX_RETRIES
+)
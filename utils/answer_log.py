@@ -0,0 +1,70 @@
+"""Компактный журнал ответов сессии
+
+Вместо списка словарей (по словарю на ответ) ответы хранятся в параллельных
+массивах array: код задачи, ответ пользователя, правильный ответ, признак
+правильности и время. Один ответ занимает 33 байта, а журнал сразу годится
+для пакетной вставки в БД и подсчета статистики.
+"""
+import struct
+from array import array
+from typing import Iterator, Tuple
+
+TIMEOUT_ANSWER = -1  # ответ, записываемый при истечении времени
+COLUMNS = ("codes", "answers", "expected", "flags", "times")
+
+class AnswerLog:
+    """Ответы одной сессии в параллельных массивах"""
+    
+    __slots__ = ("codes", "answers", "expected", "flags", "times", "correct")
+    
+    def __init__(self):
+        self.codes = array("q")  # коды задач (utils/problem_codec.py)
+        self.answers = array("q")  # ответы пользователя
+        self.expected = array("q")  # правильные ответы
+        self.flags = array("B")  # 1 - ответ правильный
+        self.times = array("d")  # время решения в секундах
+        self.correct = 0  # количество правильных ответов
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def add(self, problem_code: int, user_answer: int, correct_answer: int,
+            time_taken: float, timed_out: bool = False) -> bool:
+        """Записать ответ. Возвращает True, если он правильный"""
+        is_correct = not timed_out and user_answer == correct_answer
+        self.codes.append(problem_code)
+        self.answers.append(TIMEOUT_ANSWER if timed_out else user_answer)
+        self.expected.append(correct_answer)
+        self.flags.append(is_correct)
+        self.times.append(time_taken)
+        if is_correct:
+            self.correct += 1
+        return is_correct
+    
+    def results(self) -> Iterator[Tuple[int, float]]:
+        """Пары (правильно, время) в порядке ответов"""
+        return zip(self.flags, self.times)
+    
+    def rows(self) -> Iterator[Tuple[int, int, int, int, float]]:
+        """Кортежи (код, ответ, правильный ответ, правильно, время) в порядке ответов"""
+        return zip(self.codes, self.answers, self.expected, self.flags, self.times)
+    
+    def dump(self) -> bytes:
+        """Упаковать журнал в байты для снимка сессии (порядок байтов - как у машины)"""
+        return struct.pack("<I", len(self.codes)) + b"".join(
+            getattr(self, name).tobytes() for name in COLUMNS
+        )
+    
+    @classmethod
+    def load(cls, data: bytes) -> "AnswerLog":
+        """Восстановить журнал из результата dump()"""
+        log = cls()
+        count, = struct.unpack_from("<I", data)
+        offset = 4
+        for name in COLUMNS:
+            column = getattr(log, name)
+            size = count * column.itemsize
+            column.frombytes(data[offset:offset + size])
+            offset += size
+        log.correct = sum(log.flags)
+        return log
@@ -0,0 +1,166 @@
+"""Планировщик дедлайнов: одна фоновая задача на все таймеры
+
+Таймеры хранятся в куче по времени срабатывания. Постановка - O(log n),
+отмена - O(1): запись только помечается отмененной и выбрасывается, когда
+доходит до вершины кучи (или при уплотнении, если отмененных стало много).
+Фоновая задача спит до ближайшего дедлайна (один loop.call_at на весь
+планировщик) и отдает сработавшие таймеры пачкой в callback. Чтобы пачки
+были крупнее, будильник ставится на resolution позже дедлайна: таймер
+никогда не срабатывает раньше срока, но может опоздать на resolution.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Индексы полей записи кучи: [дедлайн, порядковый номер, ключ, данные, активна]
+_DEADLINE, _SEQ, _KEY, _PAYLOAD, _ACTIVE = range(5)
+
+class DeadlineScheduler:
+    """Таймеры по ключу: у каждого ключа не больше одного активного таймера"""
+    
+    def __init__(self, callback: Callable[[List[Tuple[Hashable, Any]]], Awaitable[None]],
+                 resolution: float = 0.05, max_batch: int = 1000):
+        """
+        Args:
+            callback: Корутина, получающая пачку сработавших таймеров [(ключ, данные), ...]
+            resolution: Допустимое опоздание (сек), за счет которого таймеры собираются в пачки
+            max_batch: Максимальный размер пачки
+        """
+        self.callback = callback
+        self.resolution = resolution
+        self.max_batch = max_batch
+        self._heap: list = []
+        self._entries: Dict[Hashable, list] = {}
+        self._counter = itertools.count()
+        self._cancelled = 0  # отмененных записей, еще лежащих в куче
+        self._wakeup: Optional[asyncio.Event] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries = set()
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.batches = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+    
+    def schedule(self, key: Hashable, delay: float, payload: Any = None):
+        """Поставить таймер для ключа через delay секунд (заменяет прежний таймер ключа)"""
+        loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        
+        self._discard(key)
+        entry = [loop.time() + delay, next(self._counter), key, payload, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        self.scheduled += 1
+        
+        # Новый таймер стал ближайшим - переводим будильник
+        if self._heap[0] is entry:
+            self._arm(loop)
+    
+    def cancel(self, key: Hashable) -> bool:
+        """Отменить таймер ключа. Возвращает True, если он был"""
+        if self._discard(key):
+            self.cancelled += 1
+            return True
+        return False
+    
+    def _discard(self, key: Hashable) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[_ACTIVE] = False
+        self._cancelled += 1
+        # Уплотняем кучу, когда отмененные записи занимают больше половины
+        if self._cancelled > 1024 and self._cancelled * 2 > len(self._heap):
+            self._heap = [item for item in self._heap if item[_ACTIVE]]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+    
+    def _arm(self, loop: asyncio.AbstractEventLoop):
+        """Разбудить фоновую задачу к ближайшему дедлайну"""
+        if self._timer:
+            self._timer.cancel()
+        self._timer = loop.call_at(self._heap[0][_DEADLINE] + self.resolution, self._wakeup.set)
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            self._timer = None
+            
+            while True:
+                batch = self._pop_due(loop.time())
+                if not batch:
+                    break
+                self.fired += len(batch)
+                self.batches += 1
+                delivery = loop.create_task(self._deliver(batch))
+                self._deliveries.add(delivery)
+                delivery.add_done_callback(self._deliveries.discard)
+            
+            if self._heap:
+                self._arm(loop)
+    
+    def _pop_due(self, until: float) -> List[Tuple[Hashable, Any]]:
+        """Снять с кучи таймеры с дедлайном до until"""
+        batch = []
+        heap = self._heap
+        while heap and len(batch) < self.max_batch:
+            entry = heap[0]
+            if not entry[_ACTIVE]:
+                heapq.heappop(heap)
+                self._cancelled -= 1
+                continue
+            if entry[_DEADLINE] > until:
+                break
+            heapq.heappop(heap)
+            del self._entries[entry[_KEY]]
+            batch.append((entry[_KEY], entry[_PAYLOAD]))
+        return batch
+    
+    async def _deliver(self, batch: List[Tuple[Hashable, Any]]):
+        try:
+            await self.callback(batch)
+        except Exception as e:
+            logger.error(f"Ошибка обработки {len(batch)} сработавших таймеров: {e}")
+    
+    async def stop(self):
+        """Остановить планировщик, отбросив все таймеры"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._heap.clear()
+        self._entries.clear()
+        self._cancelled = 0
+    
+    def stats(self) -> dict:
+        """Счетчики планировщика"""
+        return {
+            "active": len(self._entries),
+            "heap_size": len(self._heap),
+            "scheduled": self.scheduled,
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+            "batches": self.batches
+        }
@@ -115,7 +115,8 @@ def format_user_stats(stats: Dict) -> str:
 
 def format_session_result(correct: int, total: int, time_taken: float, level: int, 
                          last_answer_correct: bool = None, last_correct_answer: int = None, 
-                         new_record: bool = False) -> str:
+                         new_record: bool = False, score_gained: int = None,
+                         position: int = None, total_users: int = 0) -> str:
     """Форматирование результатов сессии"""
     accuracy = round((correct / total) * 100, 1) if total > 0 else 0
     accuracy_emoji = get_accuracy_emoji(accuracy)
@@ -124,6 +125,9 @@ def format_session_result(correct: int, total: int, time_taken: float, level: in
     
     result_emoji = "🎉" if accuracy >= 80 else "👍" if accuracy >= 60 else "💪"
     record_text = "\n🏆 <b>Новый рекорд!</b>" if new_record else ""
+    score_text = f"\n⭐ <b>Очков получено:</b> +{score_gained}" if score_gained is not None else ""
+    # Пользователи без очков в рейтинг не входят - для них место не показываем
+    rank_text = f"\n🏅 <b>Место в рейтинге:</b> {position} из {total_users}" if position and position <= total_users else ""
     
     # Добавляем результат последнего ответа если он передан
     last_answer_text = ""
@@ -140,7 +144,7 @@ def format_session_result(correct: int, total: int, time_taken: float, level: in
 🎯 <b>Результат:</b> {correct}/{total} правильных
 {accuracy_emoji} <b>Точность:</b> {accuracy}%
 ⏱️ <b>Среднее время:</b> {avg_time}с на задачу
-🕐 <b>Общее время:</b> {format_time(time_taken)}
+🕐 <b>Общее время:</b> {format_time(time_taken)}{score_text}{rank_text}
 {record_text}
 
 {get_result_message(accuracy)}
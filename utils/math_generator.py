@@ -1,6 +1,8 @@
 import random
 from typing import Tuple, List
 
+from utils.problem_codec import encode, render
+
 class MathProblemGenerator:
     """Генератор математических задач для ментальной арифметики"""
     
@@ -28,6 +30,19 @@ class MathProblemGenerator:
         Returns:
             Tuple[str, int]: (текст_задачи, правильный_ответ)
         """
+        code, answer = self.generate_code(level)
+        return render(code), answer
+    
+    def generate_code(self, level: int) -> Tuple[int, int]:
+        """
+        Генерирует задачу в компактном виде (см. utils/problem_codec.py)
+        
+        Args:
+            level: Уровень сложности (1-10)
+            
+        Returns:
+            Tuple[int, int]: (код_задачи, правильный_ответ)
+        """
         if level not in self.level_configs:
             level = 1
         
@@ -51,31 +66,28 @@ class MathProblemGenerator:
         else:
             return self._generate_addition(num_range, terms_count)
     
-    def _generate_addition(self, num_range: Tuple[int, int], terms: int) -> Tuple[str, int]:
+    def _generate_addition(self, num_range: Tuple[int, int], terms: int) -> Tuple[int, int]:
         """Генерация задач на сложение"""
         numbers = [random.randint(*num_range) for _ in range(terms)]
-        problem = " + ".join(map(str, numbers))
         answer = sum(numbers)
-        return f"{problem} = ?", answer
+        return encode(numbers, ["+"] * (terms - 1)), answer
     
-    def _generate_subtraction(self, num_range: Tuple[int, int]) -> Tuple[str, int]:
+    def _generate_subtraction(self, num_range: Tuple[int, int]) -> Tuple[int, int]:
         """Генерация задач на вычитание"""
         # Убеждаемся, что результат положительный
         a = random.randint(num_range[0], num_range[1])
         b = random.randint(num_range[0], min(a, num_range[1]))
-        problem = f"{a} - {b}"
         answer = a - b
-        return f"{problem} = ?", answer
+        return encode([a, b], ["-"]), answer
     
-    def _generate_multiplication(self, num_range: Tuple[int, int]) -> Tuple[str, int]:
+    def _generate_multiplication(self, num_range: Tuple[int, int]) -> Tuple[int, int]:
         """Генерация задач на умножение"""
         a = random.randint(*num_range)
         b = random.randint(2, 9)  # Таблица умножения
-        problem = f"{a} × {b}"
         answer = a * b
-        return f"{problem} = ?", answer
+        return encode([a, b], ["×"]), answer
     
-    def _generate_mixed(self, num_range: Tuple[int, int]) -> Tuple[str, int]:
+    def _generate_mixed(self, num_range: Tuple[int, int]) -> Tuple[int, int]:
         """Генерация смешанных задач (сложение и вычитание)"""
         operation = random.choice(["+", "-"])
         
@@ -84,18 +96,11 @@ class MathProblemGenerator:
         else:
             return self._generate_subtraction(num_range)
     
-    def _generate_mixed_advanced(self, num_range: Tuple[int, int], terms: int) -> Tuple[str, int]:
+    def _generate_mixed_advanced(self, num_range: Tuple[int, int], terms: int) -> Tuple[int, int]:
         """Генерация продвинутых смешанных задач"""
         numbers = [random.randint(*num_range) for _ in range(terms)]
         operations = [random.choice(["+", "-"]) for _ in range(terms - 1)]
         
-        # Строим выражение
-        expression_parts = [str(numbers[0])]
-        for i, op in enumerate(operations):
-            expression_parts.append(f" {op} {numbers[i + 1]}")
-        
-        problem = "".join(expression_parts)
-        
         # Вычисляем ответ
         answer = numbers[0]
         for i, op in enumerate(operations):
@@ -108,19 +113,19 @@ class MathProblemGenerator:
         if answer < 0:
             # Переставляем числа, чтобы получить положительный результат
             numbers.sort(reverse=True)
-            problem = f"{numbers[0]} - {numbers[1]}"
+            numbers, operations = numbers[:2], ["-"]
             answer = numbers[0] - numbers[1]
         
-        return f"{problem} = ?", answer
+        return encode(numbers, operations), answer
     
-    def _generate_challenge(self, num_range: Tuple[int, int], terms: int) -> Tuple[str, int]:
+    def _generate_challenge(self, num_range: Tuple[int, int], terms: int) -> Tuple[int, int]:
         """Генерация сложных задач для высокого уровня"""
         # Случайный выбор типа задачи
         challenge_type = random.choice(["multi_add", "multi_sub", "mixed_operations"])
         
         if challenge_type == "multi_add":
             numbers = [random.randint(*num_range) for _ in range(terms)]
-            problem = " + ".join(map(str, numbers))
+            operations = ["+"] * (terms - 1)
             answer = sum(numbers)
         
         elif challenge_type == "multi_sub":
@@ -128,11 +133,9 @@ class MathProblemGenerator:
             big_num = random.randint(num_range[1] - 20, num_range[1])
             small_nums = [random.randint(5, 15) for _ in range(terms - 1)]
             
-            problem = str(big_num)
-            answer = big_num
-            for num in small_nums:
-                problem += f" - {num}"
-                answer -= num
+            numbers = [big_num] + small_nums
+            operations = ["-"] * len(small_nums)
+            answer = big_num - sum(small_nums)
             
             # Если получился отрицательный результат, корректируем
             if answer < 0:
@@ -145,14 +148,15 @@ class MathProblemGenerator:
             c = random.randint(5, 20)
             
             operation = random.choice(["+", "-"])
-            problem = f"{a} × {b} {operation} {c}"
+            numbers = [a, b, c]
+            operations = ["×", operation]
             
             if operation == "+":
                 answer = a * b + c
             else:
                 answer = a * b - c
         
-        return f"{problem} = ?", answer
+        return encode(numbers, operations), answer
     
     def get_level_description(self, level: int) -> str:
         """Получить описание уровня"""
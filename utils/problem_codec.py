@@ -0,0 +1,87 @@
+"""Компактное представление задачи одним целым числом
+
+Задача - это от 1 до 7 чисел (0-255) и операции между ними (+, -, ×).
+Раскладка битов от младших к старшим:
+    
+    3 бита   - количество чисел
+    8 бит    - каждое число
+    2 бита   - каждая операция
+
+Задача из 4 чисел занимает 41 бит и помещается в INTEGER SQLite (8 байт)
+вместо строки вида "12 + 7 + 3 = ?". Текст строится только для показа.
+"""
+from functools import lru_cache
+from typing import List, Tuple
+
+OPERATORS = ("+", "-", "×")
+OPERATOR_CODES = {op: code for code, op in enumerate(OPERATORS)}
+
+COUNT_BITS = 3
+OPERAND_BITS = 8
+OPERATOR_BITS = 2
+MAX_OPERANDS = (1 << COUNT_BITS) - 1
+MAX_OPERAND = (1 << OPERAND_BITS) - 1
+
+def encode(operands: List[int], operators: List[str]) -> int:
+    """Упаковать числа и операции задачи в целое число"""
+    count = len(operands)
+    if not 1 <= count <= MAX_OPERANDS or len(operators) != count - 1:
+        raise ValueError(f"Некорректная задача: {operands} {operators}")
+    
+    code = count
+    shift = COUNT_BITS
+    for operand in operands:
+        if not 0 <= operand <= MAX_OPERAND:
+            raise ValueError(f"Число {operand} вне диапазона 0-{MAX_OPERAND}")
+        code |= operand << shift
+        shift += OPERAND_BITS
+    for operator in operators:
+        code |= OPERATOR_CODES[operator] << shift
+        shift += OPERATOR_BITS
+    return code
+
+def decode(code: int) -> Tuple[List[int], List[str]]:
+    """Распаковать задачу: (числа, операции)"""
+    count = code & MAX_OPERANDS
+    shift = COUNT_BITS
+    operands = []
+    for _ in range(count):
+        operands.append((code >> shift) & MAX_OPERAND)
+        shift += OPERAND_BITS
+    operators = []
+    for _ in range(count - 1):
+        operators.append(OPERATORS[(code >> shift) & ((1 << OPERATOR_BITS) - 1)])
+        shift += OPERATOR_BITS
+    return operands, operators
+
+@lru_cache(maxsize=4096)
+def render(code: int) -> str:
+    """Текст задачи для показа пользователю, например: 12 + 7 = ?"""
+    operands, operators = decode(code)
+    if not operands:
+        return ""
+    parts = [str(operands[0])]
+    for operator, operand in zip(operators, operands[1:]):
+        parts.append(f"{operator} {operand}")
+    return " ".join(parts) + " = ?"
+
+def evaluate(code: int) -> int:
+    """Ответ задачи (умножение выполняется раньше сложения и вычитания)"""
+    operands, operators = decode(code)
+    terms = [operands[0]]
+    signs = [1]
+    for operator, operand in zip(operators, operands[1:]):
+        if operator == "×":
+            terms[-1] *= operand
+        else:
+            terms.append(operand)
+            signs.append(1 if operator == "+" else -1)
+    return sum(sign * term for sign, term in zip(signs, terms))
+
+def parse(text: str) -> int:
+    """Код задачи по тексту вида "12 + 7 = ?" (0, если текст не разобрать)"""
+    tokens = text.replace("= ?", "").split()
+    try:
+        return encode([int(token) for token in tokens[::2]], tokens[1::2])
+    except (ValueError, KeyError):
+        return 0
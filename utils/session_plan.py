@@ -0,0 +1,95 @@
+"""План сессии: все задачи, ответы и варианты ответа готовятся при старте
+
+Между нажатием кнопки и показом следующей задачи остается только взять
+готовый элемент плана и собрать разметку из заранее выбранных вариантов.
+Внутри одной сессии задачи не повторяются (если уровень это позволяет).
+
+Тексты задач в плане не хранятся, только упакованные коды: текст собирается
+в next() (render кэширован), так память сессии не растет с длиной текста.
+"""
+import struct
+from array import array
+from typing import Tuple
+
+from keyboards.main_keyboard import get_answer_options
+from utils.formatters import format_problem
+from utils.math_generator import math_generator
+from utils.problem_codec import render
+
+OPTIONS_PER_PROBLEM = 4
+MAX_ATTEMPTS_PER_PROBLEM = 20  # попыток найти неповторяющуюся задачу
+
+class SessionPlan:
+    """Заранее сгенерированные задачи сессии"""
+    
+    __slots__ = ("codes", "answers", "options", "time_per_problem", "position")
+    
+    def __init__(self, codes: array, answers: array, options: array, time_per_problem: int):
+        self.codes = codes
+        self.answers = answers
+        self.options = options  # по OPTIONS_PER_PROBLEM вариантов ответа подряд
+        self.time_per_problem = time_per_problem  # для текста сообщения с задачей
+        self.position = 0
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def has_next(self) -> bool:
+        return self.position < len(self.codes)
+    
+    def next(self) -> Tuple[int, int, str, tuple]:
+        """Следующая задача: (код, ответ, текст, варианты ответа)"""
+        index = self.position
+        self.position += 1
+        start = index * OPTIONS_PER_PROBLEM
+        code = self.codes[index]
+        return (
+            code,
+            self.answers[index],
+            format_problem(render(code), index + 1, len(self.codes), self.time_per_problem),
+            tuple(self.options[start:start + OPTIONS_PER_PROBLEM])
+        )
+    
+    def dump(self) -> bytes:
+        """Упаковать план в байты для снимка сессии"""
+        return (
+            struct.pack("<II", len(self.codes), self.position)
+            + self.codes.tobytes() + self.answers.tobytes() + self.options.tobytes()
+        )
+    
+    @classmethod
+    def load(cls, data: bytes, time_per_problem: int) -> "SessionPlan":
+        """Восстановить план из результата dump()"""
+        count, position = struct.unpack_from("<II", data)
+        columns = []
+        offset = 8
+        for size in (count, count, count * OPTIONS_PER_PROBLEM):
+            column = array("q")
+            column.frombytes(data[offset:offset + size * column.itemsize])
+            offset += size * column.itemsize
+            columns.append(column)
+        plan = cls(*columns, time_per_problem)
+        plan.position = position
+        return plan
+
+def build_session_plan(level: int, total_problems: int, time_per_problem: int) -> SessionPlan:
+    """Сгенерировать все задачи сессии без повторов"""
+    codes = []
+    answers = []
+    options = []
+    seen = set()
+    
+    while len(codes) < total_problems:
+        for _ in range(MAX_ATTEMPTS_PER_PROBLEM):
+            code, answer = math_generator.generate_code(level)
+            if code not in seen:
+                break
+        # На маленьких уровнях задачи могут закончиться - тогда повтор допустим
+        seen.add(code)
+        
+        codes.append(code)
+        answers.append(answer)
+        options.extend(get_answer_options(answer))
+    
+    # Массивы из готовых списков выделяются точно по размеру, без запаса на append
+    return SessionPlan(array("q", codes), array("q", answers), array("q", options), time_per_problem)
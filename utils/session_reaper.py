@@ -0,0 +1,78 @@
+"""Вытеснение брошенных сессий обучения из памяти
+
+Сессия, в которой пользователь не отвечал дольше idle_timeout секунд,
+удаляется из словаря активных сессий при очередном обходе (раз в interval
+секунд). Здесь же ведутся счетчики припаркованных, возобновленных и
+вытесненных сессий для /metrics.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class SessionReaper:
+    """Периодический обход активных сессий и вытеснение простаивающих"""
+    
+    def __init__(self, sessions: dict, idle_timeout: float, interval: float = 60,
+                 on_evict: Optional[Callable] = None):
+        self.sessions = sessions  # ключ -> сессия с атрибутами last_activity и is_parked
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+        self.on_evict = on_evict  # вызывается для каждой вытесненной сессии
+        self._task = None
+        self.parked = 0  # сессий припарковано (после истечений времени подряд)
+        self.blocked = 0  # из них - потому что пользователь заблокировал бота
+        self.resumed = 0
+        self.reaped = 0
+    
+    def start(self):
+        """Запустить периодический обход"""
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Вытеснение брошенных сессий включено: простой {self.idle_timeout} с, "
+                    f"обход каждые {self.interval} с")
+    
+    async def stop(self):
+        """Остановить периодический обход"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.reap_once()
+            except Exception as e:
+                logger.error(f"Ошибка вытеснения сессий: {e}")
+    
+    def reap_once(self, now: float = None) -> int:
+        """Вытеснить сессии, простаивающие дольше idle_timeout. Возвращает их число"""
+        deadline = (now or time.time()) - self.idle_timeout
+        idle = [key for key, session in self.sessions.items() if session.last_activity < deadline]
+        for key in idle:
+            session = self.sessions.pop(key)
+            if self.on_evict:
+                self.on_evict(session)
+        
+        if idle:
+            self.reaped += len(idle)
+            logger.info(f"Вытеснено брошенных сессий: {len(idle)}, активных осталось {len(self.sessions)}")
+        return len(idle)
+    
+    def stats(self) -> dict:
+        """Счетчики для метрик"""
+        return {
+            "active": len(self.sessions),
+            "parked_now": sum(1 for session in self.sessions.values() if session.is_parked),
+            "parked": self.parked,
+            "blocked": self.blocked,
+            "resumed": self.resumed,
+            "reaped": self.reaped
+        }
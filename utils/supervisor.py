@@ -0,0 +1,290 @@
+"""Режим нескольких процессов: супервизор и обработчики шардов
+
+Супервизор только принимает обновления (поллингом или вебхуком) и
+пересылает каждое обработчику, которому принадлежит пользователь:
+telegram_id % shards. Обработчик - отдельный процесс main.py со своими
+активными сессиями, таймерами и кэшами; обновления он читает построчно
+(JSON) из stdin, а в Telegram отвечает сам. Так обработка занимает
+столько ядер, сколько шардов, а сессии одного пользователя всегда живут
+в одном процессе.
+
+Если обработчик завершился, супервизор перезапускает его с нарастающей
+паузой; обновления его шарда тем временем копятся в ограниченной очереди,
+остальные шарды продолжают работать. Перезапущенный обработчик
+восстанавливает сессии своего шарда из снимков.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import sys
+import time
+from typing import List, Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from utils.webhook_server import SECRET_HEADER
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30  # секунд длинного опроса getUpdates
+MAX_RESTART_DELAY = 30  # секунд между перезапусками упавшего обработчика
+STABLE_AFTER = 60  # секунд работы, после которых пауза перезапуска сбрасывается
+LINE_LIMIT = 4 * 1024 * 1024  # байт на одно обновление в канале обработчика
+
+def update_owner(update: dict) -> int:
+    """telegram_id пользователя, от которого пришло обновление (или id чата)"""
+    for key, value in update.items():
+        if key != "update_id" and isinstance(value, dict):
+            user = value.get("from") or value.get("user")
+            if user:
+                return user["id"]
+            chat = value.get("chat")
+            if chat:
+                return chat["id"]
+    return update.get("update_id", 0)
+
+class Supervisor:
+    """Прием обновлений и раздача их процессам-обработчикам по шардам"""
+    
+    def __init__(self, bot: Bot, shards: int, command: List[str], queue_size: int = 1000,
+                 path: str = "/webhook", secret: Optional[str] = None):
+        """
+        Args:
+            command: Команда запуска обработчика; к ней добавляются номер шарда и число шардов
+            queue_size: Предел очереди обновлений одного шарда
+        """
+        self.bot = bot
+        self.shards = shards
+        self.command = command
+        self.path = path
+        self.secret = secret
+        self._queues = [asyncio.Queue(maxsize=queue_size) for _ in range(shards)]
+        self._carry: List[Optional[bytes]] = [None] * shards  # строка, не дошедшая до упавшего процесса
+        self._processes: List[Optional[asyncio.subprocess.Process]] = [None] * shards
+        self._tasks = []
+        self._runner = None
+        self._stopping = False
+        self._stopped = asyncio.Event()
+        self.received = 0
+        self.rejected = 0
+        self.forwarded = [0] * shards
+        self.restarts = [0] * shards
+    
+    def start(self):
+        """Запустить процессы-обработчики всех шардов"""
+        self._tasks = [asyncio.create_task(self._run_shard(shard)) for shard in range(self.shards)]
+        logger.info(f"Супервизор: шардов {self.shards}, очередь шарда до {self._queues[0].maxsize}")
+    
+    async def _run_shard(self, shard: int):
+        """Держать обработчик шарда запущенным"""
+        delay = 1
+        while not self._stopping:
+            process = await asyncio.create_subprocess_exec(
+                *self.command, str(shard), str(self.shards), stdin=asyncio.subprocess.PIPE
+            )
+            self._processes[shard] = process
+            started = time.monotonic()
+            feeder = asyncio.create_task(self._feed(shard, process))
+            code = await process.wait()
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+            if self._stopping:
+                break
+            
+            self.restarts[shard] += 1
+            if time.monotonic() - started >= STABLE_AFTER:
+                delay = 1
+            logger.error(f"Обработчик шарда {shard} завершился с кодом {code}, "
+                         f"перезапуск через {delay} с (в очереди {self._queues[shard].qsize()})")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+    
+    async def _feed(self, shard: int, process: asyncio.subprocess.Process):
+        """Передавать обновления шарда в stdin обработчика"""
+        queue = self._queues[shard]
+        while True:
+            if self._carry[shard] is None:
+                self._carry[shard] = await queue.get()
+            try:
+                process.stdin.write(self._carry[shard])
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                return  # процесс завершился - строка уйдет следующему
+            self._carry[shard] = None
+            self.forwarded[shard] += 1
+    
+    def _line(self, update: dict, raw: bytes = None) -> tuple:
+        """Шард обновления и строка для канала обработчика"""
+        shard = update_owner(update) % self.shards
+        if raw is None:
+            raw = json.dumps(update, ensure_ascii=False, separators=(",", ":")).encode()
+        else:
+            raw = raw.replace(b"\n", b" ")  # переводы строк в JSON бывают только между токенами
+        return shard, raw + b"\n"
+    
+    async def handle(self, request: web.Request) -> web.Response:
+        """Вебхук: проверить, разобрать и сразу поставить в очередь шарда"""
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        
+        raw = await request.read()
+        try:
+            update = json.loads(raw)
+        except ValueError as e:
+            logger.warning(f"Некорректное обновление вебхука: {e}")
+            return web.Response(status=400)
+        
+        shard, line = self._line(update, raw)
+        try:
+            self._queues[shard].put_nowait(line)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)  # Telegram повторит доставку
+        self.received += 1
+        return web.Response()
+    
+    async def start_webhook(self, host: str, port: int, url: Optional[str] = None,
+                            max_connections: int = 40, allowed_updates: list = None):
+        """Запустить HTTP-сервер вебхука; если задан url - зарегистрировать вебхук"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        if url:
+            await self.bot.set_webhook(
+                url + self.path,
+                secret_token=self.secret,
+                max_connections=max_connections,
+                allowed_updates=allowed_updates
+            )
+        logger.info(f"Супервизор слушает вебхук {host}:{port}{self.path}")
+    
+    async def poll(self, allowed_updates: list = None):
+        """Поллинг getUpdates; подтверждаем пачку, только когда она разложена по очередям"""
+        url = self.bot.session.api.api_url(self.bot.token, "getUpdates")
+        offset = 0
+        delay = 1
+        async with ClientSession(timeout=ClientTimeout(total=POLL_TIMEOUT + 10)) as session:
+            while not self._stopping:
+                params = {"offset": offset, "timeout": POLL_TIMEOUT}
+                if allowed_updates is not None:
+                    params["allowed_updates"] = json.dumps(allowed_updates)
+                try:
+                    async with session.post(url, data=params) as response:
+                        body = await response.json()
+                except (OSError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning(f"Ошибка getUpdates: {e}, повтор через {delay} с")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RESTART_DELAY)
+                    continue
+                delay = 1
+                if not body.get("ok"):
+                    retry_after = body.get("parameters", {}).get("retry_after", 1)
+                    logger.warning(f"getUpdates: {body.get('description')}")
+                    await asyncio.sleep(retry_after)
+                    continue
+                
+                for update in body["result"]:
+                    shard, line = self._line(update)
+                    await self._queues[shard].put(line)  # при заполненной очереди поллинг ждет
+                    self.received += 1
+                    offset = update["update_id"] + 1
+    
+    async def serve_forever(self):
+        """Работать до SIGINT/SIGTERM"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stopped.set)
+            except NotImplementedError:  # Windows
+                pass
+        await self._stopped.wait()
+        logger.info("Получен сигнал завершения")
+    
+    async def stop(self, drain_timeout: float = 10):
+        """Перестать принимать обновления, передать очереди и дождаться завершения обработчиков"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        
+        deadline = time.monotonic() + drain_timeout
+        while time.monotonic() < deadline and any(
+            not queue.empty() or carry is not None for queue, carry in zip(self._queues, self._carry)
+        ):
+            await asyncio.sleep(0.05)
+        
+        # Конец stdin - сигнал обработчику дообработать обновления и завершиться
+        self._stopping = True
+        for process in self._processes:
+            if process and process.returncode is None:
+                process.stdin.close()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*self._tasks, return_exceptions=True), max(deadline - time.monotonic(), 1)
+            )
+        except asyncio.TimeoutError:
+            for process in self._processes:
+                if process and process.returncode is None:
+                    logger.warning(f"Обработчик {process.pid} не завершился вовремя, останавливаем")
+                    process.kill()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    def stats(self) -> dict:
+        """Счетчики для метрик и журнала"""
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "queued": [queue.qsize() for queue in self._queues],
+            "forwarded": list(self.forwarded),
+            "restarts": list(self.restarts)
+        }
+
+async def serve_shard(dp: Dispatcher, bot: Bot, concurrency: int = 32) -> int:
+    """
+    Обработчик шарда: читать обновления из stdin до его конца
+    
+    Одновременно обрабатывается не больше concurrency обновлений; пока все
+    заняты, stdin не читается, и очередь копится у супервизора.
+    Возвращает число обработанных обновлений.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+    processed = 0
+    
+    async def process(update: Update):
+        nonlocal processed
+        try:
+            await dp.feed_update(bot, update)
+            processed += 1
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+        finally:
+            slots.release()
+    
+    while True:
+        line = await reader.readline()
+        if not line:
+            break  # супервизор закрыл канал
+        try:
+            update = Update.model_validate(json.loads(line), context={"bot": bot})
+        except Exception as e:
+            logger.warning(f"Некорректное обновление от супервизора: {e}")
+            continue
+        await slots.acquire()
+        task = asyncio.create_task(process(update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return processed
@@ -0,0 +1,135 @@
+"""Прием обновлений через вебхук: встроенный сервер aiohttp
+
+Запрос Telegram только разбирается и кладется в ограниченную очередь, после
+чего сразу получает 200 - обработка идет в фоне фиксированным числом
+обработчиков. Если очередь заполнена, сервер отвечает 503, и Telegram
+повторит доставку позже (так нагрузка не копится в памяти процесса).
+Несколько экземпляров бота можно поставить за балансировщик.
+"""
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """HTTP-сервер вебхука с ограниченной очередью обновлений"""
+    
+    def __init__(self, dp: Dispatcher, bot: Bot, path: str = "/webhook", secret: Optional[str] = None,
+                 queue_size: int = 1000, workers: int = 32):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+        self._runner = None
+        self._stopped = asyncio.Event()
+        self.received = 0
+        self.rejected = 0  # очередь заполнена - ответили 503
+        self.processed = 0
+        self.failed = 0
+        self.max_queue = 0
+    
+    def app(self) -> web.Application:
+        """Приложение aiohttp с маршрутом вебхука"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+    
+    async def handle(self, request: web.Request) -> web.Response:
+        """Принять обновление и сразу ответить"""
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"Некорректное обновление вебхука: {e}")
+            return web.Response(status=400)
+        
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+        
+        self.received += 1
+        if self._queue.qsize() > self.max_queue:
+            self.max_queue = self._queue.qsize()
+        return web.Response()
+    
+    async def _work(self):
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                self._queue.task_done()
+    
+    async def start(self, host: str, port: int, url: Optional[str] = None, max_connections: int = 40):
+        """Запустить обработчики и HTTP-сервер; если задан url - зарегистрировать вебхук"""
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        
+        if url:
+            await self.bot.set_webhook(
+                url + self.path,
+                secret_token=self.secret,
+                max_connections=max_connections,
+                allowed_updates=self.dp.resolve_used_update_types()
+            )
+        logger.info(f"Вебхук слушает {host}:{port}{self.path}: обработчиков {self.workers}, "
+                    f"очередь до {self._queue.maxsize}")
+    
+    async def serve_forever(self):
+        """Работать до SIGINT/SIGTERM"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stopped.set)
+            except NotImplementedError:  # Windows
+                pass
+        await self._stopped.wait()
+        logger.info("Получен сигнал завершения")
+    
+    async def stop(self, drain_timeout: float = 10):
+        """Перестать принимать обновления, дообработать очередь и остановить обработчики"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не обработано обновлений при остановке: {self._queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    def stats(self) -> dict:
+        """Счетчики для метрик"""
+        return {
+            "queue": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "max_queue": self.max_queue,
+            "received": self.received,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed
+        }